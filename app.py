@@ -1,3 +1,7 @@
+# Cold-start profile: phase timings of every process, per-module import times with STARTUP_PROFILE=true
+import startup_profile
+startup_profile.begin()
+
 # Werkzeug compatibility fix for Railway deployment
 import werkzeug
 if not hasattr(werkzeug, '__version__'):
@@ -10,40 +14,109 @@ if not hasattr(werkzeug, '__version__'):
             werkzeug.__version__ = pkg_resources.get_distribution('werkzeug').version
         except:
             werkzeug.__version__ = '3.0.0'
+startup_profile.mark('werkzeug shim')
 
-from flask import Flask, render_template, request, redirect, url_for, flash, session, make_response, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, make_response, jsonify, g, has_request_context
+from flask import before_render_template, template_rendered
 import psycopg2
+import psycopg2.pool
 from datetime import datetime, date, timedelta, timezone  # timezone eklendi
 from collections import defaultdict
 from io import StringIO
 import csv
 import calendar
 import hashlib
+import json
 import secrets
 import os
+import sys
 from dotenv import load_dotenv
+from swipe_cache import SwipeCache
+from result_cache import PeriodResultCache
+from snapshot_engine import SnapshotEngine
+from single_flight import SingleFlight
+from person_categories import PersonCategoryIndex, TAB_CATEGORIES, normalize_category
+from employee_directory import EmployeeDirectory, paginate
+from data_versions import DataVersions
+from compression import Compressor
+from static_assets import StaticAssets
+from fragment_cache import FragmentCache, FragmentCacheExtension
+from metrics import Metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from db_instrumentation import InstrumentedCursor, add_listener as add_query_listener
+from query_stats import QueryStats, fingerprint
+from query_budget import QueryBudget
+from tracing import Tracer, install_log_record_factory
+from profiler import SamplingProfiler
+from job_history import JobHistory
+from jinja2 import FileSystemBytecodeCache
 import threading
 import time
 import logging
+from contextlib import contextmanager
+from functools import wraps
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+startup_profile.mark('imports')
+
+# Log lines inside a request or job carry its trace id: ... - INFO [trace_id=...] - message
+install_log_record_factory()
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s%(trace_context)s - %(message)s')
+
+# Late arrival system - imported on first use (it pulls in smtplib/email and its log file), so
+# processes that never run a check, e.g. one CGI request, do not pay for it
+_late_arrival_lock = threading.Lock()
+_late_arrival_module = None
+_late_arrival_error = None
+
+
+def get_late_arrival_system():
+    """The late_arrival_system module, or None if it cannot be imported (error logged once)."""
+    global _late_arrival_module, _late_arrival_error
+    if _late_arrival_module is None and _late_arrival_error is None:
+        with _late_arrival_lock:
+            if _late_arrival_module is None and _late_arrival_error is None:
+                try:
+                    import late_arrival_system
+                    _late_arrival_module = late_arrival_system
+                    logging.info("Late arrival system imported successfully")
+                except ImportError as e:
+                    _late_arrival_error = e
+                    logging.warning(f"Late arrival system not available: {e}")
+    return _late_arrival_module
+
+
+def late_arrival_system_available():
+    return get_late_arrival_system() is not None
+
+
+def late_arrival_system_status():
+    """OK, NOT_AVAILABLE (import failed) or NOT_LOADED, without importing the module (for health checks)."""
+    if _late_arrival_module is not None or 'late_arrival_system' in sys.modules:
+        return "OK"
+    return "NOT_AVAILABLE" if _late_arrival_error is not None else "NOT_LOADED"
+
 
-# Late arrival system import - with error handling for Railway
-try:
-    from late_arrival_system import check_all_employees_late_arrivals, update_monthly_statistics
-    LATE_ARRIVAL_SYSTEM_AVAILABLE = True
-    logging.info("Late arrival system imported successfully")
-except ImportError as e:
-    logging.warning(f"Late arrival system not available: {e}")
-    LATE_ARRIVAL_SYSTEM_AVAILABLE = False
-    # Create dummy functions to prevent errors
-    def check_all_employees_late_arrivals():
+def check_all_employees_late_arrivals(*args, **kwargs):
+    late_system = get_late_arrival_system()
+    if late_system is None:
         logging.warning("Late arrival system not available")
         return False
-    
-    def update_monthly_statistics():
+    with timed_job('late_arrival_check'):
+        return late_system.check_all_employees_late_arrivals(*args, **kwargs)
+
+
+def update_monthly_statistics(*args, **kwargs):
+    late_system = get_late_arrival_system()
+    if late_system is None:
         logging.warning("Late arrival system not available")
         return False
+    with timed_job('monthly_statistics'):
+        return late_system.update_monthly_statistics(*args, **kwargs)
+
 
 load_dotenv()
+startup_profile.mark('dotenv')
 
 app = Flask(__name__, 
             template_folder='templates',
@@ -53,11 +126,40 @@ app = Flask(__name__,
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'default-fallback-key')
 app.secret_key = app.config['SECRET_KEY']
 
-# Disable template caching for development
-app.config['TEMPLATES_AUTO_RELOAD'] = True
-app.jinja_env.auto_reload = True
+# Templates: `python app.py` (development) re-reads changed templates. Production servers
+# (gunicorn, Passenger, run.cgi) never stat template files, share compiled templates between
+# workers through a bytecode cache and cache stable fragments ({% cache %} blocks)
+PRODUCTION_TEMPLATES = os.environ.get('PRODUCTION_TEMPLATES',
+                                      'false' if __name__ == '__main__' else 'true').lower() == 'true'
+JINJA_CACHE_DIR = os.environ.get('JINJA_CACHE_DIR',
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'jinja'))
+FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL', '300'))
+
+app.config['TEMPLATES_AUTO_RELOAD'] = not PRODUCTION_TEMPLATES
+app.jinja_env.auto_reload = not PRODUCTION_TEMPLATES
+app.jinja_env.add_extension(FragmentCacheExtension)
+if PRODUCTION_TEMPLATES:
+    try:
+        os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
+    except OSError as e:
+        print(f"⚠️ Jinja bytecode cache disabled: {e}")
+    app.jinja_env.fragment_cache = FragmentCache(ttl=FRAGMENT_CACHE_TTL)
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
 
+# Response compression (gzip, or br when the brotli package is installed); there is no reverse
+# proxy in front of the run.cgi / Passenger deployments to do it
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', '6'))
+compressor = Compressor(app, min_size=COMPRESSION_MIN_SIZE, level=COMPRESSION_LEVEL,
+                        enabled=COMPRESSION_ENABLED)
+
+# Fingerprinted static files (built by `python static_assets.py`) are cached for a year;
+# unversioned files (development, no build yet) keep SEND_FILE_MAX_AGE_DEFAULT
+static_assets = StaticAssets(app)
+startup_profile.mark('flask app')
+
 # Background scheduler will be initialized after the class definition
 
 # PostgreSQL Connection Settings
@@ -102,6 +204,114 @@ TURNSTILE_CONFIG = {
 EIGHT_HOURS_SECONDS = 28800
 PER_PAGE_ATTENDANCE = 20
 PER_PAGE_EMPLOYEE_LOGS = 20
+# Upper bound on employees per bulk daily-notes request (one attendance page is PER_PAGE_ATTENDANCE)
+DAILY_NOTES_MAX_EMPLOYEES = 500
+
+# Connection pool limits (per worker process)
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '8'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '30'))
+
+# Parallel log computation: ranges of at least LOGS_PARALLEL_MIN_DAYS days are split into month
+# shards, fetched on threads and evaluated on LOGS_PARALLEL_WORKERS spawned processes per worker
+# (1 = always serial). Compare with `python benchmark.py run --cases get_employee_logs.all_90d.serial,...`
+LOGS_PARALLEL_WORKERS = int(os.environ.get('LOGS_PARALLEL_WORKERS', min(4, os.cpu_count() or 1)))
+LOGS_PARALLEL_MIN_DAYS = int(os.environ.get('LOGS_PARALLEL_MIN_DAYS', '45'))
+
+# Shared swipe cache: months kept (current month included, 0 disables), row cap and
+# how often today's rows are topped up
+SWIPE_CACHE_MONTHS = int(os.environ.get('SWIPE_CACHE_MONTHS', '2'))
+SWIPE_CACHE_MAX_ROWS = int(os.environ.get('SWIPE_CACHE_MAX_ROWS', '500000'))
+SWIPE_CACHE_REFRESH_SECONDS = int(os.environ.get('SWIPE_CACHE_REFRESH_SECONDS', '15'))
+# Refetch window behind today's newest cached swipe, for readers uploading offline swipes late
+SWIPE_CACHE_OVERLAP_MINUTES = int(os.environ.get('SWIPE_CACHE_OVERLAP_MINUTES', '30'))
+
+# Closed-period result cache: results for periods that ended before today are kept on disk
+# until invalidated; periods that include today are kept in memory for RESULT_CACHE_OPEN_TTL seconds
+RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR',
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'results'))
+RESULT_CACHE_OPEN_TTL = int(os.environ.get('RESULT_CACHE_OPEN_TTL', '60'))
+RESULT_CACHE_MAX_FILES = int(os.environ.get('RESULT_CACHE_MAX_FILES', '2000'))
+
+# Single-flight: identical concurrent heavy calls share one computation. With advisory locks
+# enabled, workers also queue behind each other and reuse the result from the result cache
+SINGLE_FLIGHT_ADVISORY_LOCKS = os.environ.get('SINGLE_FLIGHT_ADVISORY_LOCKS', 'false').lower() == 'true'
+SINGLE_FLIGHT_LOCK_TIMEOUT = int(os.environ.get('SINGLE_FLIGHT_LOCK_TIMEOUT', '120'))
+
+# In-memory employee directory: how often to check persons/positions/departments for edits
+# (the same probe marks the person_category view for refresh)
+EMPLOYEE_DIRECTORY_PROBE_SECONDS = int(os.environ.get('EMPLOYEE_DIRECTORY_PROBE_SECONDS', '10'))
+# Whole-row checksum comparison (scans the three tables), a safety net for edits the probe misses
+EMPLOYEE_DIRECTORY_CHECKSUM_SECONDS = int(os.environ.get('EMPLOYEE_DIRECTORY_CHECKSUM_SECONDS', '600'))
+
+# Dashboard snapshot: widgets older than these intervals are refreshed in the background
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR',
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'snapshots'))
+DASHBOARD_REFRESH_SECONDS = int(os.environ.get('DASHBOARD_REFRESH_SECONDS', '60'))
+DASHBOARD_BIRTHDAYS_REFRESH_SECONDS = int(os.environ.get('DASHBOARD_BIRTHDAYS_REFRESH_SECONDS', '3600'))
+
+# Conditional GET: version stamps shared by workers, and how long a stamp is trusted for data
+# that may also be written outside the app (the ETag rolls over at least this often)
+DATA_VERSION_DIR = os.environ.get('DATA_VERSION_DIR',
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'versions'))
+CONDITIONAL_GET_MAX_AGE = int(os.environ.get('CONDITIONAL_GET_MAX_AGE', '300'))
+
+# Prometheus metrics (/metrics): per-process values are shared through this directory so all
+# workers are reported together; scrapers authenticate with 'Authorization: Bearer METRICS_TOKEN'
+METRICS_DIR = (os.environ.get('METRICS_MULTIPROC_DIR') or os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+               or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'metrics'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', '5'))
+
+# Query statistics: per-statement totals, slow-query log (statements over SLOW_QUERY_MS) and
+# EXPLAIN (ANALYZE, BUFFERS) plans for a sample of slow SELECTs (EXPLAIN_SAMPLE_RATE, off by default
+# since ANALYZE runs the statement again), kept under QUERY_STATS_DIR
+QUERY_STATS_ENABLED = os.environ.get('QUERY_STATS_ENABLED', 'true').lower() == 'true'
+QUERY_STATS_DIR = os.environ.get('QUERY_STATS_DIR',
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'queries'))
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '500'))
+EXPLAIN_SAMPLE_RATE = float(os.environ.get('EXPLAIN_SAMPLE_RATE', '0'))
+EXPLAIN_INTERVAL_SECONDS = int(os.environ.get('EXPLAIN_INTERVAL_SECONDS', '600'))
+
+# Query budgets: count statements and connections per request / job, report N+1 patterns (one
+# statement repeated QUERY_BUDGET_REPEAT_THRESHOLD times) and budget overruns.
+# QUERY_BUDGET_MODE: off (production default), log (`python app.py` default) or raise (staging, tests)
+QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', 'log' if __name__ == '__main__' else 'off').lower()
+QUERY_BUDGET_DEFAULT = int(os.environ.get('QUERY_BUDGET_DEFAULT', '50'))
+QUERY_BUDGET_MAX_CONNECTIONS = int(os.environ.get('QUERY_BUDGET_MAX_CONNECTIONS', '3'))
+QUERY_BUDGET_REPEAT_THRESHOLD = int(os.environ.get('QUERY_BUDGET_REPEAT_THRESHOLD', '10'))
+
+# Statement budgets of the hot pages and jobs (None: no count budget, N+1 findings only);
+# QUERY_BUDGETS='{"/attendance": 12}' (JSON) overrides entries
+QUERY_BUDGETS = {
+    '/dashboard': 15,
+    '/attendance': 15,
+    '/api/attendance_grid': 15,
+    '/employee_logs': 25,
+    '/employees': 10,
+    '/api/employees_list': 10,
+    'job:late_arrival_check': None,  # one pass per employee by design
+}
+QUERY_BUDGETS.update(json.loads(os.environ.get('QUERY_BUDGETS', '{}')))
+
+# Tracing: spans around the phases of requests and jobs (DB statements, computation steps, template
+# rendering), written for traces slower than TRACE_SLOW_MS, traces that ran a slow query, and a
+# TRACE_SAMPLE_RATE sample. TRACING: jsonl (TRACE_DIR/spans.jsonl), console (stderr) or off
+TRACING = os.environ.get('TRACING', 'off').lower()
+TRACE_DIR = os.environ.get('TRACE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'traces'))
+TRACE_SLOW_MS = float(os.environ.get('TRACE_SLOW_MS', '1000'))
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '0'))
+
+# Sampling profiler (opt-in): samples the stacks of a PROFILE_SAMPLE_RATE fraction of requests every
+# PROFILE_INTERVAL_MS and keeps those slower than PROFILE_THRESHOLD_MS (/admin/profiles). Admins can
+# capture any single request, profiler enabled or not, by adding ?_profile=1 to its URL
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'profiles'))
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0.1'))
+PROFILE_THRESHOLD_MS = float(os.environ.get('PROFILE_THRESHOLD_MS', '2000'))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '5'))
+PROFILE_MAX_CAPTURES = int(os.environ.get('PROFILE_MAX_CAPTURES', '200'))
 
 # Helper dictionary for month names
 EN_MONTHS = {
@@ -130,13 +340,567 @@ def get_current_baku_time():
 def get_db_connection():
     """Tries to connect to the PostgreSQL database."""
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = psycopg2.connect(cursor_factory=InstrumentedCursor, **DB_CONFIG)
         return conn
     except psycopg2.Error as e:
         print(f"🚨 Database connection error: {e}")
         return None
 
 
+# --------------------------------------------------------------------------------------
+# --- TRACING ---
+# --------------------------------------------------------------------------------------
+
+tracer = Tracer(TRACING, TRACE_DIR, slow_ms=TRACE_SLOW_MS, sample_rate=TRACE_SAMPLE_RATE,
+                service_name='hr-attendance')
+
+
+@app.before_request
+def _start_trace():
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    g.trace_root = tracer.start_root(f"{request.method} {route}", traceparent=request.headers.get('traceparent'),
+                                     attributes={'http.method': request.method, 'http.route': route,
+                                                 'http.target': request.full_path.rstrip('?')})
+
+
+@app.after_request
+def _tag_trace(response):
+    root = g.get('trace_root')
+    if root is not None:
+        root.set_attribute('http.status_code', response.status_code)
+        response.headers['X-Trace-Id'] = root.trace_id
+    return response
+
+
+@app.teardown_request
+def _end_trace(exc):
+    exc_type = type(exc) if exc is not None else None
+    # Render spans left open by a template that raised; innermost first so each resets its token
+    for span in reversed(g.pop('render_spans', [])):
+        span.__exit__(exc_type, exc, None)
+    root = g.pop('trace_root', None)
+    if root is not None:
+        root.__exit__(exc_type, exc, None)  # ends the root and resets the current-span contextvar
+
+
+@before_render_template.connect_via(app)
+def _start_render_span(sender, template, context, **extra):
+    if tracer.current_trace_id() is not None:
+        span = tracer.span('render', template=template.name)
+        span.__enter__()
+        g.setdefault('render_spans', []).append(span)
+
+
+@template_rendered.connect_via(app)
+def _end_render_span(sender, template, context, **extra):
+    spans = g.get('render_spans')
+    if spans:
+        spans.pop().__exit__(None, None, None)
+
+
+@add_query_listener
+def _trace_query(event):
+    if tracer.current_trace_id() is None:
+        return
+    _, normalized = fingerprint(event.sql)
+    attributes = {'db.system': 'postgresql', 'db.statement': normalized[:500], 'db.rows': event.rows}
+    if event.error is not None:
+        attributes['error'] = str(event.error)[:200]
+    tracer.record(f"db {normalized.split(None, 1)[0].upper() if normalized else 'query'}", event.seconds,
+                  **attributes)
+    if event.seconds * 1000 >= SLOW_QUERY_MS:
+        tracer.keep()
+
+
+# --------------------------------------------------------------------------------------
+# --- PROFILER ---
+# --------------------------------------------------------------------------------------
+
+profiler = SamplingProfiler(PROFILE_DIR, enabled=PROFILING_ENABLED, sample_rate=PROFILE_SAMPLE_RATE,
+                            threshold_ms=PROFILE_THRESHOLD_MS, interval_ms=PROFILE_INTERVAL_MS,
+                            max_captures=PROFILE_MAX_CAPTURES)
+
+
+@app.before_request
+def _start_profile():
+    if request.endpoint == 'static':
+        return
+    force = request.args.get('_profile') == '1' and session.get('user', {}).get('role') == 'admin'
+    g.profile_session = profiler.start(force=force)
+
+
+@app.after_request
+def _save_profile(response):
+    profile_session = g.pop('profile_session', None)
+    if profile_session is None:
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    args = {key: values for key, values in request.args.lists() if key != '_profile'}
+    capture = profiler.stop(
+        profile_session,
+        route=route,
+        method=request.method,
+        path=request.path,
+        args=args,
+        view_args=request.view_args or {},
+        key=f"{route}?" + '&'.join(f"{key}={','.join(values)}" for key, values in sorted(args.items())),
+        status=response.status_code,
+        user=session.get('user', {}).get('username'),
+        trace_id=tracer.current_trace_id(),
+    )
+    if capture is not None:
+        print(f"🔬 Profiled {request.method} {request.path}: {capture['duration_ms']:.0f} ms, "
+              f"{capture['samples']} samples ({capture['id']})")
+        response.headers['X-Profile-Id'] = capture['id']
+    return response
+
+
+@app.teardown_request
+def _discard_profile(exc):
+    profile_session = g.pop('profile_session', None)
+    if profile_session is not None:
+        profiler.discard(profile_session)
+
+
+# --------------------------------------------------------------------------------------
+# --- METRICS ---
+# --------------------------------------------------------------------------------------
+
+metrics = Metrics(METRICS_DIR, flush_seconds=METRICS_FLUSH_SECONDS, prefix='hr_')
+
+metrics.counter('http_requests_total', 'HTTP requests by route, method and status.')
+metrics.histogram('http_request_duration_seconds', 'Time to produce the response, by route.')
+metrics.histogram('http_request_db_queries', 'Database statements per request, by route.',
+                  buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 1000))
+metrics.histogram('http_request_db_seconds', 'Database time per request, by route.')
+metrics.counter('db_queries_total', 'Database statements, by route (background outside requests).')
+metrics.counter('db_query_seconds_total', 'Database statement time, by route.')
+metrics.counter('db_query_errors_total', 'Failed database statements, by route.')
+metrics.histogram('db_pool_wait_seconds', 'Time spent waiting for a pooled connection.')
+metrics.counter('db_pool_timeouts_total', 'Pooled connection requests that timed out.')
+metrics.gauge('db_pool_connections_in_use', 'Pooled connections currently borrowed.')
+metrics.gauge('db_pool_waiting', 'Threads waiting for a pooled connection.')
+metrics.gauge('db_pool_max_connections', 'Pool size limit (summed over workers).')
+metrics.histogram('job_duration_seconds', 'Background job and cache load durations, by job.',
+                  buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+metrics.counter('job_runs_total', 'Background job runs, by job and outcome.')
+metrics.gauge('cache_hits', 'Cache hits since process start, by cache.')
+metrics.gauge('cache_misses', 'Cache misses since process start, by cache.')
+metrics.add_derived('cache_hit_ratio', 'hits / (hits + misses), by cache.',
+                    lambda values: {labels: hits / (hits + values.get('hr_cache_misses', {}).get(labels, 0))
+                                    for labels, hits in values.get('hr_cache_hits', {}).items()
+                                    if hits + values.get('hr_cache_misses', {}).get(labels, 0) > 0})
+metrics.gauge('cache_last_load_seconds', 'Duration of the last full reload, by cache.', aggregate='max')
+metrics.gauge('snapshot_section_age_seconds', 'Age of the freshest copy of each snapshot section.',
+              aggregate='min')
+metrics.gauge('scheduler_running', '1 if the background late-arrival scheduler runs in any worker.',
+              aggregate='max')
+metrics.gauge('scheduler_last_check_timestamp_seconds', 'Unix time of the last scheduled late-arrival check.',
+              aggregate='max')
+metrics.gauge('startup_seconds', 'Import time of the slowest live worker.', aggregate='max')
+metrics.gauge('swipe_cache_seconds_since_last_swipe', "Time since the newest swipe in today's cached rows.",
+              aggregate='max')
+metrics.gauge('swipe_cache_refresh_age_seconds', "Time since today's cached rows were topped up.",
+              aggregate='max')
+
+# Recent job runs of this process, for the performance page and /api/scheduler_status
+job_history = JobHistory(size=200)
+PROCESS_STARTED = time.time()
+
+
+def _metrics_route():
+    """Route template of the current request ('unmatched' for 404s), a bounded label value."""
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _query_context():
+    """Where a statement runs: the request's route, or 'background' for jobs and refresh threads."""
+    return _metrics_route() if has_request_context() else 'background'
+
+
+@contextmanager
+def timed_job(name):
+    """
+    Records the duration and outcome of a background job or cache load, checks its query budget and
+    traces it (its own trace outside a request, a span of the request's trace inside one).
+    """
+    started = time.perf_counter()
+    outcome = 'error'
+    error = None
+    try:
+        with tracer.root_or_span(f"job:{name}"), query_budget.scope(f"job:{name}"):
+            yield
+        outcome = 'success'
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        metrics.observe('job_duration_seconds', seconds, job=name)
+        metrics.inc('job_runs_total', job=name, outcome=outcome)
+        job_history.record(name, seconds, outcome, error)
+
+
+@add_query_listener
+def _record_query_metrics(event):
+    route = _query_context()
+    if route != 'background':
+        g.db_queries = g.get('db_queries', 0) + 1
+        g.db_seconds = g.get('db_seconds', 0.0) + event.seconds
+    metrics.inc('db_queries_total', route=route)
+    metrics.inc('db_query_seconds_total', event.seconds, route=route)
+    if event.error is not None:
+        metrics.inc('db_query_errors_total', route=route)
+
+
+query_stats = QueryStats(QUERY_STATS_DIR, connect=lambda: psycopg2.connect(**DB_CONFIG),
+                         context_fn=_query_context, slow_ms=SLOW_QUERY_MS,
+                         explain_sample_rate=EXPLAIN_SAMPLE_RATE, explain_interval=EXPLAIN_INTERVAL_SECONDS,
+                         trace_fn=tracer.current_trace_id)
+if QUERY_STATS_ENABLED:
+    add_query_listener(query_stats.record)
+
+query_budget = QueryBudget(QUERY_BUDGET_MODE, budgets=QUERY_BUDGETS, default_budget=QUERY_BUDGET_DEFAULT,
+                           connection_budget=QUERY_BUDGET_MAX_CONNECTIONS,
+                           repeat_threshold=QUERY_BUDGET_REPEAT_THRESHOLD)
+add_query_listener(query_budget.record)
+
+
+@app.before_request
+def _start_request_metrics():
+    g.metrics_started = time.perf_counter()
+    g.db_queries = 0
+    g.db_seconds = 0.0
+
+
+@app.after_request
+def _record_request_metrics(response):
+    started = g.get('metrics_started')
+    if started is not None:
+        route = _metrics_route()
+        metrics.inc('http_requests_total', route=route, method=request.method, status=response.status_code)
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - started, route=route)
+        metrics.observe('http_request_db_queries', g.db_queries, route=route)
+        metrics.observe('http_request_db_seconds', g.db_seconds, route=route)
+    metrics.maybe_flush()
+    if QUERY_STATS_ENABLED:
+        query_stats.maybe_flush()
+    return response
+
+
+@app.before_request
+def _begin_query_budget():
+    g.query_scope = query_budget.begin(_metrics_route())
+
+
+@app.after_request
+def _check_query_budget(response):
+    # In 'raise' mode an overrun turns the response into a 500, so staging and tests notice
+    scope = g.pop('query_scope', None)
+    if scope is not None and query_budget.end(scope) is not None:
+        response.headers['X-Query-Count'] = str(scope.queries)
+        response.headers['X-Query-Connections'] = str(len(scope.connections))
+        response.headers['X-Query-Time-Ms'] = f"{scope.seconds * 1000:.1f}"
+    return response
+
+
+@app.teardown_request
+def _discard_query_budget(exc):
+    scope = g.pop('query_scope', None)
+    if scope is not None:
+        query_budget.discard(scope)
+
+
+@metrics.add_collector
+def _collect_pool_metrics():
+    with _db_pool_usage_lock:
+        usage = dict(_db_pool_usage)
+    yield 'db_pool_connections_in_use', {}, usage['in_use']
+    yield 'db_pool_waiting', {}, usage['waiting']
+    yield 'db_pool_max_connections', {}, DB_POOL_MAX
+
+
+@metrics.add_collector
+def _collect_cache_metrics():
+    caches = {'swipes': swipe_cache.stats(), 'period_results': period_result_cache.stats()}
+    if app.jinja_env.fragment_cache is not None:
+        caches['template_fragments'] = app.jinja_env.fragment_cache.stats()
+    for name, stats in caches.items():
+        yield 'cache_hits', {'cache': name}, stats['hits']
+        yield 'cache_misses', {'cache': name}, stats['misses']
+    yield 'cache_last_load_seconds', {'cache': 'employee_directory'}, employee_directory.stats()['last_load_seconds']
+    yield 'swipe_cache_seconds_since_last_swipe', {}, caches['swipes']['seconds_since_last_swipe']
+    yield 'swipe_cache_refresh_age_seconds', {}, caches['swipes']['today_refresh_age_seconds']
+    yield 'cache_last_load_seconds', {'cache': 'person_categories'}, person_categories.stats()['last_refresh_seconds']
+    for section, age in dashboard_snapshot.ages().items():
+        yield 'snapshot_section_age_seconds', {'snapshot': 'dashboard', 'section': section}, age
+
+
+@metrics.add_collector
+def _collect_process_metrics():
+    yield 'scheduler_running', {}, int(background_scheduler.status()['status'] == 'running')
+    if background_scheduler.last_check is not None:
+        yield 'scheduler_last_check_timestamp_seconds', {}, background_scheduler.last_check.timestamp()
+    profile = startup_profile.snapshot()
+    if profile is not None:
+        yield 'startup_seconds', {}, profile['total_seconds']
+
+
+# --------------------------------------------------------------------------------------
+# --- CONNECTION POOL ---
+# --------------------------------------------------------------------------------------
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+_db_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+_db_pool_usage_lock = threading.Lock()
+_db_pool_usage = {'in_use': 0, 'waiting': 0}
+
+
+def get_db_pool():
+    """Returns the process-wide connection pool, creating it on first use (None if the DB is unreachable)."""
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                try:
+                    _db_pool = psycopg2.pool.ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX,
+                                                                     cursor_factory=InstrumentedCursor,
+                                                                     **DB_CONFIG)
+                except psycopg2.Error as e:
+                    print(f"🚨 Database pool creation error: {e}")
+                    return None
+    return _db_pool
+
+
+def get_pooled_connection():
+    """
+    Borrows a connection from the pool, waiting up to DB_POOL_TIMEOUT seconds for a free slot.
+    Must be handed back with release_pooled_connection().
+    """
+    pool = get_db_pool()
+    if pool is None:
+        return None
+
+    with _db_pool_usage_lock:
+        _db_pool_usage['waiting'] += 1
+    wait_started = time.perf_counter()
+    acquired = _db_pool_slots.acquire(timeout=DB_POOL_TIMEOUT)
+    with _db_pool_usage_lock:
+        _db_pool_usage['waiting'] -= 1
+    metrics.observe('db_pool_wait_seconds', time.perf_counter() - wait_started)
+    if not acquired:
+        metrics.inc('db_pool_timeouts_total')
+        print("🚨 Database pool exhausted: no free connection")
+        return None
+
+    try:
+        conn = pool.getconn()
+    except psycopg2.Error as e:
+        _db_pool_slots.release()
+        print(f"🚨 Pooled connection error: {e}")
+        return None
+    with _db_pool_usage_lock:
+        _db_pool_usage['in_use'] += 1
+    return conn
+
+
+def release_pooled_connection(conn):
+    """Returns a borrowed connection to the pool (broken connections are discarded)."""
+    if conn is None:
+        return
+    try:
+        if not conn.closed:
+            conn.rollback()
+        _db_pool.putconn(conn, close=bool(conn.closed))
+    except (psycopg2.Error, psycopg2.pool.PoolError) as e:
+        print(f"🚨 Pooled connection release error: {e}")
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+    finally:
+        with _db_pool_usage_lock:
+            _db_pool_usage['in_use'] -= 1
+        _db_pool_slots.release()
+
+
+# --------------------------------------------------------------------------------------
+# --- SHARED SWIPE CACHE ---
+# --------------------------------------------------------------------------------------
+
+def _fetch_swipe_rows(since, until):
+    """Loads raw acc_transaction rows for the swipe cache (columns in SWIPE_COLUMNS order)."""
+    conn = get_pooled_connection()
+    if conn is None:
+        raise psycopg2.OperationalError("No pooled database connection available")
+    try:
+        with timed_job('swipe_cache_load'), conn.cursor() as cur:
+            cur.execute("""
+                SELECT t.id, t.card_no, t.name, t.last_name, t.create_time, t.reader_name
+                FROM public.acc_transaction t
+                WHERE t.create_time BETWEEN %s AND %s
+                ORDER BY t.create_time
+            """, (since, until))
+            return cur.fetchall()
+    finally:
+        release_pooled_connection(conn)
+
+
+swipe_cache = SwipeCache(_fetch_swipe_rows, get_current_baku_time,
+                         window_months=SWIPE_CACHE_MONTHS,
+                         max_rows=SWIPE_CACHE_MAX_ROWS,
+                         refresh_seconds=SWIPE_CACHE_REFRESH_SECONDS,
+                         overlap_minutes=SWIPE_CACHE_OVERLAP_MINUTES)
+
+
+def get_cached_swipes(start_date, end_date):
+    """
+    Returns cached (id, card_no, name, last_name, create_time, reader_name) rows for the range,
+    or None if the range is outside the cache window (callers then query the DB directly).
+    """
+    if not swipe_cache.covers(start_date, end_date):
+        return None
+    try:
+        return swipe_cache.get_rows(start_date, end_date)
+    except psycopg2.Error as e:
+        print(f"⚠️ Swipe cache unavailable, querying directly: {e}")
+        return None
+
+
+def _person_data_version():
+    """Token of the persons/positions/departments data (same in every worker), None if unknown."""
+    if not employee_directory.ready():
+        return None
+    version = employee_directory.version()
+    return version[0] if version is not None else None
+
+
+# Results are keyed on the person data version too, so edits to persons never show stale grids
+period_result_cache = PeriodResultCache(RESULT_CACHE_DIR, get_current_baku_time,
+                                        open_ttl=RESULT_CACHE_OPEN_TTL,
+                                        enabled=RESULT_CACHE_ENABLED,
+                                        max_disk_entries=RESULT_CACHE_MAX_FILES,
+                                        version_fn=_person_data_version)
+
+
+def invalidate_attendance_period(start_date=None, end_date=None):
+    """Drops cached swipes and cached results for a corrected period. Returns the number of results removed."""
+    swipe_cache.invalidate(start_date, end_date)
+    return period_result_cache.invalidate(start_date, end_date)
+
+
+# --------------------------------------------------------------------------------------
+# --- SINGLE FLIGHT ---
+# --------------------------------------------------------------------------------------
+
+@contextmanager
+def advisory_lock(key):
+    """
+    Holds a transaction-level Postgres advisory lock for key on a dedicated connection
+    (not a pooled one, so the computation behind it can still use the whole pool).
+    """
+    lock_id = int.from_bytes(hashlib.sha1(repr(key).encode('utf-8')).digest()[:8], 'big', signed=True)
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL lock_timeout = %s", (f"{SINGLE_FLIGHT_LOCK_TIMEOUT}s",))
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (lock_id,))
+        yield
+    finally:
+        conn.close()  # ends the transaction, which releases the lock
+
+
+single_flight = SingleFlight(shared_lock=advisory_lock if SINGLE_FLIGHT_ADVISORY_LOCKS else None,
+                             wait_timeout=SINGLE_FLIGHT_LOCK_TIMEOUT)
+
+
+# --------------------------------------------------------------------------------------
+# --- PERSON CATEGORIES ---
+# --------------------------------------------------------------------------------------
+
+person_categories = PersonCategoryIndex(get_pooled_connection, release_pooled_connection)
+
+
+def category_filter_sql(category, person_alias='p'):
+    """
+    WHERE fragment ('AND ...') limiting person_alias to a category: active, school, teachers
+    or staff (everyone except students, visitors and teachers, in any department).
+    Never queries in the calling thread: dashboard sections call it while holding a pooled
+    connection, and borrowing a second one could starve the pool. The due change probe and
+    view upkeep run in the background; until the view is known to exist the predicates are used.
+    """
+    employee_directory.poll()  # the change probe marks the view dirty on edits
+    person_categories.maybe_refresh()
+    return person_categories.filter_sql(category, person_alias)
+
+
+@app.before_request
+def _check_person_categories():
+    # Once per process, before the request borrows any connection (a no-op afterwards)
+    if person_categories.available is None:
+        person_categories.ensure()
+
+
+@tracer.traced('category_counts')
+def get_category_counts():
+    """{'active', 'school', 'teachers'} person counts for the category tabs."""
+    if employee_directory.ready():
+        return employee_directory.counts(TAB_CATEGORIES)
+    return person_categories.counts()
+
+
+# Persons, positions and departments are small enough to serve lists, dropdowns and
+# searches from memory; the directory reloads itself when the tables change and its change
+# probe also triggers the person_category refresh
+employee_directory = EmployeeDirectory(get_pooled_connection, release_pooled_connection,
+                                       key_fn=lambda value: normalize_name(value),
+                                       probe_seconds=EMPLOYEE_DIRECTORY_PROBE_SECONDS,
+                                       checksum_seconds=EMPLOYEE_DIRECTORY_CHECKSUM_SECONDS,
+                                       on_change=person_categories.mark_dirty)
+
+# Version stamps for conditional GET on data written outside the request path (late-arrival job)
+data_versions = DataVersions(DATA_VERSION_DIR)
+startup_profile.mark('caches')
+
+
+def get_cached_card_transactions(start_date, end_date, category_filter):
+    """
+    Cached equivalent of joining acc_transaction to pers_card/pers_person with category_filter.
+    Returns (p.name, p.last_name, create_time, reader_name) rows, or None if not cacheable.
+    """
+    swipes = get_cached_swipes(start_date, end_date)
+    if swipes is None:
+        return None
+
+    conn = get_pooled_connection()
+    if conn is None:
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT c.card_no, p.name, p.last_name
+                FROM public.pers_card c
+                JOIN public.pers_person p ON c.person_id = p.id
+                LEFT JOIN public.pers_position pp ON p.position_id = pp.id
+                LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
+                WHERE 1=1
+                  {category_filter}
+            """)
+            card_persons = defaultdict(list)
+            for card_no, name, last_name in cur.fetchall():
+                card_persons[card_no].append((name, last_name))
+    except psycopg2.Error as e:
+        print(f"⚠️ Card lookup error, querying directly: {e}")
+        return None
+    finally:
+        release_pooled_connection(conn)
+
+    return [(name, last_name, create_time, reader_name)
+            for _, card_no, _, _, create_time, reader_name in swipes
+            for name, last_name in card_persons.get(card_no, ())]
+
+
 # --------------------------------------------------------------------------------------
 # --- AUTHENTICATION FUNCTIONS ---
 # --------------------------------------------------------------------------------------
@@ -284,7 +1048,7 @@ class BackgroundScheduler:
                 if self.should_check_now():
                     print("🔍 Running background late arrival check...")
                     try:
-                        if LATE_ARRIVAL_SYSTEM_AVAILABLE:
+                        if late_arrival_system_available():
                             check_all_employees_late_arrivals()
                             self.last_check = datetime.now()
                             print("✅ Background check completed")
@@ -297,7 +1061,7 @@ class BackgroundScheduler:
                 if self.should_update_stats():
                     print("📊 Updating monthly statistics...")
                     try:
-                        if LATE_ARRIVAL_SYSTEM_AVAILABLE:
+                        if late_arrival_system_available():
                             update_monthly_statistics()
                             self.last_stats_update = datetime.now()
                             print("✅ Statistics updated")
@@ -415,6 +1179,19 @@ def format_seconds(seconds):
     return f"{hours:02}:{minutes:02}:{secs:02}"
 
 
+def format_age(seconds):
+    """Human readable age of cached data, e.g. 'just now', '45s ago', '3 min ago'."""
+    if seconds is None:
+        return "not available"
+    if seconds < 5:
+        return "just now"
+    if seconds < 60:
+        return f"{int(seconds)}s ago"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} min ago"
+    return f"{int(seconds // 3600)} h ago"
+
+
 def normalize_name(name):
     """Converts name/surname to lowercase and strips whitespace, removing inner spaces."""
     if name is None:
@@ -454,6 +1231,61 @@ def require_login():
     return None
 
 
+def conditional_get(version_fn):
+    """
+    Conditional GET for JSON views whose payload depends only on the request args and a data version.
+    version_fn() returns (token, last_modified) or None (no validators). A matching If-None-Match
+    (or, without it, If-Modified-Since) is answered with 304 before the view touches the database.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            version = version_fn() if 'user' in session else None
+            if version is None:
+                return view(*args, **kwargs)
+
+            token, last_modified = version
+            etag = hashlib.sha1(f"{request.full_path}|{token}".encode('utf-8')).hexdigest()[:32]
+            if request.if_none_match:
+                # Weak comparison: compressed responses carry the ETag as W/"..."
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                not_modified = request.if_modified_since is not None and last_modified <= request.if_modified_since
+
+            if not_modified:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                payload = response.get_json(silent=True) if response.is_json else None
+                if response.status_code != 200 or payload is None or (isinstance(payload, dict) and 'error' in payload):
+                    return response  # errors are never revalidated
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def directory_version():
+    """Data version of responses served from the employee directory."""
+    version = employee_directory.version()
+    if version is None:
+        return None
+    token, loaded_at = version
+    return token, datetime.fromtimestamp(int(loaded_at), tz=timezone.utc)
+
+
+def late_system_version(name):
+    """
+    Data version of today's late-arrival tables. late_arrival_system bumps the stamps when it
+    writes; the day and a CONDITIONAL_GET_MAX_AGE time bucket are mixed in for writes made elsewhere.
+    """
+    token, last_modified = data_versions.get(name)
+    bucket = int(time.time() // CONDITIONAL_GET_MAX_AGE)
+    return f"{token}:{get_current_baku_time().date()}:{bucket}", last_modified
+
+
 def get_available_months(num_months=12):
     """Prepares a list of the last X available months (value: YYYY-MM, label: Month YYYY)."""
     months = []
@@ -480,10 +1312,10 @@ def get_available_months(num_months=12):
 # --- EMPLOYEE MANAGEMENT FUNCTIONS (CRUD/LIST) ---
 # --------------------------------------------------------------------------------------
 
-def get_admin_employees_paginated(page=1, per_page=20, search_term="", category="active"):
-    """Fetches employees with pagination, search and category filter for admin panel."""
-    conn = get_db_connection()
-    if conn is None: 
+def get_admin_employees_paginated(page=1, per_page=20, search_term="", category="active", page_token=None):
+    """Fetches employees with pagination, search and category filter for admin panel.
+    A page_token (keyset cursor from a previous page) takes precedence over the page number."""
+    if not employee_directory.ready():
         return {
             'employees': [], 
             'pagination': {
@@ -494,208 +1326,57 @@ def get_admin_employees_paginated(page=1, per_page=20, search_term="", category=
             'category_counts': {'active': 0, 'school': 0, 'teachers': 0}
         }
 
-    cur = conn.cursor()
-    try:
-        # Category-based WHERE clause (aynı employees sayfasındaki mantık)
-        if category == 'teachers' or category == 'teacher':
-            # Müəllim pozisyonundakiler ama School departmanında OLMAYANLAR
-            where_clause = "WHERE pp.name = 'Müəllim' AND (ad.name IS NULL OR ad.name != 'School')"
-        elif category == 'school':
-            # School departmanındaki HERKES (müəllimleri de dahil)
-            where_clause = "WHERE ad.name = 'School'"
-        else:  # active (administrative)
-            # Aktif çalışanlar: STUDENT, VISITOR, MÜƏLLİM hariç VE School departmanında olmayanlar
-            where_clause = """WHERE (pp.name IS NULL OR (pp.name NOT ILIKE 'STUDENT' 
-                                                        AND pp.name NOT ILIKE 'VISITOR' 
-                                                        AND pp.name NOT ILIKE 'MÜƏLLİM'))
-                                AND (ad.name IS NULL OR ad.name != 'School')"""
-        
-        # Base query
-        base_query = f"""
-            FROM public.pers_person p
-            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-            LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-            {where_clause}
-        """
-        
-        # Search filter
-        search_filter = ""
-        search_params = []
-        if search_term:
-            search_filter = """
-                AND (LOWER(p.name) LIKE %s 
-                     OR LOWER(p.last_name) LIKE %s 
-                     OR LOWER(p.email) LIKE %s 
-                     OR LOWER(pp.name) LIKE %s
-                     OR LOWER(p.name || ' ' || p.last_name) LIKE %s)
-            """
-            search_pattern = f'%{search_term.lower()}%'
-            search_params = [search_pattern] * 5
-        
-        # Count total items
-        count_query = f"SELECT COUNT(*) {base_query} {search_filter}"
-        cur.execute(count_query, search_params)
-        total_items = cur.fetchone()[0]
-        
-        # Calculate pagination
-        total_pages = (total_items + per_page - 1) // per_page
-        if page < 1: page = 1
-        if page > total_pages and total_pages > 0: page = total_pages
-        
-        offset = (page - 1) * per_page
-        
-        # Fetch employees
-        employees_query = f"""
-            SELECT p.id,
-                   p.name,
-                   p.last_name,
-                   p.mobile_phone,
-                   p.email,
-                   p.birthday,
-                   p.photo_path,
-                   pp.name AS position_name,
-                   p.create_time AS hire_date
-            {base_query} {search_filter}
-            ORDER BY p.last_name, p.name
-            LIMIT %s OFFSET %s
-        """
-        
-        params = search_params + [per_page, offset]
-        cur.execute(employees_query, params)
-        
-        employees_raw = cur.fetchall()
-        employees = []
+    # Category + search filter (aynı employees sayfasındaki mantık), served from the directory
+    matches = employee_directory.search(search_term, category)
+    window = paginate(matches, per_page, page=page, page_token=page_token,
+                      scope=('admin', normalize_category(category), search_term))
 
-        for row in employees_raw:
-            try:
-                photo_path = row[6] if row[6] else url_for('static', filename='images/default_avatar.png')
-            except RuntimeError:
-                photo_path = row[6] if row[6] else '/static/images/default_avatar.png'
+    employees = []
+    for person in window['items']:
+        try:
+            photo_path = person.photo_path if person.photo_path else url_for('static', filename='images/default_avatar.png')
+        except RuntimeError:
+            photo_path = person.photo_path if person.photo_path else '/static/images/default_avatar.png'
+
+        employees.append({
+            'id': person.id,
+            'name': person.name,
+            'last_name': person.last_name,
+            'mobile_phone': person.mobile_phone or 'N/A',
+            'email': person.email or 'N/A',
+            'birthday': person.birthday.strftime('%d.%m.%Y') if person.birthday else 'N/A',
+            'photo_path': photo_path,
+            'position': person.position or 'Undefined',
+            'hire_date': person.hire_date.strftime('%d.%m.%Y') if person.hire_date else 'N/A'
+        })
 
-            employees.append({
-                'id': row[0],
-                'name': row[1],
-                'last_name': row[2],
-                'mobile_phone': row[3] or 'N/A',
-                'email': row[4] or 'N/A',
-                'birthday': row[5].strftime('%d.%m.%Y') if row[5] else 'N/A',
-                'photo_path': photo_path,
-                'position': row[7] or 'Undefined',
-                'hire_date': row[8].strftime('%d.%m.%Y') if row[8] else 'N/A'
-            })
-        
+    return {
+        'employees': employees,
+        'pagination': {
+            'current_page': window['current_page'],
+            'total_pages': window['total_pages'],
+            'total_items': window['total_items'],
+            'next_page_token': window['next_token'],
+            'prev_page_token': window['prev_token']
+        },
         # Category counts (aynı employees sayfasındaki mantık)
-        category_counts = {}
-        
-        # Active count - Administrative
-        cur.execute("""
-            SELECT COUNT(*) 
-            FROM public.pers_person p
-            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-            LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-            WHERE (pp.name IS NULL OR (pp.name NOT ILIKE 'STUDENT' 
-                                      AND pp.name NOT ILIKE 'VISITOR' 
-                                      AND pp.name NOT ILIKE 'MÜƏLLİM'))
-              AND (ad.name IS NULL OR ad.name != 'School')
-        """)
-        category_counts['active'] = cur.fetchone()[0]
-        
-        # School count - School departmanındaki herkes
-        cur.execute("""
-            SELECT COUNT(*) 
-            FROM public.pers_person p
-            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-            LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-            WHERE ad.name = 'School'
-        """)
-        category_counts['school'] = cur.fetchone()[0]
-        
-        # Teachers count - Müəllimler ama School departmanında olmayanlar
-        cur.execute("""
-            SELECT COUNT(*) 
-            FROM public.pers_person p
-            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-            LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-            WHERE pp.name = 'Müəllim' AND (ad.name IS NULL OR ad.name != 'School')
-        """)
-        category_counts['teachers'] = cur.fetchone()[0]
-        
-        return {
-            'employees': employees,
-            'pagination': {
-                'current_page': page,
-                'total_pages': total_pages,
-                'total_items': total_items
-            },
-            'category_counts': category_counts
-        }
-        
-    except psycopg2.Error as e:
-        print(f"🚨 Admin Employees Paginated Fetch Error: {e}")
-        return {
-            'employees': [], 
-            'pagination': {
-                'current_page': 1, 
-                'total_pages': 1, 
-                'total_items': 0
-            },
-            'category_counts': {'active': 0, 'school': 0, 'teachers': 0}
-        }
-    finally:
-        if cur: cur.close()
-        if conn: conn.close()
+        'category_counts': get_category_counts()
+    }
 
 
 def get_employee_list():
     """Fetches essential details and positions for all employees (Administrative category - excluding Students, Visitors, Teachers and School department)."""
-    conn = get_db_connection()
-    if conn is None: return []
-
-    cur = conn.cursor()
-    try:
-        cur.execute("""
-                    SELECT p.id,
-                           p.name,
-                           p.last_name,
-                           p.mobile_phone,
-                           p.email,
-                           p.birthday,
-                           pp.name       AS position_name,
-                           p.create_time AS hire_date,
-                           p.photo_path
-                    FROM public.pers_person p
-                             LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-                             LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-                    WHERE (pp.name IS NULL
-                       OR (pp.name NOT ILIKE 'STUDENT' 
-                           AND pp.name NOT ILIKE 'VISITOR'
-                           AND pp.name NOT ILIKE 'MÜƏLLİM')) -- Student, Visitor ve Müəllim Filtresi
-                      AND (ad.name IS NULL OR ad.name != 'School') -- School departmanı hariç
-                    ORDER BY p.last_name, p.name;
-                    """)
-
-        employees_raw = cur.fetchall()
-        employees = []
-
-        for row in employees_raw:
-            employees.append({
-                'id': row[0],
-                'name': row[1],
-                'last_name': row[2],
-                'mobile_phone': row[3] or 'N/A',
-                'email': row[4] or 'N/A',
-                'birthday': row[5].strftime('%d.%m.%Y') if row[5] else 'N/A',
-                'position': row[6] or 'Undefined',
-                'hire_date': row[7].strftime('%d.%m.%Y') if row[7] else 'N/A',
-                'photo_path': row[8] or ''
-            })
-        return employees
-    except psycopg2.Error as e:
-        print(f"🚨 Employee List Fetch Error: {e}")
-        return []
-    finally:
-        if cur: cur.close()
-        if conn: conn.close()
+    return [{
+        'id': person.id,
+        'name': person.name,
+        'last_name': person.last_name,
+        'mobile_phone': person.mobile_phone or 'N/A',
+        'email': person.email or 'N/A',
+        'birthday': person.birthday.strftime('%d.%m.%Y') if person.birthday else 'N/A',
+        'position': person.position or 'Undefined',
+        'hire_date': person.hire_date.strftime('%d.%m.%Y') if person.hire_date else 'N/A',
+        'photo_path': person.photo_path or ''
+    } for person in employee_directory.persons('active')]
 
 
 def get_employee_details(employee_id):
@@ -752,18 +1433,7 @@ def get_employee_details(employee_id):
 
 def get_all_positions():
     """Fetches all positions by ID and Name (for Dropdown)."""
-    conn = get_db_connection()
-    if conn is None: return []
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT id, name FROM public.pers_position ORDER BY name;")
-        return [{'id': row[0], 'name': row[1]} for row in cur.fetchall()]
-    except psycopg2.Error as e:
-        print(f"🚨 Position List Fetch Error: {e}")
-        return []
-    finally:
-        if cur: cur.close()
-        if conn: conn.close()
+    return [dict(position) for position in employee_directory.positions()]
 
 
 def update_employee_details(employee_id, data):
@@ -867,6 +1537,9 @@ def update_employee_details(employee_id, data):
             ))
         conn.commit()
         print(f"✅ Employee {employee_id} updated successfully")
+        # Position may have changed the employee's category
+        person_categories.mark_dirty()
+        employee_directory.invalidate()
         return True, "Employee details successfully updated."
     except psycopg2.Error as e:
         conn.rollback()
@@ -932,6 +1605,8 @@ def delete_employee(employee_id):
         
         conn.commit()
         print(f"✅ Employee and all related records deleted successfully: {employee_name} (ID: {employee_id})")
+        person_categories.mark_dirty()
+        employee_directory.invalidate()
         return True, f"Employee {employee_name} and all related records have been successfully deleted."
         
     except psycopg2.Error as e:
@@ -953,15 +1628,16 @@ def delete_employee(employee_id):
 # --- TIME CALCULATION CORE LOGIC ---
 # --------------------------------------------------------------------------------------
 
-def calculate_times_from_transactions(transactions):
+def calculate_times_from_transactions(transactions, now=None):
     """
     Processes the given log list and calculates the time spent inside/outside.
     If the last event is 'in' and it's not today, mark as invalid day.
+    now (Baku time) defaults to the current time; shard processes get the caller's.
     """
     transactions.sort(key=lambda x: x['time'])
 
     # BAKU TIME FIX: datetime.now().date() -> get_current_baku_time().date()
-    today = get_current_baku_time().date()
+    today = (now or get_current_baku_time()).date()
 
     transaction_dates = set(t['time'].date() for t in transactions)
     is_today = today in transaction_dates
@@ -970,7 +1646,7 @@ def calculate_times_from_transactions(transactions):
     last_out_time = None
 
     # BAKU TIME FIX: datetime.now() -> get_current_baku_time()
-    current_time = get_current_baku_time()
+    current_time = now or get_current_baku_time()
 
     # Find the first 'in' and last 'out'
     in_logs = [t['time'] for t in transactions if t['direction'] == 'in']
@@ -1089,60 +1765,251 @@ def calculate_times_from_transactions(transactions):
 
 def get_employee_list_for_dropdown(category="active"):
     """Returns employee full name and a normalized key for dropdowns (filtered by category)."""
-    conn = get_db_connection()
-    if conn is None: return []
-
-    cur = conn.cursor()
-    
-    # Category-based WHERE clause (aynı diğer sayfalardaki mantık)
-    if category == 'teachers' or category == 'teacher':
-        # Müəllim pozisyonundakiler ama School departmanında OLMAYANLAR
-        category_filter = "AND pp.name = 'Müəllim' AND (ad.name IS NULL OR ad.name != 'School')"
-    elif category == 'school':
-        # School departmanındaki HERKES (müəllimleri de dahil)
-        category_filter = "AND ad.name = 'School'"
-    else:  # active (administrative)
-        # Aktif çalışanlar: STUDENT, VISITOR, MÜƏLLİM hariç VE School departmanında olmayanlar
-        category_filter = """AND (pp.name IS NULL OR (pp.name NOT ILIKE 'STUDENT' 
-                                                      AND pp.name NOT ILIKE 'VISITOR' 
-                                                      AND pp.name NOT ILIKE 'MÜƏLLİM'))
-                            AND (ad.name IS NULL OR ad.name != 'School')"""
-    
+    return [{'key': person.key, 'name': person.full_name} for person in employee_directory.persons(category)]
+
+
+def _fetch_log_transactions(cur, start_date, end_date, category_filter):
+    """Fetches raw (name, last_name, create_time, reader_name) rows for get_employee_logs."""
+    # Fetch transaction logs (Refactored to use pers_card link)
+    cur.execute(f"""
+        SELECT p.name, p.last_name, t.create_time, t.reader_name
+        FROM public.acc_transaction t
+        JOIN public.pers_card c ON t.card_no = c.card_no
+        JOIN public.pers_person p ON c.person_id = p.id
+        LEFT JOIN public.pers_position pp ON p.position_id = pp.id
+        LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
+        WHERE t.create_time BETWEEN %s AND %s
+          {category_filter}
+        ORDER BY t.create_time;
+    """, (start_date, end_date))
+    return cur.fetchall()
+
+
+def _fetch_log_shard(shard_start, shard_end, category_filter):
+    """Fetches one shard of transactions over a pooled connection (runs in a fetch thread)."""
+    cached = get_cached_card_transactions(shard_start, shard_end, category_filter)
+    if cached is not None:
+        return cached
+
+    conn = get_pooled_connection()
+    if conn is None:
+        raise psycopg2.OperationalError("No pooled database connection available")
     try:
-        cur.execute(f"""
-                    SELECT p.name, p.last_name
-                    FROM public.pers_person p
-                             LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-                             LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-                    WHERE 1=1
-                      {category_filter}
-                    ORDER BY p.last_name, p.name
-                    """)
-        employees = []
-        for name, last_name in cur.fetchall():
-            full_name = f"{name} {last_name}"
-            key = normalize_name(name) + normalize_name(last_name)
-            employees.append({'key': key, 'name': full_name})
-
-        return employees
-    except psycopg2.Error as e:
-        print(f"🚨 Employee List Query Error: {e}")
-        return []
+        with conn.cursor() as cur:
+            return _fetch_log_transactions(cur, shard_start, shard_end, category_filter)
     finally:
-        if cur: cur.close()
-        if conn: conn.close()
+        release_pooled_connection(conn)
 
 
-def get_employee_logs(person_key=None, start_date=None, end_date=None, category="active"):
+def _split_into_month_shards(start_date, end_date):
+    """Splits a datetime range into consecutive (start, end) ranges that never cross a month boundary."""
+    shards = []
+    shard_start = start_date
+    while shard_start <= end_date:
+        if shard_start.month == 12:
+            next_month = datetime(shard_start.year + 1, 1, 1)
+        else:
+            next_month = datetime(shard_start.year, shard_start.month + 1, 1)
+        shard_end = min(end_date, next_month - timedelta(microseconds=1))
+        shards.append((shard_start, shard_end))
+        shard_start = next_month
+    return shards
+
+
+def _evaluate_log_shard(raw_transactions, person_key=None, now=None):
     """
-    Calculates the daily summary of time spent inside/outside for the given date range
-    (all employees if person_key is None).
+    Groups raw transaction rows per (date, person) and builds the daily log rows.
+    Returns (logs, first_seen) where first_seen is (date, name, last_name) of the earliest day.
+    Kept at module level so it can be executed in the shard processes (_get_log_shard_processes).
     """
-    conn = get_db_connection()
-    if conn is None: return []
+    daily_transactions = defaultdict(list)
 
-    cur = conn.cursor()
+    # Process transactions and Grouping (Person Name + Date)
+    for t_name, t_last_name, create_time, reader_name in raw_transactions:
+        if create_time is None or not t_name or not t_last_name:
+            continue
+
+        # Create and filter key
+        t_key = normalize_name(t_name) + normalize_name(t_last_name)
+        if person_key and t_key != person_key:
+            continue
+
+        log_date = create_time.date()
+
+        # Turnstile logic update based on name configuration
+        direction_type = None
+        if reader_name:
+            r_name = reader_name.strip()
+            if r_name in TURNSTILE_CONFIG['IN']:
+               direction_type = 'in'
+            elif r_name in TURNSTILE_CONFIG['OUT']:
+               direction_type = 'out'
+
+        if not direction_type:
+            # Eğer rakam bulunamadıysa veya 1-4 arasında değilse, bu kaydı yok say
+            continue
+
+        key = (log_date, t_key)
+        daily_transactions[key].append({
+            'name': t_name,
+            'last_name': t_last_name,
+            'time': create_time,
+            'direction': direction_type
+        })
+
+    # Calculate Time for each day/person
+    final_logs = []
+    first_seen = None
 
+    for (log_date, t_key), transactions in daily_transactions.items():
+        # Use the core calculation function
+        times = calculate_times_from_transactions(transactions, now)
+
+        # Track first date for this employee
+        if first_seen is None or log_date < first_seen[0]:
+            first_seen = (log_date, transactions[0]['name'], transactions[0]['last_name'])
+
+        # Status calculation
+        status_display = ""
+        status_color = ""
+        status_class = ""
+
+        if times['is_invalid_day']:
+            status_display = "⚠ Invalid Data"
+            status_color = "#dc3545"
+            status_class = "invalid"
+        else:
+            total_inside_seconds = times['total_inside_seconds'] or 0
+
+            if total_inside_seconds >= EIGHT_HOURS_SECONDS:
+                status_display = "✓ Full Day"
+                status_color = "#28a745"
+                status_class = "full-day"
+            elif total_inside_seconds > 0:
+                status_display = "⚠ Short Hours"
+                status_color = "#ffc107"
+                status_class = "short-hours"
+            else:
+                status_display = "✗ Absent"
+                status_color = "#dc3545"
+                status_class = "absent"
+
+        # Prepare display values based on validity
+        if times['is_invalid_day']:
+            # Invalid day: giriş var ama çıkış yok ve bugün değil
+            # ANCAK First In değerini göster (çünkü gerçekten girdi)
+            first_in_display = times['first_in'].strftime('%H:%M:%S') if times['first_in'] else 'N/A'
+            last_out_display = "N/A"  # Çıkış yapmadı
+            inside_time_display = "N/A"  # Hesaplanamaz
+            outside_time_display = "N/A"  # Hesaplanamaz
+            total_span_display = "N/A"  # Hesaplanamaz
+        else:
+            # Valid day: normal hesaplama
+            first_in_display = times['first_in'].strftime('%H:%M:%S') if times['first_in'] else 'N/A'
+
+            if times['is_currently_inside']:
+                last_out_display = "Still Inside"
+            else:
+                last_out_display = times['last_out'].strftime('%H:%M:%S') if times['last_out'] else 'N/A'
+
+            inside_time_display = format_seconds(times['total_inside_seconds']) if times['total_inside_seconds'] is not None else "00:00:00"
+            outside_time_display = format_seconds(times['total_outside_seconds']) if times['total_outside_seconds'] is not None else "00:00:00"
+            total_span_display = format_seconds(times['total_span_seconds']) if times['total_span_seconds'] is not None and times['total_span_seconds'] > 0 else "00:00:00"
+
+        final_logs.append({
+            'date': log_date.strftime('%d.%m.%Y'),
+            'name': transactions[0]['name'],
+            'last_name': transactions[0]['last_name'],
+            'first_in': first_in_display,
+            'last_out': last_out_display,
+            'inside_time': inside_time_display,
+            'outside_time': outside_time_display,
+            'total_inside_seconds': times['total_inside_seconds'],
+            'total_outside_seconds': times['total_outside_seconds'],
+            'total_span_seconds': times['total_span_seconds'],
+            'is_currently_inside': times['is_currently_inside'],
+            'is_invalid_day': times['is_invalid_day'],
+            'status_display': status_display,
+            'status_color': status_color,
+            'status_class': status_class
+        })
+
+    return final_logs, first_seen
+
+
+# Both pools are created once per worker process, on first use. Shards are fetched on threads
+# (database waits overlap) and their rows evaluated in spawned processes, so the pure-Python
+# evaluation runs on several cores. Spawned rather than forked: a fork would copy this worker's
+# pooled connections and the locks held by its background threads. The processes import this
+# module once when they start and are reused afterwards
+_log_shard_fetch_pool = None
+_log_shard_processes = None
+_log_shard_pid = None
+_log_shard_pool_lock = threading.Lock()
+
+
+def _get_log_shard_pools():
+    """(fetch threads, evaluation processes) of this process; recreated after a fork (--preload)."""
+    global _log_shard_fetch_pool, _log_shard_processes, _log_shard_pid
+    if _log_shard_pid != os.getpid():
+        with _log_shard_pool_lock:
+            if _log_shard_pid != os.getpid():
+                workers = max(1, LOGS_PARALLEL_WORKERS)
+                _log_shard_fetch_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='log-shard')
+                _log_shard_processes = ProcessPoolExecutor(max_workers=workers,
+                                                           mp_context=multiprocessing.get_context('spawn'))
+                _log_shard_pid = os.getpid()
+    return _log_shard_fetch_pool, _log_shard_processes
+
+
+def _start_log_shard_processes():
+    """Starts the shard processes ahead of the first long range (warm-up)."""
+    if LOGS_PARALLEL_WORKERS > 1:
+        _, processes = _get_log_shard_pools()
+        for future in [processes.submit(os.getpid) for _ in range(LOGS_PARALLEL_WORKERS)]:
+            future.result()
+
+
+def _discard_log_shard_processes():
+    global _log_shard_pid
+    with _log_shard_pool_lock:
+        if _log_shard_processes is not None:
+            _log_shard_processes.shutdown(wait=False, cancel_futures=True)
+        _log_shard_pid = None  # the next call starts fresh pools
+
+
+def _evaluate_log_shards_parallel(shards, category_filter, person_key, now):
+    """
+    Fetches month shards concurrently over the connection pool and evaluates each shard's rows
+    in a shard process as soon as it arrives. Results keep the shard order.
+    """
+    fetch_pool, processes = _get_log_shard_pools()
+    fetches = [fetch_pool.submit(_fetch_log_shard, shard_start, shard_end, category_filter)
+               for shard_start, shard_end in shards]
+    try:
+        evaluations = [processes.submit(_evaluate_log_shard, fetch.result(), person_key, now) for fetch in fetches]
+        return [evaluation.result() for evaluation in evaluations]
+    except BrokenProcessPool:
+        _discard_log_shard_processes()
+        raise
+
+
+def get_employee_logs(person_key=None, start_date=None, end_date=None, category="active", parallel=None):
+    """Employee log summaries; identical concurrent calls share one computation."""
+    return single_flight.do(
+        ('employee_logs', person_key, start_date, end_date, category, parallel),
+        lambda: _compute_employee_logs(person_key, start_date, end_date, category, parallel)
+    )
+
+
+@tracer.traced('employee_logs.compute')
+def _compute_employee_logs(person_key=None, start_date=None, end_date=None, category="active", parallel=None):
+    """
+    Calculates the daily summary of time spent inside/outside for the given date range
+    (all employees if person_key is None).
+    Long ranges are computed in month shards on several processes; parallel=True/False forces the mode,
+    None decides automatically from LOGS_PARALLEL_WORKERS and LOGS_PARALLEL_MIN_DAYS.
+    """
     # BAKU TIME FIX: datetime.now() -> get_current_baku_time()
     current_baku = get_current_baku_time()
 
@@ -1157,165 +2024,65 @@ def get_employee_logs(person_key=None, start_date=None, end_date=None, category=
     else:
         end_date = datetime.combine(end_date, datetime.max.time())
 
-    daily_transactions = defaultdict(list)
-    final_logs = []
-    
     # Category-based WHERE clause
-    if category == 'teachers' or category == 'teacher':
-        # Müəllim pozisyonundakiler ama School departmanında OLMAYANLAR
-        category_filter = "AND pp.name = 'Müəllim' AND (ad.name IS NULL OR ad.name != 'School')"
-    elif category == 'school':
-        # School departmanındaki HERKES (müəllimleri de dahil)
-        category_filter = "AND ad.name = 'School'"
-    else:  # active (administrative)
-        # Aktif çalışanlar: STUDENT, VISITOR, MÜƏLLİM hariç VE School departmanında olmayanlar
-        category_filter = """AND (pp.name IS NULL OR (pp.name NOT ILIKE 'STUDENT' 
-                                                      AND pp.name NOT ILIKE 'VISITOR' 
-                                                      AND pp.name NOT ILIKE 'MÜƏLLİM'))
-                            AND (ad.name IS NULL OR ad.name != 'School')"""
+    category_filter = category_filter_sql(category)
 
-    try:
-        # 1. Fetch transaction logs (Refactored to use pers_card link)
-        cur.execute(f"""
-            SELECT p.name, p.last_name, t.create_time, t.reader_name
-            FROM public.acc_transaction t
-            JOIN public.pers_card c ON t.card_no = c.card_no
-            JOIN public.pers_person p ON c.person_id = p.id
-            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-            LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-            WHERE t.create_time BETWEEN %s AND %s
-              {category_filter}
-            ORDER BY t.create_time;
-        """, (start_date, end_date))
-        raw_transactions = cur.fetchall()
-
-        # 2. Process transactions and Grouping (Person Name + Date)
-        for t_name, t_last_name, create_time, reader_name in raw_transactions:
-            if create_time is None or not t_name or not t_last_name:
-                continue
-
-            # Create and filter key
-            t_key = normalize_name(t_name) + normalize_name(t_last_name)
-            if person_key and t_key != person_key:
-                continue
-
-            log_date = create_time.date()
+    shards = _split_into_month_shards(start_date, end_date)
+    if parallel is None:
+        # Not under run.cgi: the process would start the shard processes for a single request
+        parallel = (LOGS_PARALLEL_WORKERS > 1 and len(shards) > 1 and 'GATEWAY_INTERFACE' not in os.environ
+                    and (end_date - start_date).days >= LOGS_PARALLEL_MIN_DAYS)
 
-            # Turnstile logic update based on name configuration
-            direction_type = None
-            if reader_name:
-                r_name = reader_name.strip()
-                if r_name in TURNSTILE_CONFIG['IN']:
-                   direction_type = 'in'
-                elif r_name in TURNSTILE_CONFIG['OUT']:
-                   direction_type = 'out'
-
-            if not direction_type:
-                # Eğer rakam bulunamadıysa veya 1-4 arasında değilse, bu kaydı yok say
-                continue
-
-            key = (log_date, t_key)
-            daily_transactions[key].append({
-                'name': t_name,
-                'last_name': t_last_name,
-                'time': create_time,
-                'direction': direction_type
-            })
-
-        # 3. Calculate Time for each day/person
-        employee_first_date = None
-        employee_name = ""
-        employee_last_name = ""
-
-        for (log_date, person_key), transactions in daily_transactions.items():
-            # Use the core calculation function
-            times = calculate_times_from_transactions(transactions)
-
-            # Track first date for this employee
-            if employee_first_date is None or log_date < employee_first_date:
-                employee_first_date = log_date
-                employee_name = transactions[0]['name']
-                employee_last_name = transactions[0]['last_name']
+    try:
+        shard_results = None
+        if parallel:
+            tracer.phase('fetch_and_evaluate_parallel', shards=len(shards))
+            try:
+                shard_results = _evaluate_log_shards_parallel(shards, category_filter, person_key, current_baku)
+            except Exception as e:
+                print(f"⚠️ Parallel employee logs failed, falling back to serial: {e}")
 
-            # Status calculation
-            status_display = ""
-            status_color = ""
-            status_class = ""
+        if shard_results is None:
+            tracer.phase('fetch_transactions')
+            raw_transactions = get_cached_card_transactions(start_date, end_date, category_filter)
+            if raw_transactions is None:
+                conn = get_db_connection()
+                if conn is None: return []
 
-            if times['is_invalid_day']:
-                status_display = "⚠ Invalid Data"
-                status_color = "#dc3545"
-                status_class = "invalid"
-            else:
-                total_inside_seconds = times['total_inside_seconds'] or 0
-
-                if total_inside_seconds >= EIGHT_HOURS_SECONDS:
-                    status_display = "✓ Full Day"
-                    status_color = "#28a745"
-                    status_class = "full-day"
-                elif total_inside_seconds > 0:
-                    status_display = "⚠ Short Hours"
-                    status_color = "#ffc107"
-                    status_class = "short-hours"
-                else:
-                    status_display = "✗ Absent"
-                    status_color = "#dc3545"
-                    status_class = "absent"
-
-            # Prepare display values based on validity
-            if times['is_invalid_day']:
-                # Invalid day: giriş var ama çıkış yok ve bugün değil
-                # ANCAK First In değerini göster (çünkü gerçekten girdi)
-                first_in_display = times['first_in'].strftime('%H:%M:%S') if times['first_in'] else 'N/A'
-                last_out_display = "N/A"  # Çıkış yapmadı
-                inside_time_display = "N/A"  # Hesaplanamaz
-                outside_time_display = "N/A"  # Hesaplanamaz
-                total_span_display = "N/A"  # Hesaplanamaz
-            else:
-                # Valid day: normal hesaplama
-                first_in_display = times['first_in'].strftime('%H:%M:%S') if times['first_in'] else 'N/A'
+                cur = conn.cursor()
+                try:
+                    raw_transactions = _fetch_log_transactions(cur, start_date, end_date, category_filter)
+                finally:
+                    if cur: cur.close()
+                    if conn: conn.close()
 
-                if times['is_currently_inside']:
-                    last_out_display = "Still Inside"
-                else:
-                    last_out_display = times['last_out'].strftime('%H:%M:%S') if times['last_out'] else 'N/A'
-
-                inside_time_display = format_seconds(times['total_inside_seconds']) if times['total_inside_seconds'] is not None else "00:00:00"
-                outside_time_display = format_seconds(times['total_outside_seconds']) if times['total_outside_seconds'] is not None else "00:00:00"
-                total_span_display = format_seconds(times['total_span_seconds']) if times['total_span_seconds'] is not None and times['total_span_seconds'] > 0 else "00:00:00"
-
-            final_logs.append({
-                'date': log_date.strftime('%d.%m.%Y'),
-                'name': transactions[0]['name'],
-                'last_name': transactions[0]['last_name'],
-                'first_in': first_in_display,
-                'last_out': last_out_display,
-                'inside_time': inside_time_display,
-                'outside_time': outside_time_display,
-                'total_inside_seconds': times['total_inside_seconds'],
-                'total_outside_seconds': times['total_outside_seconds'],
-                'total_span_seconds': times['total_span_seconds'],
-                'is_currently_inside': times['is_currently_inside'],
-                'is_invalid_day': times['is_invalid_day'],
-                'status_display': status_display,
-                'status_color': status_color,
-                'status_class': status_class
-            })
+            tracer.phase('evaluate', transactions=len(raw_transactions))
+            shard_results = [_evaluate_log_shard(raw_transactions, person_key, current_baku)]
 
-        # 4. Add missing workdays from first data date to today
-        if person_key and employee_first_date:
+        # Merge shard results
+        tracer.phase('merge_and_fill')
+        final_logs = []
+        first_seen = None
+        for shard_logs, shard_first_seen in shard_results:
+            final_logs.extend(shard_logs)
+            if shard_first_seen and (first_seen is None or shard_first_seen[0] < first_seen[0]):
+                first_seen = shard_first_seen
+
+        # Add missing workdays from first data date to today
+        if first_seen:
+            employee_first_date, employee_name, employee_last_name = first_seen
             # BAKU TIME FIX: datetime.now().date() -> get_current_baku_time().date()
             today = get_current_baku_time().date()
             current_date = employee_first_date
+            existing_dates = {log['date'] for log in final_logs}
 
             while current_date <= today:
                 # Check if it's a workday (Monday to Friday)
                 if current_date.weekday() < 5:  # 0=Monday, 4=Friday
                     # Check if we already have data for this date
                     date_str = current_date.strftime('%d.%m.%Y')
-                    existing_log = next((log for log in final_logs if log['date'] == date_str), None)
 
-                    if not existing_log:
+                    if date_str not in existing_dates:
                         # Add missing workday with zero attendance
                         final_logs.append({
                             'date': date_str,
@@ -1338,20 +2105,18 @@ def get_employee_logs(person_key=None, start_date=None, end_date=None, category=
                 current_date += timedelta(days=1)
 
         # Sort from newest to oldest
+        tracer.phase('sort', rows=len(final_logs))
         final_logs.sort(key=lambda x: datetime.strptime(x['date'], '%d.%m.%Y'), reverse=True)
         return final_logs
 
     except Exception as e:
         print(f"🚨 Employee Logs Processing Error: {e}")
         return []
-    finally:
-        if cur: cur.close()
-        if conn: conn.close()
 
 
 @app.context_processor
 def utility_processor():
-    return dict(format_seconds=format_seconds)
+    return dict(format_seconds=format_seconds, format_age=format_age)
 
 
 @app.template_filter('str_to_date')
@@ -1364,6 +2129,7 @@ def str_to_date_filter(date_str):
 
 
 @app.route('/api/employee_search')
+@conditional_get(directory_version)
 def api_employee_search():
     """AJAX endpoint for employee search dropdown"""
     if (redirect_response := require_login()):
@@ -1374,40 +2140,27 @@ def api_employee_search():
     if not search_term or len(search_term) < 2:
         return jsonify([])
 
-    conn = get_db_connection()
-    if conn is None: return jsonify([])
+    results = [{'key': person.key, 'name': person.full_name}
+               for person in employee_directory.search(search_term, 'staff',
+                                                       fields=('name', 'last_name', 'full_name'), limit=20)]
+    return jsonify(results)
 
-    cur = conn.cursor()
-    try:
-        cur.execute("""
-            SELECT p.name, p.last_name 
-            FROM public.pers_person p
-            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-            WHERE (pp.name IS NULL 
-                   OR (pp.name NOT ILIKE 'STUDENT' 
-                       AND pp.name NOT ILIKE 'VISITOR'
-                       AND pp.name NOT ILIKE 'MÜƏLLİM')) -- Student, Visitor ve Müəllim Filtresi
-            AND (LOWER(p.name) LIKE %s OR LOWER(p.last_name) LIKE %s OR LOWER(p.name || ' ' || p.last_name) LIKE %s)
-            ORDER BY p.last_name, p.name
-            LIMIT 20
-        """, (f'%{search_term}%', f'%{search_term}%', f'%{search_term}%'))
-
-        results = []
-        for name, last_name in cur.fetchall():
-            full_name = f"{name} {last_name}"
-            key = normalize_name(name) + normalize_name(last_name)
-            results.append({'key': key, 'name': full_name})
 
-        return jsonify(results)
-    except Exception as e:
-        print(f"🚨 Employee Search Error: {e}")
-        return jsonify([])
-    finally:
-        if cur: cur.close()
-        if conn: conn.close()
+def get_tracked_hours_by_dates(person_key, start_date, end_date):
+    """Tracked hours for an employee and date range, served from the period result cache."""
+    return single_flight.do(
+        ('tracked_hours', person_key, start_date, end_date),
+        lambda: period_result_cache.get_or_compute(
+            'tracked_hours', start_date, end_date, (person_key,),
+            lambda: _compute_tracked_hours_by_dates(person_key, start_date, end_date),
+            is_valid=lambda result: bool(result['logs'])
+        ),
+        shared=True
+    )
 
 
-def get_tracked_hours_by_dates(person_key, start_date, end_date):
+@tracer.traced('tracked_hours.compute')
+def _compute_tracked_hours_by_dates(person_key, start_date, end_date):
     """
     Calculates total worked time (time spent inside) and daily statuses
     for a specific employee within a specific date range, ignoring weekends.
@@ -1428,23 +2181,26 @@ def get_tracked_hours_by_dates(person_key, start_date, end_date):
     end_dt = datetime.combine(end_date, datetime.max.time())
 
     try:
-        # Optimized via JOIN for card linking
-        cur.execute("""
-            SELECT p.name, p.last_name, t.create_time, t.reader_name
-            FROM public.acc_transaction t
-            JOIN public.pers_card c ON t.card_no = c.card_no
-            JOIN public.pers_person p ON c.person_id = p.id
-            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-            WHERE t.create_time BETWEEN %s AND %s
-              AND (pp.name IS NULL 
-                   OR (pp.name NOT ILIKE 'student' 
-                       AND pp.name NOT ILIKE 'visitor'
-                       AND pp.name NOT ILIKE 'müəllim'))
-            ORDER BY t.create_time;
-        """, (start_dt, end_dt))
+        tracer.phase('fetch_transactions')
+        staff_filter = category_filter_sql('staff')
+        raw_transactions = get_cached_card_transactions(start_dt, end_dt, staff_filter)
+
+        if raw_transactions is None:
+            # Optimized via JOIN for card linking
+            cur.execute(f"""
+                SELECT p.name, p.last_name, t.create_time, t.reader_name
+                FROM public.acc_transaction t
+                JOIN public.pers_card c ON t.card_no = c.card_no
+                JOIN public.pers_person p ON c.person_id = p.id
+                LEFT JOIN public.pers_position pp ON p.position_id = pp.id
+                WHERE t.create_time BETWEEN %s AND %s
+                  {staff_filter}
+                ORDER BY t.create_time;
+            """, (start_dt, end_dt))
 
-        raw_transactions = cur.fetchall()
+            raw_transactions = cur.fetchall()
 
+        tracer.phase('grouping', transactions=len(raw_transactions))
         daily_transactions = defaultdict(list)
         for t_name, t_last_name, create_time, reader_name in raw_transactions:
             if create_time is None or not t_name or not t_last_name:
@@ -1472,6 +2228,7 @@ def get_tracked_hours_by_dates(person_key, start_date, end_date):
             daily_transactions[log_date].append({'time': create_time, 'direction': direction_type})
 
         # Calculate working times and status for each day with logs
+        tracer.phase('daily_status', days=len(daily_transactions))
         for log_date, transactions in daily_transactions.items():
             if log_date.weekday() >= 5:
                 continue
@@ -1490,6 +2247,7 @@ def get_tracked_hours_by_dates(person_key, start_date, end_date):
             daily_data[log_date]['status_code'] = status_code
 
         # Prepare Results (Iterating over the entire date range)
+        tracer.phase('rows')
         tracked_logs = []
         current_day = start_date
 
@@ -1748,6 +2506,36 @@ def get_employee_daily_note(employee_id, note_date):
         if conn: conn.close()
 
 
+def get_employee_daily_notes(employee_ids, start_date, end_date):
+    """
+    Fetches the daily notes of several employees over a date range in one query (one page of
+    the attendance grid). Returns {employee_id: {'YYYY-MM-DD': note_text}}; empty notes are skipped.
+    """
+    notes = {}
+    employee_ids = [str(employee_id) for employee_id in employee_ids if employee_id is not None]
+    if not employee_ids:
+        return notes
+
+    conn = get_pooled_connection()
+    if conn is None: return notes
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                        SELECT employee_id, note_date, note_text
+                        FROM public.employee_daily_notes
+                        WHERE employee_id = ANY(%s)
+                          AND note_date BETWEEN %s AND %s
+                          AND note_text <> ''
+                        """, (employee_ids, start_date, end_date))
+            for employee_id, note_date, note_text in cur.fetchall():
+                notes.setdefault(employee_id, {})[note_date.isoformat()] = note_text
+    except psycopg2.Error as e:
+        print(f"🚨 Get Daily Notes Error: {e}")
+    finally:
+        release_pooled_connection(conn)
+    return notes
+
+
 def save_employee_daily_note(employee_id, note_date, note_text, created_by='admin'):
     """Saves or updates daily note for an employee."""
     conn = get_db_connection()
@@ -1776,7 +2564,37 @@ def save_employee_daily_note(employee_id, note_date, note_text, created_by='admi
         if conn: conn.close()
 
 
+@tracer.traced('attendance.monthly')
 def get_employee_logs_monthly(selected_month, selected_year, search_term="", page=1, per_page=PER_PAGE_ATTENDANCE, category="active"):
+    """Monthly attendance grid, served from the period result cache."""
+    try:
+        period_start = date(selected_year, selected_month, 1)
+        period_end = date(selected_year, selected_month, calendar.monthrange(selected_year, selected_month)[1])
+    except ValueError:
+        return _compute_employee_logs_monthly(selected_month, selected_year, search_term, page, per_page, category)
+
+    if search_term and search_term.strip():
+        # Free-text searches are too varied to be worth keeping
+        return _compute_employee_logs_monthly(selected_month, selected_year, search_term, page, per_page, category)
+
+    filters = (search_term, page, per_page, category)
+    result = single_flight.do(
+        ('attendance_monthly', period_start, filters),
+        lambda: period_result_cache.get_or_compute(
+            'attendance_monthly', period_start, period_end, filters,
+            lambda: _compute_employee_logs_monthly(selected_month, selected_year, search_term, page, per_page, category),
+            is_valid=lambda result: result['month_name'] != 'Error'
+        ),
+        shared=True
+    )
+    if result['month_name'] == 'Error':
+        return result
+    # Cached grids keep the tab counts of the moment they were computed; show the current ones
+    return dict(result, category_counts=get_category_counts())
+
+
+@tracer.traced('attendance.monthly.compute')
+def _compute_employee_logs_monthly(selected_month, selected_year, search_term="", page=1, per_page=PER_PAGE_ATTENDANCE, category="active"):
     conn = get_db_connection()
     if conn is None:
         return {'headers': [], 'logs': [], 'current_month': selected_month, 'current_year': selected_year,
@@ -1788,18 +2606,7 @@ def get_employee_logs_monthly(selected_month, selected_year, search_term="", pag
     global EIGHT_HOURS_SECONDS
 
     # Category-based WHERE clause (aynı employees sayfasındaki mantık)
-    if category == 'teachers' or category == 'teacher':
-        # Müəllim pozisyonundakiler ama School departmanında OLMAYANLAR
-        category_filter = "AND pp.name = 'Müəllim' AND (ad.name IS NULL OR ad.name != 'School')"
-    elif category == 'school':
-        # School departmanındaki HERKES (müəllimleri de dahil)
-        category_filter = "AND ad.name = 'School'"
-    else:  # active (administrative)
-        # Aktif çalışanlar: STUDENT, VISITOR, MÜƏLLİM hariç VE School departmanında olmayanlar
-        category_filter = """AND (pp.name IS NULL OR (pp.name NOT ILIKE 'STUDENT' 
-                                                      AND pp.name NOT ILIKE 'VISITOR' 
-                                                      AND pp.name NOT ILIKE 'MÜƏLLİM'))
-                            AND (ad.name IS NULL OR ad.name != 'School')"""
+    category_filter = category_filter_sql(category)
 
     try:
         start_date = date(selected_year, selected_month, 1)
@@ -1829,6 +2636,7 @@ def get_employee_logs_monthly(selected_month, selected_year, search_term="", pag
 
     try:
         # 1. Fetch all employees (FILTERED BY CATEGORY)
+        tracer.phase('fetch_persons')
         if search_term:
             cur.execute(f"""
                         SELECT p.id, p.name, p.last_name, pp.name AS position_name, p.photo_path
@@ -1861,22 +2669,42 @@ def get_employee_logs_monthly(selected_month, selected_year, search_term="", pag
                 {'key': key, 'id': id_val, 'name': name, 'last_name': last_name, 'full_name': full_name, 'photo_path': photo_path})
 
         # 2. Fetch all movements within the date range (FILTERED BY CATEGORY)
-        cur.execute(f"""
-                    SELECT t.name, t.last_name, t.create_time, t.reader_name
-                    FROM public.acc_transaction t
-                             INNER JOIN public.pers_person p ON t.name = p.name AND t.last_name = p.last_name
-                             LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-                             LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-                    WHERE t.create_time >= %s
-                      AND t.create_time <= %s
-                      {category_filter}
-                    ORDER BY t.create_time;
-                    """, (datetime.combine(start_date, datetime.min.time()),
-                          datetime.combine(end_date, datetime.max.time())))
+        tracer.phase('fetch_transactions')
+        range_start = datetime.combine(start_date, datetime.min.time())
+        range_end = datetime.combine(end_date, datetime.max.time())
+        swipes = get_cached_swipes(range_start, range_end)
+
+        if swipes is not None:
+            # Same name-based match as the query below, applied to the shared swipe cache
+            cur.execute(f"""
+                        SELECT p.name, p.last_name
+                        FROM public.pers_person p
+                                 LEFT JOIN public.pers_position pp ON p.position_id = pp.id
+                                 LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
+                        WHERE 1=1
+                          {category_filter}
+                        """)
+            category_names = set(cur.fetchall())
+            raw_transactions = [(name, last_name, create_time, reader_name)
+                                for _, _, name, last_name, create_time, reader_name in swipes
+                                if (name, last_name) in category_names]
+        else:
+            cur.execute(f"""
+                        SELECT t.name, t.last_name, t.create_time, t.reader_name
+                        FROM public.acc_transaction t
+                                 INNER JOIN public.pers_person p ON t.name = p.name AND t.last_name = p.last_name
+                                 LEFT JOIN public.pers_position pp ON p.position_id = pp.id
+                                 LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
+                        WHERE t.create_time >= %s
+                          AND t.create_time <= %s
+                          {category_filter}
+                        ORDER BY t.create_time;
+                        """, (range_start, range_end))
 
-        raw_transactions = cur.fetchall()
+            raw_transactions = cur.fetchall()
 
         # 3. Process transactions and Grouping
+        tracer.phase('grouping', transactions=len(raw_transactions))
         for t_name, t_last_name, create_time, reader_name in raw_transactions:
             if create_time is None or not t_name or not t_last_name:
                 continue
@@ -1906,6 +2734,7 @@ def get_employee_logs_monthly(selected_month, selected_year, search_term="", pag
             daily_transactions[key].append({'time': create_time, 'direction': direction_type})
 
         # 4. Determine Daily Status
+        tracer.phase('daily_status', person_days=len(daily_transactions))
         for (log_date, person_key), transactions in daily_transactions.items():
             if not any(emp['key'] == person_key for emp in employee_list):
                 continue
@@ -1926,6 +2755,7 @@ def get_employee_logs_monthly(selected_month, selected_year, search_term="", pag
             employee_daily_status[person_key][day_number] = status_code
 
         # 5. Prepare Results for HTML
+        tracer.phase('rows', employees=len(employee_list))
         day_headers = []
         current_day = start_date
         while current_day <= end_date:
@@ -1960,6 +2790,7 @@ def get_employee_logs_monthly(selected_month, selected_year, search_term="", pag
             final_logs.append(row)
 
         # 6. Apply Pagination
+        tracer.phase('paginate')
         total_items = len(final_logs)
         total_pages = (total_items + per_page - 1) // per_page
 
@@ -1973,40 +2804,8 @@ def get_employee_logs_monthly(selected_month, selected_year, search_term="", pag
         paginated_logs = final_logs[start_index:end_index]
 
         # Category counts (aynı employees sayfasındaki mantık)
-        category_counts = {}
-        
-        # Active count - Administrative
-        cur.execute("""
-            SELECT COUNT(*) 
-            FROM public.pers_person p
-            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-            LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-            WHERE (pp.name IS NULL OR (pp.name NOT ILIKE 'STUDENT' 
-                                      AND pp.name NOT ILIKE 'VISITOR' 
-                                      AND pp.name NOT ILIKE 'MÜƏLLİM'))
-              AND (ad.name IS NULL OR ad.name != 'School')
-        """)
-        category_counts['active'] = cur.fetchone()[0]
-        
-        # School count - School departmanındaki herkes
-        cur.execute("""
-            SELECT COUNT(*) 
-            FROM public.pers_person p
-            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-            LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-            WHERE ad.name = 'School'
-        """)
-        category_counts['school'] = cur.fetchone()[0]
-        
-        # Teachers count - Müəllimler ama School departmanında olmayanlar
-        cur.execute("""
-            SELECT COUNT(*) 
-            FROM public.pers_person p
-            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-            LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-            WHERE pp.name = 'Müəllim' AND (ad.name IS NULL OR ad.name != 'School')
-        """)
-        category_counts['teachers'] = cur.fetchone()[0]
+        tracer.phase('category_counts')
+        category_counts = get_category_counts()
 
         return {
             'headers': day_headers,
@@ -2033,168 +2832,204 @@ def get_employee_logs_monthly(selected_month, selected_year, search_term="", pag
             conn.close()
 
 
-def get_dashboard_data():
-    conn = get_db_connection()
-    data = {'total_employees': 0, 'total_departments': 0, 'total_transactions': 0,
-            'new_employees_this_month': 0, 'today_birthdays': [],
-            'present_employees_count': 0,
-            'attendance_percentage': 0.0,
-            'absent_employees': [],
-            'late_employees': []}
+def _run_dashboard_query(section_fn):
+    """Runs one dashboard section on a pooled connection; DB errors propagate to the snapshot engine."""
+    conn = get_pooled_connection()
+    if conn is None:
+        raise psycopg2.OperationalError("No pooled database connection available")
+    job = 'dashboard.' + section_fn.__name__.removeprefix('_dashboard_').removesuffix('_section')
+    try:
+        with timed_job(job), conn.cursor() as cur:
+            # BAKU TIME FIX: date.today() -> get_current_baku_time().date()
+            return section_fn(cur, get_current_baku_time().date())
+    finally:
+        release_pooled_connection(conn)
 
-    if conn is None: return data
 
-    cur = conn.cursor()
-    try:
-        # BAKU TIME FIX: date.today() -> get_current_baku_time().date()
-        today_date = get_current_baku_time().date()
+def _dashboard_stats_section(cur, today_date):
+    """Headline counters and today's attendance percentage."""
+    stats_data = {'total_employees': 0, 'total_departments': 0, 'total_transactions': 0,
+                  'new_employees_this_month': 0, 'present_employees_count': 0,
+                  'attendance_percentage': 0.0}
 
-        # OPTIMIZED: Single query for basic stats
-        cur.execute("""
-            WITH employee_stats AS (
-                SELECT 
-                    COUNT(*) as total_employees,
-                    COUNT(CASE WHEN date_trunc('month', p.create_time) = date_trunc('month', NOW()) THEN 1 END) as new_this_month
+    # OPTIMIZED: Single query for basic stats
+    staff_filter = category_filter_sql('staff')
+    cur.execute(f"""
+        WITH employee_stats AS (
+            SELECT 
+                COUNT(*) as total_employees,
+                COUNT(CASE WHEN date_trunc('month', p.create_time) = date_trunc('month', NOW()) THEN 1 END) as new_this_month
+            FROM public.pers_person p
+            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
+            WHERE 1=1 {staff_filter}
+        ),
+        transaction_stats AS (
+            SELECT 
+                COUNT(*) as total_transactions,
+                COUNT(DISTINCT CASE WHEN t.reader_name ILIKE '%%-in%%' THEN (t.name, t.last_name) END) as present_count
+            FROM public.acc_transaction t
+            INNER JOIN public.pers_person p ON t.name = p.name AND t.last_name = p.last_name
+            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
+            WHERE DATE(t.create_time) = %s 
+            {staff_filter}
+        ),
+        department_stats AS (
+            SELECT COUNT(*) as total_departments FROM public.auth_department
+        )
+        SELECT 
+            es.total_employees,
+            es.new_this_month,
+            ts.total_transactions,
+            ts.present_count,
+            ds.total_departments
+        FROM employee_stats es, transaction_stats ts, department_stats ds
+    """, (today_date,))
+    
+    stats = cur.fetchone()
+    if stats:
+        stats_data['total_employees'] = stats[0] or 0
+        stats_data['new_employees_this_month'] = stats[1] or 0
+        stats_data['total_transactions'] = stats[2] or 0
+        stats_data['present_employees_count'] = stats[3] or 0
+        stats_data['total_departments'] = stats[4] or 0
+        
+        # Calculate attendance percentage
+        if stats_data['total_employees'] > 0:
+            percentage = (stats_data['present_employees_count'] / stats_data['total_employees']) * 100
+            stats_data['attendance_percentage'] = round(percentage, 2)
+
+    return stats_data
+
+
+def _dashboard_absent_section(cur, today_date):
+    """Employees without any swipe today."""
+    # OPTIMIZED: Load absent employees with LIMIT for performance
+    cur.execute(f"""
+                SELECT p.name, p.last_name, pp.name as position_name, p.photo_path
                 FROM public.pers_person p
                 LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-                WHERE pp.name IS NULL OR (pp.name NOT ILIKE 'STUDENT' AND pp.name NOT ILIKE 'VISITOR' AND pp.name NOT ILIKE 'MÜƏLLİM')
-            ),
-            transaction_stats AS (
-                SELECT 
-                    COUNT(*) as total_transactions,
-                    COUNT(DISTINCT CASE WHEN t.reader_name ILIKE '%%-in%%' THEN (t.name, t.last_name) END) as present_count
-                FROM public.acc_transaction t
-                INNER JOIN public.pers_person p ON t.name = p.name AND t.last_name = p.last_name
-                LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-                WHERE DATE(t.create_time) = %s 
-                AND (pp.name IS NULL OR (pp.name NOT ILIKE 'student' AND pp.name NOT ILIKE 'visitor' AND pp.name NOT ILIKE 'müəllim'))
-            ),
-            department_stats AS (
-                SELECT COUNT(*) as total_departments FROM public.auth_department
-            )
-            SELECT 
-                es.total_employees,
-                es.new_this_month,
-                ts.total_transactions,
-                ts.present_count,
-                ds.total_departments
-            FROM employee_stats es, transaction_stats ts, department_stats ds
-        """, (today_date,))
-        
-        stats = cur.fetchone()
-        if stats:
-            data['total_employees'] = stats[0] or 0
-            data['new_employees_this_month'] = stats[1] or 0
-            data['total_transactions'] = stats[2] or 0
-            data['present_employees_count'] = stats[3] or 0
-            data['total_departments'] = stats[4] or 0
+                WHERE 1=1 {category_filter_sql('staff')}
+                AND NOT EXISTS (
+                    SELECT 1 
+                    FROM public.acc_transaction t 
+                    WHERE t.name = p.name 
+                    AND t.last_name = p.last_name 
+                    AND DATE(t.create_time) = %s
+                )
+                ORDER BY p.last_name, p.name
+                LIMIT 50
+                """, (today_date,))
+
+    absent_list = []
+    for name, last_name, position, photo_path in cur.fetchall():
+        absent_list.append({
+            'full_name': f"{name} {last_name}",
+            'position': position or 'Undefined',
+            'photo_path': photo_path or ''
+        })
+    return absent_list
+
+
+def _dashboard_late_section(cur, today_date):
+    """Employees whose first entry today is after 09:30."""
+    # BASIT LATE EMPLOYEES: First IN 09:30'dan geç olanlar
+    expected_time = datetime.combine(today_date, datetime.min.time()).replace(hour=9, minute=30)
+    cur.execute(f"""
+        SELECT 
+            p.name, 
+            p.last_name, 
+            p.id as person_id,
+            MIN(t.create_time) as first_in_time,
+            p.photo_path
+        FROM public.pers_person p
+        INNER JOIN public.acc_transaction t ON t.name = p.name AND t.last_name = p.last_name
+        LEFT JOIN public.pers_position pp ON p.position_id = pp.id
+        WHERE DATE(t.create_time) = %s
+          AND (t.reader_name ILIKE '%%1%%' OR t.reader_name ILIKE '%%2%%')
+          {category_filter_sql('staff')}
+        GROUP BY p.name, p.last_name, p.id, p.photo_path
+        HAVING MIN(t.create_time) > %s
+        ORDER BY MIN(t.create_time) DESC
+        LIMIT 30
+    """, (today_date, expected_time))
+
+    late_list = []
+    try:
+        for name, last_name, person_id, first_in_time, photo_path in cur.fetchall():
+            # 09:30'dan ne kadar geç
+            late_minutes = (first_in_time - expected_time).total_seconds() / 60
             
-            # Calculate attendance percentage
-            if data['total_employees'] > 0:
-                percentage = (data['present_employees_count'] / data['total_employees']) * 100
-                data['attendance_percentage'] = round(percentage, 2)
-
-        # OPTIMIZED: Load absent employees with LIMIT for performance
-        cur.execute("""
-                    SELECT p.name, p.last_name, pp.name as position_name, p.photo_path
-                    FROM public.pers_person p
-                    LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-                    WHERE (pp.name IS NULL 
-                           OR (pp.name NOT ILIKE 'STUDENT' 
-                               AND pp.name NOT ILIKE 'VISITOR'
-                               AND pp.name NOT ILIKE 'MÜƏLLİM'))
-                    AND NOT EXISTS (
-                        SELECT 1 
-                        FROM public.acc_transaction t 
-                        WHERE t.name = p.name 
-                        AND t.last_name = p.last_name 
-                        AND DATE(t.create_time) = %s
-                    )
-                    ORDER BY p.last_name, p.name
-                    LIMIT 50
-                    """, (today_date,))
-
-        absent_employees_raw = cur.fetchall()
-        absent_list = []
-        for name, last_name, position, photo_path in absent_employees_raw:
-            absent_list.append({
+            late_list.append({
                 'full_name': f"{name} {last_name}",
-                'position': position or 'Undefined',
+                'person_id': person_id,
+                'expected_time': "09:30",
+                'arrival_time': first_in_time.strftime('%H:%M'),
+                'late_minutes': int(late_minutes),
                 'photo_path': photo_path or ''
             })
-        data['absent_employees'] = absent_list
-
-        # BASIT LATE EMPLOYEES: First IN 09:30'dan geç olanlar
-        cur.execute("""
-            SELECT 
-                p.name, 
-                p.last_name, 
-                p.id as person_id,
-                MIN(t.create_time) as first_in_time,
-                p.photo_path
-            FROM public.pers_person p
-            INNER JOIN public.acc_transaction t ON t.name = p.name AND t.last_name = p.last_name
-            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-            WHERE DATE(t.create_time) = %s
-              AND (t.reader_name ILIKE '%%1%%' OR t.reader_name ILIKE '%%2%%')
-              AND (pp.name IS NULL OR (pp.name NOT ILIKE 'student' AND pp.name NOT ILIKE 'visitor' AND pp.name NOT ILIKE 'müəllim'))
-            GROUP BY p.name, p.last_name, p.id, p.photo_path
-            HAVING MIN(t.create_time) > %s
-            ORDER BY MIN(t.create_time) DESC
-            LIMIT 30
-        """, (today_date, datetime.combine(today_date, datetime.min.time()).replace(hour=9, minute=30)))
-
-        late_employees_raw = cur.fetchall()
+    except Exception as e:
+        print(f"🚨 Late employees processing error: {e}")
         late_list = []
 
-        try:
-            for name, last_name, person_id, first_in_time, photo_path in late_employees_raw:
-                # 09:30'dan ne kadar geç
-                expected_time = datetime.combine(today_date, datetime.min.time()).replace(hour=9, minute=30)
-                late_minutes = (first_in_time - expected_time).total_seconds() / 60
-                
-                late_list.append({
-                    'full_name': f"{name} {last_name}",
-                    'person_id': person_id,
-                    'expected_time': "09:30",
-                    'arrival_time': first_in_time.strftime('%H:%M'),
-                    'late_minutes': int(late_minutes),
-                    'photo_path': photo_path or ''
-                })
-        except Exception as e:
-            print(f"🚨 Late employees processing error: {e}")
-            late_list = []
+    return late_list
 
-        data['late_employees'] = late_list
 
-        # OPTIMIZED: Load birthdays with LIMIT
-        today_m_d = get_current_baku_time().strftime('%m-%d')
-        cur.execute("""
-                    SELECT p.id, p.name, p.last_name, p.birthday, pp.name as position_name, p.photo_path
-                    FROM public.pers_person p
-                    LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-                    WHERE TO_CHAR(p.birthday, 'MM-DD') = %s
-                      AND (pp.name IS NULL OR (pp.name NOT ILIKE 'student' AND pp.name NOT ILIKE 'visitor' AND pp.name NOT ILIKE 'müəllim'))
-                    ORDER BY p.last_name, p.name
-                    LIMIT 20
-                    """, (today_m_d,))
-
-        today_birthdays_raw = cur.fetchall()
-        birthday_list = []
-        for id_val, name, last_name_val, birthday_date, position_name, photo_path in today_birthdays_raw:
-            birth_date_str = birthday_date.strftime('%d.%m.%Y') if isinstance(birthday_date, (datetime, date)) else 'N/A'
-            birthday_list.append({
-                'person_id': id_val, 'name': name, 'surname': last_name_val, 
-                'position': position_name, 'birth_date_str': birth_date_str, 
-                'photo_path': photo_path or ''
-            })
-        data['today_birthdays'] = birthday_list
+def _dashboard_birthdays_section(cur, today_date):
+    """Today's birthdays."""
+    # OPTIMIZED: Load birthdays with LIMIT
+    cur.execute(f"""
+                SELECT p.id, p.name, p.last_name, p.birthday, pp.name as position_name, p.photo_path
+                FROM public.pers_person p
+                LEFT JOIN public.pers_position pp ON p.position_id = pp.id
+                WHERE TO_CHAR(p.birthday, 'MM-DD') = %s
+                  {category_filter_sql('staff')}
+                ORDER BY p.last_name, p.name
+                LIMIT 20
+                """, (today_date.strftime('%m-%d'),))
+
+    birthday_list = []
+    for id_val, name, last_name_val, birthday_date, position_name, photo_path in cur.fetchall():
+        birth_date_str = birthday_date.strftime('%d.%m.%Y') if isinstance(birthday_date, (datetime, date)) else 'N/A'
+        birthday_list.append({
+            'person_id': id_val, 'name': name, 'surname': last_name_val, 
+            'position': position_name, 'birth_date_str': birth_date_str, 
+            'photo_path': photo_path or ''
+        })
+    return birthday_list
 
-    except psycopg2.Error as e:
-        print(f"🚨 Dashboard Query Error: {e}")
-    finally:
-        if cur: cur.close()
-        if conn: conn.close()
+
+# Dashboard widgets are served from a shared snapshot; each section is recomputed in the
+# background by a single worker once its interval has passed (stale-while-revalidate)
+dashboard_snapshot = SnapshotEngine('dashboard', {
+    'stats': (lambda: _run_dashboard_query(_dashboard_stats_section), DASHBOARD_REFRESH_SECONDS),
+    'absent_employees': (lambda: _run_dashboard_query(_dashboard_absent_section), DASHBOARD_REFRESH_SECONDS),
+    'late_employees': (lambda: _run_dashboard_query(_dashboard_late_section), DASHBOARD_REFRESH_SECONDS),
+    'today_birthdays': (lambda: _run_dashboard_query(_dashboard_birthdays_section), DASHBOARD_BIRTHDAYS_REFRESH_SECONDS),
+}, SNAPSHOT_DIR, clock=lambda: get_current_baku_time())
+
+
+@tracer.traced('dashboard.data')
+def get_dashboard_data():
+    data = {'total_employees': 0, 'total_departments': 0, 'total_transactions': 0,
+            'new_employees_this_month': 0, 'today_birthdays': [],
+            'present_employees_count': 0,
+            'attendance_percentage': 0.0,
+            'absent_employees': [],
+            'late_employees': []}
+
+    # Only a cold snapshot is expensive; concurrent first requests wait for the same computation
+    snapshot = single_flight.do(('dashboard',), dashboard_snapshot.get)
+
+    stats, _ = snapshot['stats']
+    if stats:
+        data.update(stats)
+    for section in ('absent_employees', 'late_employees', 'today_birthdays'):
+        value, _ = snapshot[section]
+        if value is not None:
+            data[section] = value
+
+    # Age of every widget section in seconds (None if it could not be computed yet)
+    data['section_ages'] = dashboard_snapshot.ages(snapshot)
     return data
 
 
@@ -2260,6 +3095,7 @@ def employees():
 
 
 @app.route('/api/employees_list')
+@conditional_get(directory_version)
 def api_employees_list():
     """AJAX endpoint for employees list with search, pagination and categories"""
     try:
@@ -2269,128 +3105,47 @@ def api_employees_list():
 
         search_term = request.args.get('search', '').strip().lower()
         page = int(request.args.get('page', 1))
+        page_token = request.args.get('page_token')
         category = request.args.get('category', 'active')
         per_page = 12
 
-        conn = get_db_connection()
-        if conn is None: 
+        if not employee_directory.ready():
             return jsonify({'employees': [], 'pagination': {'current_page': 1, 'total_pages': 1, 'total_items': 0}, 'category_counts': {'active': 0, 'school': 0, 'teachers': 0}})
 
-        cur = conn.cursor()
-        
-        # WHERE clause
-        if category == 'teachers' or category == 'teacher':
-            where_clause = "WHERE pp.name = 'Müəllim' AND (ad.name IS NULL OR ad.name != 'School')"
-        elif category == 'school':
-            where_clause = "WHERE ad.name = 'School'"
-        else:
-            where_clause = """WHERE (pp.name IS NULL OR (pp.name NOT ILIKE 'STUDENT' 
-                                                        AND pp.name NOT ILIKE 'VISITOR' 
-                                                        AND pp.name NOT ILIKE 'MÜƏLLİM'))
-                                AND (ad.name IS NULL OR ad.name != 'School')"""
-        
-        # Search filter
-        search_filter = ""
-        search_params = []
-        if search_term:
-            search_pattern = f'%{search_term}%'
-            search_filter = """
-                AND (LOWER(p.name) LIKE %s 
-                     OR LOWER(p.last_name) LIKE %s 
-                     OR LOWER(p.email) LIKE %s 
-                     OR LOWER(pp.name) LIKE %s
-                     OR LOWER(p.name || ' ' || p.last_name) LIKE %s)
-            """
-            search_params = [search_pattern] * 5
-        
-        # Count query
-        count_query = f"""
-            SELECT COUNT(*) 
-            FROM public.pers_person p
-            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-            LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-            {where_clause} {search_filter}
-        """
-        cur.execute(count_query, search_params)
-        total_items = cur.fetchone()[0]
-        
-        # Pagination
-        total_pages = max(1, (total_items + per_page - 1) // per_page)
-        page = max(1, min(page, total_pages))
-        offset = (page - 1) * per_page
-        
-        # Main query
-        employees_query = f"""
-            SELECT p.id, p.name, p.last_name, p.mobile_phone, p.email, p.birthday,
-                   pp.name AS position_name, p.create_time AS hire_date, p.photo_path,
-                   ad.name AS department_name
-            FROM public.pers_person p
-            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-            LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-            {where_clause} {search_filter}
-            ORDER BY p.last_name, p.name
-            LIMIT %s OFFSET %s
-        """
+        # Category + search filter, served from the in-memory directory
+        matches = employee_directory.search(search_term, category)
         
-        params = search_params + [per_page, offset]
-        cur.execute(employees_query, params)
-        employees_raw = cur.fetchall()
+        # Pagination: keyset token when the client has one, page number otherwise
+        window = paginate(matches, per_page, page=page, page_token=page_token,
+                          scope=('list', normalize_category(category), search_term))
         
         employees = []
-        for row in employees_raw:
+        for person in window['items']:
             employees.append({
-                'id': row[0],
-                'name': row[1],
-                'last_name': row[2],
-                'mobile_phone': row[3] or 'N/A',
-                'email': row[4] or 'N/A',
-                'birthday': row[5].strftime('%d.%m.%Y') if row[5] else 'N/A',
-                'position': row[6] or 'Undefined',
-                'hire_date': row[7].strftime('%d.%m.%Y') if row[7] else 'N/A',
-                'photo_path': row[8] or '',
-                'department': row[9] or 'N/A'
+                'id': person.id,
+                'name': person.name,
+                'last_name': person.last_name,
+                'mobile_phone': person.mobile_phone or 'N/A',
+                'email': person.email or 'N/A',
+                'birthday': person.birthday.strftime('%d.%m.%Y') if person.birthday else 'N/A',
+                'position': person.position or 'Undefined',
+                'hire_date': person.hire_date.strftime('%d.%m.%Y') if person.hire_date else 'N/A',
+                'photo_path': person.photo_path or '',
+                'department': person.department or 'N/A'
             })
         
         # Category counts
-        category_counts = {}
-        
-        cur.execute("""
-            SELECT COUNT(*) FROM public.pers_person p
-            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-            LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-            WHERE (pp.name IS NULL OR (pp.name NOT ILIKE 'STUDENT' 
-                                      AND pp.name NOT ILIKE 'VISITOR' 
-                                      AND pp.name NOT ILIKE 'MÜƏLLİM'))
-              AND (ad.name IS NULL OR ad.name != 'School')
-        """)
-        category_counts['active'] = cur.fetchone()[0]
-        
-        cur.execute("""
-            SELECT COUNT(*) FROM public.pers_person p
-            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-            LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-            WHERE ad.name = 'School'
-        """)
-        category_counts['school'] = cur.fetchone()[0]
-        
-        cur.execute("""
-            SELECT COUNT(*) FROM public.pers_person p
-            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-            LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-            WHERE pp.name = 'Müəllim' AND (ad.name IS NULL OR ad.name != 'School')
-        """)
-        category_counts['teachers'] = cur.fetchone()[0]
-        
-        cur.close()
-        conn.close()
+        category_counts = get_category_counts()
         
         return jsonify({
             'employees': employees,
             'pagination': {
-                'current_page': page,
-                'total_pages': total_pages,
-                'total_items': total_items,
-                'per_page': per_page
+                'current_page': window['current_page'],
+                'total_pages': max(1, window['total_pages']),
+                'total_items': window['total_items'],
+                'per_page': per_page,
+                'next_page_token': window['next_token'],
+                'prev_page_token': window['prev_token']
             },
             'category_counts': category_counts
         })
@@ -2442,36 +3197,42 @@ def export_employees():
 
     employees_list = get_employee_list()
 
-    si = StringIO()
-    cw = csv.writer(si)
-
-    header = [
-        'ID',
-        'Name',
-        'Last Name',
-        'Position',
-        'Email',
-        'Mobile Phone',
-        'Birthday',
-        'Hire Date'
-    ]
-    cw.writerow(header)
-
-    for emp in employees_list:
-        cw.writerow([
-            emp['id'],
-            emp['name'],
-            emp['last_name'],
-            emp['position'],
-            emp['email'],
-            emp['mobile_phone'],
-            emp['birthday'],
-            emp['hire_date']
-        ])
-
-    output = si.getvalue()
-
-    response = make_response(output)
+    def generate():
+        # Rows are streamed (and compressed on the fly) instead of building the whole file first
+        si = StringIO()
+        cw = csv.writer(si)
+
+        header = [
+            'ID',
+            'Name',
+            'Last Name',
+            'Position',
+            'Email',
+            'Mobile Phone',
+            'Birthday',
+            'Hire Date'
+        ]
+        cw.writerow(header)
+
+        for emp in employees_list:
+            cw.writerow([
+                emp['id'],
+                emp['name'],
+                emp['last_name'],
+                emp['position'],
+                emp['email'],
+                emp['mobile_phone'],
+                emp['birthday'],
+                emp['hire_date']
+            ])
+            if si.tell() >= 16384:
+                yield si.getvalue()
+                si.seek(0)
+                si.truncate()
+
+        yield si.getvalue()
+
+    response = make_response(generate())
     response.headers["Content-Disposition"] = "attachment; filename=employees_export.csv"
     response.headers["Content-type"] = "text/csv"
 
@@ -2544,6 +3305,26 @@ def api_get_daily_note():
         return jsonify({'note': ''})
 
 
+@app.route('/api/get_daily_notes', methods=['GET'])
+def api_get_daily_notes():
+    """All notes of a page of employees (comma-separated employee_ids) between start_date and end_date."""
+    if (redirect_response := require_login()):
+        return jsonify({'notes': {}})
+
+    employee_ids = [value for value in request.args.get('employee_ids', '').split(',') if value.strip()]
+    try:
+        start_date = datetime.strptime(request.args.get('start_date', ''), '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.args.get('end_date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'notes': {}})
+
+    # One grid page: at most a few hundred employees over about a month
+    if len(employee_ids) > DAILY_NOTES_MAX_EMPLOYEES or not 0 <= (end_date - start_date).days <= 366:
+        return jsonify({'notes': {}, 'error': 'Range too large'}), 400
+
+    return jsonify({'notes': get_employee_daily_notes(employee_ids, start_date, end_date)})
+
+
 @app.route('/debug_export')
 def debug_export():
     """Debug export issues"""
@@ -2576,36 +3357,8 @@ def debug_export():
     return jsonify(debug_info)
 
 
-@app.route('/employee_logs/export', methods=['GET'])
-def export_employee_logs():
-    if (redirect_response := require_login()): return redirect_response
-
-    person_key = request.args.get('person_key', None)
-    # Convert empty string to None
-    if person_key == '':
-        person_key = None
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
-    category = request.args.get('category', 'active')
-
-    # DEBUG: Log export parameters
-    print(f"🔍 EXPORT DEBUG: person_key='{person_key}', category='{category}'")
-    print(f"🔍 EXPORT DEBUG: person_key type={type(person_key)}, length={len(person_key) if person_key else 0}")
-    if person_key:
-        print(f"🔍 EXPORT DEBUG: person_key bytes={person_key.encode('utf-8').hex()}")
-
-    # Date parsing for export
-    start_date = None
-    end_date = None
-
-    try:
-        if start_date_str:
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-        if end_date_str:
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-    except ValueError:
-        pass
-
+def _build_employee_logs_export(person_key, start_date, end_date, category):
+    """Builds the employee logs Excel file. Returns None if there is nothing to export, raises ValueError on failure."""
     import pandas as pd
     from io import BytesIO
 
@@ -2615,7 +3368,7 @@ def export_employee_logs():
 
     if not logs_data:
         print(f"❌ EXPORT DEBUG: No data found for export")
-        return make_response("No data found for export.", 404)
+        return None
 
     print(f"🔍 EXPORT DEBUG: Processing {len(logs_data)} logs for export...")
 
@@ -2637,34 +3390,76 @@ def export_employee_logs():
         except Exception as e:
             print(f"❌ EXPORT DEBUG: Error processing log {i+1}: {e}")
             print(f"❌ EXPORT DEBUG: Log data: {log}")
-            return make_response(f"Error processing log data: {e}", 500)
+            raise ValueError(f"Error processing log data: {e}")
     print(f"🔍 EXPORT DEBUG: Creating DataFrame with {len(export_list)} records...")
     df = pd.DataFrame(export_list)
 
-    # Create dummy buffer for Excel
-    output = BytesIO()
-    
-    print(f"🔍 EXPORT DEBUG: Creating Excel file...")
-    # Use ExcelWriter for styling (auto-adjust column width)
+    # Create dummy buffer for Excel
+    output = BytesIO()
+    
+    print(f"🔍 EXPORT DEBUG: Creating Excel file...")
+    # Use ExcelWriter for styling (auto-adjust column width)
+    try:
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            df.to_excel(writer, index=False, sheet_name='Employee Logs')
+            
+            # Access the openpyxl workbook and sheet to adjust column widths
+            workbook = writer.book
+            worksheet = writer.sheets['Employee Logs']
+            
+            # Simple column width adjustment
+            for i, col in enumerate(df.columns):
+                max_length = max(df[col].astype(str).map(len).max(), len(col)) + 2
+                worksheet.column_dimensions[chr(65 + i)].width = max_length
+    except Exception as e:
+        print(f"❌ EXPORT DEBUG: Error creating Excel file: {e}")
+        raise ValueError(f"Error creating Excel file: {e}")
+
+    output.seek(0)
+    file_size = len(output.getvalue())
+    print(f"🔍 EXPORT DEBUG: Excel file created successfully ({file_size} bytes)")
+    return output.getvalue()
+
+
+@app.route('/employee_logs/export', methods=['GET'])
+def export_employee_logs():
+    if (redirect_response := require_login()): return redirect_response
+
+    person_key = request.args.get('person_key', None)
+    # Convert empty string to None
+    if person_key == '':
+        person_key = None
+    start_date_str = request.args.get('start_date')
+    end_date_str = request.args.get('end_date')
+    category = request.args.get('category', 'active')
+
+    # DEBUG: Log export parameters
+    print(f"🔍 EXPORT DEBUG: person_key='{person_key}', category='{category}'")
+    print(f"🔍 EXPORT DEBUG: person_key type={type(person_key)}, length={len(person_key) if person_key else 0}")
+    if person_key:
+        print(f"🔍 EXPORT DEBUG: person_key bytes={person_key.encode('utf-8').hex()}")
+
+    # Date parsing for export
+    start_date = None
+    end_date = None
+
+    try:
+        if start_date_str:
+            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+        if end_date_str:
+            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+    except ValueError:
+        pass
+
     try:
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Employee Logs')
-            
-            # Access the openpyxl workbook and sheet to adjust column widths
-            workbook = writer.book
-            worksheet = writer.sheets['Employee Logs']
-            
-            # Simple column width adjustment
-            for i, col in enumerate(df.columns):
-                max_length = max(df[col].astype(str).map(len).max(), len(col)) + 2
-                worksheet.column_dimensions[chr(65 + i)].width = max_length
-    except Exception as e:
-        print(f"❌ EXPORT DEBUG: Error creating Excel file: {e}")
-        return make_response(f"Error creating Excel file: {e}", 500)
+        # Identical exports requested at the same time are built once
+        content = single_flight.do(('export_employee_logs', person_key, start_date, end_date, category),
+                                   lambda: _build_employee_logs_export(person_key, start_date, end_date, category))
+    except ValueError as e:
+        return make_response(str(e), 500)
 
-    output.seek(0)
-    file_size = len(output.getvalue())
-    print(f"🔍 EXPORT DEBUG: Excel file created successfully ({file_size} bytes)")
+    if content is None:
+        return make_response("No data found for export.", 404)
 
     if person_key:
         # Clean person_key for filename (remove special characters)
@@ -2682,7 +3477,7 @@ def export_employee_logs():
 
     print(f"🔍 EXPORT DEBUG: Filename: {filename}")
     
-    response = make_response(output.getvalue())
+    response = make_response(content)
     response.headers["Content-Disposition"] = f"attachment; filename={filename}"
     response.headers["Content-type"] = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 
@@ -2773,49 +3568,7 @@ def employee_logs():
     logs_data = all_logs[start_index:end_index]
 
     # Category counts hesapla
-    conn = get_db_connection()
-    category_counts = {'active': 0, 'school': 0, 'teachers': 0}
-    
-    if conn:
-        cur = conn.cursor()
-        try:
-            # Active count - Administrative
-            cur.execute("""
-                SELECT COUNT(*) 
-                FROM public.pers_person p
-                LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-                LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-                WHERE (pp.name IS NULL OR (pp.name NOT ILIKE 'STUDENT' 
-                                          AND pp.name NOT ILIKE 'VISITOR' 
-                                          AND pp.name NOT ILIKE 'MÜƏLLİM'))
-                  AND (ad.name IS NULL OR ad.name != 'School')
-            """)
-            category_counts['active'] = cur.fetchone()[0]
-            
-            # School count - School departmanındaki herkes
-            cur.execute("""
-                SELECT COUNT(*) 
-                FROM public.pers_person p
-                LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-                LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-                WHERE ad.name = 'School'
-            """)
-            category_counts['school'] = cur.fetchone()[0]
-            
-            # Teachers count - Müəllimler ama School departmanında olmayanlar
-            cur.execute("""
-                SELECT COUNT(*) 
-                FROM public.pers_person p
-                LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-                LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
-                WHERE pp.name = 'Müəllim' AND (ad.name IS NULL OR ad.name != 'School')
-            """)
-            category_counts['teachers'] = cur.fetchone()[0]
-        except Exception as e:
-            print(f"Error calculating category counts: {e}")
-        finally:
-            if cur: cur.close()
-            if conn: conn.close()
+    category_counts = get_category_counts()
 
     return render_template(
         'employee_logs.html',
@@ -2833,10 +3586,8 @@ def employee_logs():
     )
 
 
-@app.route('/attendance', methods=['GET', 'POST'])
-def attendance():
-    if (redirect_response := require_login()): return redirect_response
-
+def _attendance_request_args():
+    """(month, year, page, search_term, category) of an attendance page or grid request."""
     # BAKU TIME FIX: date.today() -> get_current_baku_time().date()
     today = get_current_baku_time().date()
     selected_month = today.month
@@ -2853,6 +3604,28 @@ def attendance():
 
     if search_term and page > 1:
         page = 1
+    return selected_month, selected_year, page, search_term, category
+
+
+def _attendance_page_notes(attendance_data, selected_month, selected_year):
+    """Notes of every employee x day on one grid page, so cells can be marked and notes opened instantly."""
+    if attendance_data.get('month_name') == 'Error' or not attendance_data.get('logs'):
+        return {}
+    try:
+        period_start = date(selected_year, selected_month, 1)
+        period_end = date(selected_year, selected_month, calendar.monthrange(selected_year, selected_month)[1])
+    except ValueError:
+        return {}
+    return get_employee_daily_notes([log['id'] for log in attendance_data['logs']], period_start, period_end)
+
+
+@app.route('/attendance', methods=['GET', 'POST'])
+def attendance():
+    if (redirect_response := require_login()): return redirect_response
+
+    # BAKU TIME FIX: date.today() -> get_current_baku_time().date()
+    today = get_current_baku_time().date()
+    selected_month, selected_year, page, search_term, category = _attendance_request_args()
 
     attendance_data = get_employee_logs_monthly(
         selected_month, 
@@ -2863,6 +3636,8 @@ def attendance():
         category
     )
 
+    daily_notes = _attendance_page_notes(attendance_data, selected_month, selected_year)
+
     years = list(range(today.year - 2, today.year + 1))
 
     months = [
@@ -2877,47 +3652,85 @@ def attendance():
         years=years,
         months=months,
         current_selection={'month': selected_month, 'year': selected_year, 'search': search_term, 'page': page, 'category': category},
-        category_counts=attendance_data.get('category_counts', {'active': 0, 'school': 0, 'teachers': 0})
+        category_counts=attendance_data.get('category_counts', {'active': 0, 'school': 0, 'teachers': 0}),
+        daily_notes=daily_notes
     )
 
 
+@app.route('/api/attendance_grid')
+def api_attendance_grid():
+    """
+    Monthly attendance grid as compact JSON for client-side rendering: weekday headers plus one
+    status string per employee (one of T/E/D/N per weekday), the page's notes and pagination.
+    Responses carry an ETag, so an unchanged grid is answered with 304 Not Modified.
+    """
+    if (redirect_response := require_login()):
+        return jsonify({'error': 'Login required'}), 401
+
+    selected_month, selected_year, page, search_term, category = _attendance_request_args()
+    attendance_data = get_employee_logs_monthly(selected_month, selected_year, search_term, page,
+                                                PER_PAGE_ATTENDANCE, category)
+    if attendance_data.get('month_name') == 'Error':
+        return jsonify({'error': 'Attendance data could not be loaded'}), 503
+
+    response = jsonify({
+        'month': selected_month,
+        'year': selected_year,
+        'month_name': attendance_data['month_name'],
+        'search': search_term,
+        'category': normalize_category(category),
+        'headers': attendance_data['headers'],
+        'rows': [{'id': log['id'], 'name': log['name'], 'photo_path': log.get('photo_path') or '',
+                  'days': ''.join(log['days'])}
+                 for log in attendance_data['logs']],
+        'notes': _attendance_page_notes(attendance_data, selected_month, selected_year),
+        'pagination': {
+            'current_page': attendance_data['current_page'],
+            'total_pages': attendance_data['total_pages'],
+            'total_items': attendance_data['total_items'],
+            'per_page': attendance_data['per_page']
+        },
+        'category_counts': attendance_data.get('category_counts', {'active': 0, 'school': 0, 'teachers': 0})
+    })
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
 @app.route('/api/employees_search')
+@conditional_get(directory_version)
 def api_employees_search():
     if (redirect_response := require_login()): return jsonify([])
 
     search_term = request.args.get('q', '').lower()
 
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify([])
+    results = [{'id': person.key, 'text': person.full_name}
+               for person in employee_directory.search(search_term, 'staff', fields=('name', 'last_name'), limit=10)]
+    return jsonify(results)
 
-    cur = conn.cursor()
-    try:
-        cur.execute("""
-                    SELECT p.name, p.last_name
-                    FROM public.pers_person p
-                             LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-                    WHERE (pp.name IS NULL 
-                           OR (pp.name NOT ILIKE 'student' 
-                               AND pp.name NOT ILIKE 'visitor'
-                               AND pp.name NOT ILIKE 'müəllim')) -- Student, Visitor ve Müəllim Filtresi
-                      AND (LOWER(p.name) LIKE %s OR LOWER(p.last_name) LIKE %s)
-                    ORDER BY p.last_name, p.name LIMIT 10;
-                    """, (f'%{search_term}%', f'%{search_term}%'))
 
-        results = []
-        for name, last_name in cur.fetchall():
-            full_name = f"{name} {last_name}"
-            key = normalize_name(name) + normalize_name(last_name)
-            results.append({'id': key, 'text': full_name})
+def _build_monthly_attendance_export(selected_month, selected_year, search_term):
+    """Builds the monthly attendance CSV. Returns (csv_text, month_name, year) or None if there is no data."""
+    data = get_employee_logs_monthly(selected_month, selected_year, search_term=search_term,
+                                     page=1, per_page=999999)
 
-        return jsonify(results)
-    except psycopg2.Error as e:
-        print(f"🚨 AJAX Search Error: {e}")
-        return jsonify([])
-    finally:
-        if cur: cur.close()
-        if conn: conn.close()
+    if not data or not data.get('logs'):
+        return None
+
+    si = StringIO()
+    cw = csv.writer(si)
+
+    month_name = data.get('month_name', 'Month')
+    year = data.get('current_year', 'Year')
+
+    header = ['EMPLOYEE'] + [str(d) for d in data.get('headers', [])]
+    cw.writerow(header)
+
+    for log in data['logs']:
+        row_data = [log['name']] + log['days']
+        cw.writerow(row_data)
+
+    return si.getvalue(), month_name, year
 
 
 @app.route('/attendance/export', methods=['GET'])
@@ -2933,26 +3746,14 @@ def export_monthly_attendance():
         selected_month = today.month
         selected_year = today.year
 
-    data = get_employee_logs_monthly(selected_month, selected_year, search_term=request.args.get('search', '').strip(),
-                                     page=1, per_page=999999)
-
-    if not data or not data.get('logs'):
+    search_term = request.args.get('search', '').strip()
+    # Identical exports requested at the same time are built once
+    export = single_flight.do(('export_monthly_attendance', selected_month, selected_year, search_term),
+                              lambda: _build_monthly_attendance_export(selected_month, selected_year, search_term))
+    if export is None:
         return make_response("No monthly attendance data found for export.", 404)
 
-    si = StringIO()
-    cw = csv.writer(si)
-
-    month_name = data.get('month_name', 'Month')
-    year = data.get('current_year', 'Year')
-
-    header = ['EMPLOYEE'] + [str(d) for d in data.get('headers', [])]
-    cw.writerow(header)
-
-    for log in data['logs']:
-        row_data = [log['name']] + log['days']
-        cw.writerow(row_data)
-
-    output = si.getvalue()
+    output, month_name, year = export
 
     filename = f"attendance_export_{month_name}_{year}.csv"
     response = make_response(output)
@@ -3023,6 +3824,192 @@ def admin():
     return render_template('admin.html')
 
 
+@app.route('/admin/query_stats')
+def admin_query_stats():
+    """Top SQL statements by total time across workers, recent slow queries and sampled plans."""
+    if (redirect_response := require_login()): return redirect_response
+
+    if session.get('user', {}).get('role') != 'admin':
+        flash("You don't have permission to access this page.", 'danger')
+        return redirect(url_for('dashboard'))
+
+    order_by = request.args.get('order', 'total_ms')
+    if order_by not in ('total_ms', 'mean_ms', 'max_ms', 'calls', 'rows'):
+        order_by = 'total_ms'
+    statements = query_stats.top(limit=50, order_by=order_by)
+    for statement in statements:
+        statement['plan'] = query_stats.plan(statement['fingerprint']) if statement['has_plan'] else None
+
+    return render_template('admin_query_stats.html',
+                           statements=statements,
+                           slow_queries=query_stats.recent_slow(limit=30),
+                           order_by=order_by,
+                           enabled=QUERY_STATS_ENABLED,
+                           slow_ms=SLOW_QUERY_MS,
+                           explain_sample_rate=EXPLAIN_SAMPLE_RATE)
+
+
+@app.route('/admin/query_stats/reset', methods=['POST'])
+def admin_query_stats_reset():
+    if (redirect_response := require_login()): return redirect_response
+
+    if session.get('user', {}).get('role') != 'admin':
+        flash("You don't have permission to access this page.", 'danger')
+        return redirect(url_for('dashboard'))
+
+    query_stats.reset()
+    flash('Query statistics were reset.', 'success')
+    return redirect(url_for('admin_query_stats'))
+
+
+def _performance_overview():
+    """Everything the performance page shows, from in-process counters (routes: all workers)."""
+    with _db_pool_usage_lock:
+        usage = dict(_db_pool_usage)
+    pool_wait = metrics.histogram_summary('db_pool_wait_seconds', quantiles=(0.5, 0.95, 0.99))
+
+    db_queries = {entry['labels'].get('route'): entry['mean']
+                  for entry in metrics.histogram_summary('http_request_db_queries', quantiles=())}
+    routes = metrics.histogram_summary('http_request_duration_seconds', quantiles=(0.5, 0.95, 0.99))
+    for entry in routes:
+        entry['route'] = entry['labels'].get('route', '')
+        entry['db_queries'] = db_queries.get(entry['route'])
+    routes.sort(key=lambda entry: -entry['quantiles'][0.95])
+
+    swipes = swipe_cache.stats()
+    period_results = period_result_cache.stats()
+    fragments = app.jinja_env.fragment_cache.stats() if app.jinja_env.fragment_cache is not None else None
+    directory = employee_directory.stats()
+    caches = [
+        {'name': 'Swipe cache', 'size': f"{swipes['rows']:,} rows / {swipes['days']} days "
+                                        f"({', '.join(swipes['months']) or 'empty'})",
+         'hits': swipes['hits'], 'misses': swipes['misses']},
+        {'name': 'Period results', 'size': f"{period_results['memory_entries']} in memory, "
+                                           f"{period_results['disk_entries']} on disk",
+         'hits': period_results['hits'], 'misses': period_results['misses']},
+        {'name': 'Employee directory', 'size': f"{directory['persons']:,} persons", 'hits': None, 'misses': None,
+         'age_seconds': directory['age_seconds']},
+    ]
+    if fragments is not None:
+        caches.append({'name': 'Template fragments', 'size': f"{fragments['entries']} entries",
+                       'hits': fragments['hits'], 'misses': fragments['misses']})
+    for cache in caches:
+        lookups = (cache['hits'] or 0) + (cache['misses'] or 0)
+        cache['hit_rate'] = cache['hits'] / lookups if lookups else None
+
+    return {
+        'process': {'pid': os.getpid(), 'uptime_seconds': time.time() - PROCESS_STARTED,
+                    'startup': startup_profile.snapshot(top=0)},
+        'pool': {'in_use': usage['in_use'], 'waiting': usage['waiting'], 'min': DB_POOL_MIN, 'max': DB_POOL_MAX,
+                 'utilization': usage['in_use'] / DB_POOL_MAX if DB_POOL_MAX else 0.0,
+                 'wait': pool_wait[0] if pool_wait else None},
+        'caches': caches,
+        'watermark': {'today_watermark': swipes['today_watermark'],
+                      'seconds_since_last_swipe': swipes['seconds_since_last_swipe'],
+                      'refresh_age_seconds': swipes['today_refresh_age_seconds'],
+                      'refresh_interval_seconds': SWIPE_CACHE_REFRESH_SECONDS},
+        'snapshot_ages': dashboard_snapshot.ages(),
+        'single_flight': single_flight.stats(),
+        'jobs': job_history.summary(),
+        'recent_runs': [dict(run, finished_at=datetime.fromtimestamp(run['finished_at']).strftime('%Y-%m-%d %H:%M:%S'))
+                        for run in job_history.recent(limit=30)],
+        'scheduler': background_scheduler.status(),
+        'routes': routes[:15],
+        'queries': query_stats.top(limit=10, order_by='total_ms') if QUERY_STATS_ENABLED else [],
+        'tracing': tracer.stats(),
+        'profiler': profiler.stats(),
+        'query_budget': query_budget.stats(),
+    }
+
+
+@app.route('/admin/performance')
+def admin_performance():
+    """Live pool, cache, job, route and query statistics (add ?refresh=N to reload every N seconds)."""
+    if (redirect_response := require_login()): return redirect_response
+
+    if session.get('user', {}).get('role') != 'admin':
+        flash("You don't have permission to access this page.", 'danger')
+        return redirect(url_for('dashboard'))
+
+    refresh = request.args.get('refresh', type=int)
+    return render_template('admin_performance.html',
+                           overview=_performance_overview(),
+                           refresh=max(refresh, 5) if refresh else None)
+
+
+@app.route('/api/performance')
+def api_performance():
+    """The performance page's data as JSON."""
+    if (redirect_response := require_login()):
+        return jsonify({'error': 'Login required'}), 401
+    if session.get('user', {}).get('role') != 'admin':
+        return jsonify({'error': 'Forbidden'}), 403
+
+    overview = _performance_overview()
+    for entry in overview['routes']:
+        entry['quantiles'] = {str(q): value for q, value in entry['quantiles'].items()}
+    if overview['pool']['wait'] is not None:
+        overview['pool']['wait']['quantiles'] = {str(q): value for q, value in overview['pool']['wait']['quantiles'].items()}
+    return jsonify(overview)
+
+
+@app.route('/admin/profiles')
+def admin_profiles():
+    """Recent sampling-profiler captures of slow (or admin-forced) requests, optionally for one route."""
+    if (redirect_response := require_login()): return redirect_response
+
+    if session.get('user', {}).get('role') != 'admin':
+        flash("You don't have permission to access this page.", 'danger')
+        return redirect(url_for('dashboard'))
+
+    route = request.args.get('route', '')
+    return render_template('admin_profiles.html',
+                           captures=profiler.captures(limit=100, route=route or None),
+                           route=route,
+                           enabled=PROFILING_ENABLED,
+                           sample_rate=PROFILE_SAMPLE_RATE,
+                           threshold_ms=PROFILE_THRESHOLD_MS,
+                           interval_ms=PROFILE_INTERVAL_MS)
+
+
+@app.route('/admin/profiles/<capture_id>')
+def admin_profile(capture_id):
+    if (redirect_response := require_login()): return redirect_response
+
+    if session.get('user', {}).get('role') != 'admin':
+        flash("You don't have permission to access this page.", 'danger')
+        return redirect(url_for('dashboard'))
+
+    capture = profiler.capture(capture_id)
+    if capture is None:
+        flash('Profile capture not found.', 'warning')
+        return redirect(url_for('admin_profiles'))
+
+    return render_template('admin_profile.html',
+                           capture=capture,
+                           flame=profiler.flame_tree(capture),
+                           hot_functions=profiler.hot_functions(capture))
+
+
+@app.route('/admin/profiles/<capture_id>/folded')
+def admin_profile_folded(capture_id):
+    """The capture as folded stacks, for flamegraph.pl, speedscope or inferno."""
+    if (redirect_response := require_login()): return redirect_response
+
+    if session.get('user', {}).get('role') != 'admin':
+        flash("You don't have permission to access this page.", 'danger')
+        return redirect(url_for('dashboard'))
+
+    capture = profiler.capture(capture_id)
+    if capture is None:
+        return 'Not found', 404
+
+    response = make_response(profiler.folded(capture))
+    response.headers['Content-Type'] = 'text/plain; charset=utf-8'
+    response.headers['Content-Disposition'] = f'attachment; filename="{capture_id}.folded"'
+    return response
+
+
 @app.route('/admin/users')
 def admin_users():
     if (redirect_response := require_login()): return redirect_response
@@ -3107,7 +4094,8 @@ def admin_employees():
         page=page, 
         per_page=per_page, 
         search_term=search_term,
-        category=category
+        category=category,
+        page_token=request.args.get('page_token')
     )
     
     return render_template('admin_employees.html', 
@@ -3173,6 +4161,31 @@ def admin_delete_employee(employee_id):
     return redirect(url_for('admin_employees'))
 
 
+@app.route('/admin/attendance_cache/invalidate', methods=['POST'])
+def admin_invalidate_attendance_period():
+    if (redirect_response := require_login()): return redirect_response
+    
+    # Admin yetkisi kontrolü
+    if session.get('user', {}).get('role') != 'admin':
+        flash("You don't have permission to access this page.", 'danger')
+        return redirect(url_for('dashboard'))
+    
+    try:
+        start_date = datetime.strptime(request.form.get('start_date', ''), '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.form.get('end_date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        flash("Please select a valid start and end date.", 'danger')
+        return redirect(url_for('admin'))
+    
+    if start_date > end_date:
+        start_date, end_date = end_date, start_date
+    
+    removed = invalidate_attendance_period(start_date, end_date)
+    flash(f"Cached attendance for {start_date.strftime('%d.%m.%Y')} - {end_date.strftime('%d.%m.%Y')} "
+          f"was invalidated ({removed} cached results removed).", 'success')
+    return redirect(url_for('admin'))
+
+
 @app.route('/admin/users/add', methods=['GET', 'POST'])
 def admin_add_user():
     if (redirect_response := require_login()): return redirect_response
@@ -3279,19 +4292,36 @@ def employee_daily_details(employee_name, log_date):
         cur = conn.cursor()
         
         # Get all transactions for this employee on this date
-        cur.execute("""
-            SELECT t.create_time, t.reader_name, t.name, t.last_name
-            FROM public.acc_transaction t
-            INNER JOIN public.pers_person p ON t.name = p.name AND t.last_name = p.last_name
-            LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-            WHERE t.name = %s 
-            AND t.last_name = %s
-            AND DATE(t.create_time) = %s
-            AND (pp.name IS NULL OR (pp.name NOT ILIKE 'student' AND pp.name NOT ILIKE 'visitor' AND pp.name NOT ILIKE 'müəllim'))
-            ORDER BY t.create_time
-        """, (first_name, last_name, target_date))
-        
-        raw_transactions = cur.fetchall()
+        swipes = get_cached_swipes(datetime.combine(target_date, datetime.min.time()),
+                                   datetime.combine(target_date, datetime.max.time()))
+        if swipes is not None:
+            cur.execute(f"""
+                SELECT 1
+                FROM public.pers_person p
+                LEFT JOIN public.pers_position pp ON p.position_id = pp.id
+                WHERE p.name = %s
+                AND p.last_name = %s
+                {category_filter_sql('staff')}
+                LIMIT 1
+            """, (first_name, last_name))
+            person_found = cur.fetchone() is not None
+            raw_transactions = [(create_time, reader_name, t_name, t_last_name)
+                                for _, _, t_name, t_last_name, create_time, reader_name in swipes
+                                if person_found and t_name == first_name and t_last_name == last_name]
+        else:
+            cur.execute(f"""
+                SELECT t.create_time, t.reader_name, t.name, t.last_name
+                FROM public.acc_transaction t
+                INNER JOIN public.pers_person p ON t.name = p.name AND t.last_name = p.last_name
+                LEFT JOIN public.pers_position pp ON p.position_id = pp.id
+                WHERE t.name = %s 
+                AND t.last_name = %s
+                AND DATE(t.create_time) = %s
+                {category_filter_sql('staff')}
+                ORDER BY t.create_time
+            """, (first_name, last_name, target_date))
+            
+            raw_transactions = cur.fetchall()
         
         # Process transactions
         transactions = []
@@ -3379,6 +4409,7 @@ def admin_late_system():
 
 
 @app.route('/api/todays_emails')
+@conditional_get(lambda: late_system_version('late_arrival_emails'))
 def api_todays_emails():
     """Bugün gönderilen emailleri getir"""
     if (redirect_response := require_login()):
@@ -3417,6 +4448,7 @@ def api_todays_emails():
 
 
 @app.route('/api/todays_late_arrivals')
+@conditional_get(lambda: late_system_version('late_arrivals'))
 def api_todays_late_arrivals():
     """Bugün geç gelen çalışanları getir"""
     if (redirect_response := require_login()):
@@ -3466,7 +4498,7 @@ def api_update_statistics():
         return jsonify({'error': 'Login required'})
     
     try:
-        if LATE_ARRIVAL_SYSTEM_AVAILABLE:
+        if late_arrival_system_available():
             update_monthly_statistics()
             return jsonify({'success': True, 'message': 'Statistics updated successfully'})
         else:
@@ -3482,7 +4514,7 @@ def api_quick_late_test():
         return jsonify({'error': 'Login required'})
     
     try:
-        if not LATE_ARRIVAL_SYSTEM_AVAILABLE:
+        if not late_arrival_system_available():
             return jsonify({'success': False, 'error': 'Late arrival system not available'})
         
         from late_arrival_system import get_employee_first_entry_today, check_employee_late_arrival
@@ -3494,14 +4526,11 @@ def api_quick_late_test():
             return jsonify({'success': False, 'error': 'Database connection failed'})
         
         cur = conn.cursor()
-        cur.execute("""
+        cur.execute(f"""
             SELECT p.id, p.name, p.last_name
             FROM public.pers_person p
             LEFT JOIN public.pers_position pp ON p.position_id = pp.id
-            WHERE (pp.name IS NULL 
-                   OR (pp.name NOT ILIKE 'STUDENT' 
-                       AND pp.name NOT ILIKE 'VISITOR'
-                       AND pp.name NOT ILIKE 'MÜƏLLİM'))
+            WHERE 1=1 {category_filter_sql('staff')}
             ORDER BY p.last_name, p.name
             LIMIT 5
         """)
@@ -3531,31 +4560,73 @@ def api_quick_late_test():
         return jsonify({'success': False, 'error': str(e)})
 
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text exposition for all workers (bearer METRICS_TOKEN, or an admin session)."""
+    authorized = session.get('user', {}).get('role') == 'admin'
+    if METRICS_TOKEN:
+        authorization = request.headers.get('Authorization', '')
+        authorized = authorized or secrets.compare_digest(authorization, f"Bearer {METRICS_TOKEN}")
+    if not authorized:
+        return jsonify({'error': 'Unauthorized'}), 401
+    response = make_response(metrics.render())
+    response.headers['Content-Type'] = METRICS_CONTENT_TYPE
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@app.route('/health/live')
+def health_live():
+    """Liveness: the worker answers requests. No database or other I/O, safe to poll every second."""
+    return jsonify({
+        'status': 'OK',
+        'pid': os.getpid(),
+        'uptime_seconds': round(time.time() - PROCESS_STARTED, 1),
+        'timestamp': datetime.now().isoformat()
+    })
+
+
 @app.route('/health')
+@app.route('/health/ready')
 def health_check():
-    """Health check endpoint for Railway"""
+    """
+    Readiness (Railway's health check): a pooled connection answers SELECT 1 and the pool is not
+    exhausted. 503 when the worker cannot serve pages; late arrival system and scheduler are reported.
+    """
+    checks = {}
+    ready = True
     try:
-        # Test database connection
-        conn = get_db_connection()
-        if conn:
-            conn.close()
-            db_status = "OK"
+        with _db_pool_usage_lock:
+            usage = dict(_db_pool_usage)
+        checks['pool'] = {'in_use': usage['in_use'], 'waiting': usage['waiting'], 'max': DB_POOL_MAX}
+
+        started = time.perf_counter()
+        # An exhausted pool would make the probe wait DB_POOL_TIMEOUT; it is not ready either way
+        conn = get_pooled_connection() if usage['in_use'] < DB_POOL_MAX else None
+        if conn is None:
+            checks['database'] = {'status': 'FAILED', 'error': ('pool exhausted' if usage['in_use'] >= DB_POOL_MAX
+                                                                else 'no pooled connection')}
+            ready = False
         else:
-            db_status = "FAILED"
-        
-        # Test late arrival system
-        late_system_status = "OK" if LATE_ARRIVAL_SYSTEM_AVAILABLE else "NOT_AVAILABLE"
-        
-        # Test scheduler
-        scheduler_status = background_scheduler.status()
-        
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                    cur.fetchone()
+                checks['database'] = {'status': 'OK', 'ms': round((time.perf_counter() - started) * 1000, 1)}
+            except psycopg2.Error as e:
+                checks['database'] = {'status': 'FAILED', 'error': str(e).strip()}
+                ready = False
+            finally:
+                release_pooled_connection(conn)
+
+        checks['late_arrival_system'] = late_arrival_system_status()
+        checks['scheduler'] = background_scheduler.status()
+
         return jsonify({
-            'status': 'OK',
-            'database': db_status,
-            'late_arrival_system': late_system_status,
-            'scheduler': scheduler_status,
+            'status': 'OK' if ready else 'UNAVAILABLE',
+            'checks': checks,
             'timestamp': datetime.now().isoformat()
-        })
+        }), 200 if ready else 503
     except Exception as e:
         return jsonify({
             'status': 'ERROR',
@@ -3577,13 +4648,24 @@ def api_scheduler_status():
         return jsonify({'error': 'Login required'})
     
     try:
-        # Production'da scheduler disabled
+        # Live state of this worker's scheduler, plus the late-arrival runs (scheduled or manual) it saw
+        status = background_scheduler.status()
+        jobs = {name: job_history.last(name) for name in ('late_arrival_check', 'monthly_statistics')}
         return jsonify({
-            'status': 'disabled_in_production',
-            'message': 'Background scheduler is disabled in production to prevent worker timeouts',
-            'manual_control': 'Use admin panel for manual checks',
-            'last_check': None,
-            'last_stats_update': None
+            'status': status['status'],
+            'message': ('Background scheduler is running' if status['status'] == 'running'
+                        else 'Background scheduler is not running in this worker; use the admin panel for manual checks'),
+            'last_check': status.get('last_check'),
+            'last_stats_update': status.get('last_stats_update'),
+            'late_arrival_system': late_arrival_system_status(),
+            'jobs': {name: ({'last_run': datetime.fromtimestamp(entry['last_run']).isoformat(),
+                             'last_outcome': entry['last_outcome'],
+                             'last_seconds': round(entry['last_seconds'], 3),
+                             'runs': entry['runs'], 'errors': entry['errors']} if entry else None)
+                     for name, entry in jobs.items()},
+            'recent_runs': [dict(run, finished_at=datetime.fromtimestamp(run['finished_at']).isoformat())
+                            for run in job_history.recent(limit=10)
+                            if run['job'] in jobs]
         })
     except Exception as e:
         return jsonify({'error': str(e)})
@@ -3615,7 +4697,7 @@ def api_manual_late_check():
         return jsonify({'error': 'Login required'})
     
     try:
-        if LATE_ARRIVAL_SYSTEM_AVAILABLE:
+        if late_arrival_system_available():
             # Background thread'de çalıştır - timeout'u önlemek için
             import threading
             
@@ -3987,6 +5069,68 @@ Late Arrival System - SendGrid Test
         }
 
 
+# --------------------------------------------------------------------------------------
+# --- STARTUP WARM-UP ---
+# --------------------------------------------------------------------------------------
+
+# Templates compiled ahead of the first request of a long-running worker
+WARM_UP_TEMPLATES = ('base_page.html', 'login.html', 'dashboard.html', 'attendance.html',
+                     'employees.html', 'employee_logs.html', 'admin_employees.html')
+
+
+def _warm_up_templates():
+    for name in WARM_UP_TEMPLATES:
+        app.jinja_env.get_template(name)
+
+
+def _warm_up_swipes():
+    today = get_current_baku_time().date()
+    get_cached_swipes(datetime.combine(today, datetime.min.time()),
+                      datetime.combine(today, datetime.max.time()))
+
+
+def warm_up(background=True):
+    """
+    Opens the connection pool, starts the log shard processes and loads the in-memory caches
+    (employee directory, person categories, today's swipes, dashboard snapshot, compiled
+    templates) once per process.
+    Called by the persistent entry points (passenger_wsgi.py, run.fcgi); under run.cgi every
+    request is a new process, so warming there would only slow each request down.
+    In the background (default) requests are served while caches fill; every step is lazy
+    and locked, so a request arriving first simply does that step itself.
+    """
+    steps = [
+        ('database pool', get_db_pool),
+        ('person categories', person_categories.ensure),
+        ('employee directory', employee_directory.ready),
+        ('log shard processes', _start_log_shard_processes),
+        ('templates', _warm_up_templates),
+        ('swipe cache', _warm_up_swipes),
+        ('dashboard snapshot', dashboard_snapshot.get),
+    ]
+
+    def run():
+        started = time.monotonic()
+        for name, step in steps:
+            step_started = time.monotonic()
+            try:
+                step()
+            except Exception as e:
+                print(f"⚠️ Warm-up step '{name}' failed: {e}")
+                continue
+            print(f"   {name}: {time.monotonic() - step_started:.2f}s")
+        print(f"✅ Warm-up finished in {time.monotonic() - started:.2f}s (pid {os.getpid()})")
+
+    if background:
+        threading.Thread(target=run, name='warm-up', daemon=True).start()
+    else:
+        run()
+
+
+startup_profile.mark('routes')
+startup_profile.finish()
+
+
 if __name__ == '__main__':
     # Development mode - Background scheduler disabled
     print("🚀 Development mode: Background scheduler disabled")
@@ -0,0 +1,669 @@
+"""
+Benchmark
+Repeatable timings of the heavy attendance helpers on a synthetic ZKTeco-shaped database.
+
+Every scale ('1k-30d' = 1,000 persons x 30 days of swipes, up to '20k-365d') lives in its own
+local Postgres database (<BENCH_DB_PREFIX>_<scale>) with the tables the app reads: pers_person,
+pers_card, pers_position, auth_department and acc_transaction, plus the late-arrival and daily-note
+tables. Persons and swipes come from swipe_generator with its default profile. The indexes of
+database_indexes.sql are applied as they are in the tree. The dataset is seeded once from a
+fixed seed and ends on a fixed date (DATASET_END), so a database is reused across runs and
+commits. It is re-seeded only when its parameters or GENERATOR_VERSION change.
+
+Each scale is measured in a fresh interpreter that imports app against the benchmark database
+with the clock frozen at DATASET_END 17:30 and tracing, profiling, query statistics and budgets
+off. Every case is run once to warm connections and process-level indexes, then `repeat` times
+cold: swipe, period-result and snapshot caches are cleared before each run; the employee
+directory and person categories stay loaded, as in a warmed-up worker. Caches a tree does not
+have yet are skipped, so older commits can be benchmarked for comparison. One more call without
+clearing gives the warm (cached) time. Statement counts and database time come from the
+db_instrumentation listener.
+
+    python benchmark.py run [--scale 1k-30d ...] [--repeat 5] [--cases a,b] [--output results.json]
+    python benchmark.py compare baseline.json results.json [--threshold 10]
+    python benchmark.py budgets [--scale 1k-30d]
+    python benchmark.py seed --scale 5k-365d [--reseed]
+
+Results carry the commit, dataset parameters and environment; compare prints median deltas per
+case and exits with status 1 when a case got slower than --threshold percent. budgets requests
+the hot routes (BUDGET_ROUTES) through the Flask test client, cold and warm, each inside
+query_budget.assert_max_queries with the app's QUERY_BUDGETS, and exits with status 1 when a
+route exceeds its statement or connection budget, shows an N+1 pattern or does not answer 200.
+Connection: BENCH_DB_HOST (localhost), BENCH_DB_PORT (5432), BENCH_DB_USER, BENCH_DB_PASSWORD,
+BENCH_DB_PREFIX (hr_bench) and BENCH_DB_ADMIN_DB (postgres, used to create the databases). The
+app's own DB_* settings are never used, so a benchmark cannot touch the production database.
+"""
+
+import inspect
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+
+from swipe_generator import SwipeGenerator, copy_rows, copy_transactions, load_profile, synthetic_persons, \
+    turnstile_readers
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCALES = {
+    '1k-30d': (1000, 30),
+    '1k-365d': (1000, 365),
+    '5k-30d': (5000, 30),
+    '5k-365d': (5000, 365),
+    '20k-30d': (20000, 30),
+    '20k-365d': (20000, 365),
+}
+DEFAULT_SCALES = ('1k-30d',)
+
+# Bump when the generated data changes, so existing benchmark databases are re-seeded
+GENERATOR_VERSION = 2
+DATASET_SEED = 20240614
+DATASET_END = date(2024, 6, 14)  # a Friday; the last day with swipes
+FROZEN_NOW = datetime.combine(DATASET_END, dt_time(17, 30))
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS public.auth_department (
+    id VARCHAR(50) PRIMARY KEY,
+    code VARCHAR(100),
+    name VARCHAR(100),
+    parent_id VARCHAR(50)
+);
+CREATE TABLE IF NOT EXISTS public.pers_position (
+    id VARCHAR(50) PRIMARY KEY,
+    code VARCHAR(100),
+    name VARCHAR(100)
+);
+CREATE TABLE IF NOT EXISTS public.pers_person (
+    id VARCHAR(50) PRIMARY KEY,
+    pin VARCHAR(30) NOT NULL,
+    name VARCHAR(50),
+    last_name VARCHAR(50),
+    position_id VARCHAR(50),
+    auth_dept_id VARCHAR(50),
+    photo_path VARCHAR(200),
+    birthday DATE,
+    email VARCHAR(100),
+    mobile_phone VARCHAR(200),
+    create_time TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS public.pers_card (
+    id VARCHAR(50) PRIMARY KEY,
+    card_no VARCHAR(250) NOT NULL,
+    person_id VARCHAR(50),
+    card_state SMALLINT DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS public.acc_transaction (
+    id VARCHAR(50) PRIMARY KEY,
+    card_no VARCHAR(250),
+    pin VARCHAR(30),
+    name VARCHAR(50),
+    last_name VARCHAR(50),
+    create_time TIMESTAMP,
+    reader_name VARCHAR(100),
+    event_name VARCHAR(100)
+);
+CREATE TABLE IF NOT EXISTS public.bench_meta (
+    key VARCHAR(50) PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# --------------------------------------------------------------------------------------
+# Connections
+# --------------------------------------------------------------------------------------
+
+def bench_db_settings(scale):
+    return {
+        'dbname': f"{os.environ.get('BENCH_DB_PREFIX', 'hr_bench')}_{scale.replace('-', '_')}",
+        'user': os.environ.get('BENCH_DB_USER') or os.environ.get('USER') or 'postgres',
+        'password': os.environ.get('BENCH_DB_PASSWORD', ''),
+        'host': os.environ.get('BENCH_DB_HOST', 'localhost'),
+        'port': os.environ.get('BENCH_DB_PORT', '5432'),
+    }
+
+
+def _connect(settings, dbname=None):
+    import psycopg2
+
+    return psycopg2.connect(**dict(settings, dbname=dbname or settings['dbname']))
+
+
+# --------------------------------------------------------------------------------------
+# Dataset
+# --------------------------------------------------------------------------------------
+
+def dataset_params(scale):
+    persons, days = SCALES[scale]
+    return {'scale': scale, 'persons': persons, 'days': days, 'seed': DATASET_SEED,
+            'end_date': DATASET_END.isoformat(), 'generator_version': GENERATOR_VERSION}
+
+
+def _sql_statements(path):
+    """Statements of a repo .sql file, without comments."""
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = '\n'.join(line for line in text.splitlines() if not line.strip().startswith('--'))
+    return [statement.strip() for statement in text.split(';') if statement.strip()]
+
+
+def _ensure_database(settings):
+    import psycopg2
+
+    admin = _connect(settings, os.environ.get('BENCH_DB_ADMIN_DB', 'postgres'))
+    admin.autocommit = True
+    try:
+        with admin.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (settings['dbname'],))
+            if cur.fetchone() is None:
+                cur.execute(f'CREATE DATABASE "{settings["dbname"]}"')
+                print(f"🆕 Created database {settings['dbname']}")
+    except psycopg2.Error as e:
+        raise SystemExit(f"🚨 Cannot create benchmark database {settings['dbname']}: {e}")
+    finally:
+        admin.close()
+
+
+def load_dataset(scale):
+    """Dataset description stored by seed(), {} if the database was not seeded."""
+    conn = _connect(bench_db_settings(scale))
+    try:
+        return json.loads(_read_meta(conn).get('dataset', '{}'))
+    finally:
+        conn.close()
+
+
+def _read_meta(conn):
+    import psycopg2
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT key, value FROM public.bench_meta")
+            return dict(cur.fetchall())
+    except psycopg2.Error:
+        conn.rollback()
+        return {}
+
+
+def seed(scale, reseed=False):
+    """Creates and seeds the scale's database unless it already holds the same dataset."""
+    settings = bench_db_settings(scale)
+    _ensure_database(settings)
+    params = dataset_params(scale)
+    conn = _connect(settings)
+    try:
+        meta = _read_meta(conn)
+        if not reseed and meta.get('params') == json.dumps(params, sort_keys=True):
+            return json.loads(meta['dataset'])
+
+        started = time.perf_counter()
+        print(f"🌱 Seeding {settings['dbname']}: {params['persons']:,} persons x {params['days']} days...")
+        with conn.cursor() as cur:
+            cur.execute("DROP MATERIALIZED VIEW IF EXISTS public.person_category")
+            cur.execute("DROP TABLE IF EXISTS public.acc_transaction, public.pers_card, public.pers_person, "
+                        "public.pers_position, public.auth_department, public.bench_meta, "
+                        "public.late_arrival_emails, public.employee_late_arrivals, "
+                        "public.employee_late_statistics, public.late_arrival_settings, "
+                        "public.employee_daily_notes CASCADE")
+            cur.execute(SCHEMA_SQL)
+            for sql_file in ('create_late_arrival_system_tables.sql', 'create_employee_daily_notes_table.sql'):
+                for statement in _sql_statements(os.path.join(BASE_DIR, sql_file)):
+                    cur.execute(statement)
+            # Never send mail from a benchmark
+            cur.execute("UPDATE public.late_arrival_settings SET setting_value = 'false' "
+                        "WHERE setting_name IN ('email_enabled', 'auto_check_enabled')")
+
+            persons, position_ids, department_ids = synthetic_persons(params['persons'],
+                                                                      random.Random(params['seed']))
+            copy_rows(cur, 'pers_position', ('id', 'code', 'name'),
+                      [(pid, f"P{pid}", name) for name, pid in position_ids.items()])
+            copy_rows(cur, 'auth_department', ('id', 'code', 'name'),
+                      [(did, f"D{did}", name) for name, did in department_ids.items()])
+            copy_rows(cur, 'pers_person',
+                      ('id', 'pin', 'name', 'last_name', 'position_id', 'auth_dept_id', 'photo_path',
+                       'birthday', 'email', 'mobile_phone', 'create_time'),
+                      [(p['id'], p['pin'], p['name'], p['last_name'], p['position_id'], p['auth_dept_id'],
+                        p['photo_path'], p['birthday'], p['email'], p['mobile_phone'], p['create_time'])
+                       for p in persons])
+            copy_rows(cur, 'pers_card', ('id', 'card_no', 'person_id'),
+                      [(p['id'], p['card_no'], p['id']) for p in persons])
+
+            readers_in, readers_out = turnstile_readers()
+            first_day = DATASET_END - timedelta(days=params['days'] - 1)
+            generator = SwipeGenerator(persons, readers_in, readers_out, load_profile(), params['seed'])
+            rows = copy_transactions(cur, generator.swipes(first_day, DATASET_END))
+
+            # The indexes as the tree defines them (statements for tables this schema lacks are skipped)
+            skipped = 0
+            for statement in _sql_statements(os.path.join(BASE_DIR, 'database_indexes.sql')):
+                cur.execute("SAVEPOINT bench_index")
+                try:
+                    cur.execute(statement)
+                except Exception:
+                    cur.execute("ROLLBACK TO SAVEPOINT bench_index")
+                    skipped += 1
+            cur.execute("ANALYZE")
+
+            dataset = dict(params, transactions=rows, first_date=first_day.isoformat(), skipped_indexes=skipped,
+                           seed_seconds=round(time.perf_counter() - started, 1))
+            cur.execute("INSERT INTO public.bench_meta (key, value) VALUES ('params', %s), ('dataset', %s)",
+                        (json.dumps(params, sort_keys=True), json.dumps(dataset)))
+        conn.commit()
+        print(f"✅ Seeded {rows:,} transactions in {dataset['seed_seconds']} s")
+        return dataset
+    finally:
+        conn.close()
+
+
+# --------------------------------------------------------------------------------------
+# Cases (run inside the child interpreter that imported app)
+# --------------------------------------------------------------------------------------
+
+# Process-level caches of the app; older trees have only some of them
+_CLOCKED_CACHES = ('swipe_cache', 'period_result_cache')
+_CLEARED_CACHES = ('swipe_cache', 'period_result_cache', 'dashboard_snapshot')
+
+
+def _freeze_clock(app):
+    app.get_current_baku_time = lambda: FROZEN_NOW
+    for name in _CLOCKED_CACHES:
+        if hasattr(app, name):
+            getattr(app, name).clock = app.get_current_baku_time
+
+
+def _clear_caches(app):
+    for name in _CLEARED_CACHES:
+        if hasattr(app, name):
+            getattr(app, name).invalidate()
+    fragment_cache = getattr(app.app.jinja_env, 'fragment_cache', None)
+    if fragment_cache is not None:
+        fragment_cache.clear()
+
+
+def _load_directories(app):
+    """Loads the employee directory and person categories up front, as in a warmed-up worker."""
+    if hasattr(app, 'person_categories'):
+        app.person_categories.ensure()
+    if hasattr(app, 'employee_directory'):
+        app.employee_directory.ready()
+
+
+def _case_context(app, dataset):
+    """Inputs shared by the cases: a sample staff person and the day groups for calculate_times."""
+    conn = app.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT p.name, p.last_name
+                FROM public.pers_person p
+                JOIN public.pers_position pp ON p.position_id = pp.id
+                WHERE pp.name = 'Mühasib'
+                ORDER BY p.id
+                LIMIT 1
+            """)
+            name, last_name = cur.fetchone()
+            month_start = DATASET_END.replace(day=1)
+            cur.execute("""
+                SELECT t.card_no, t.create_time, t.reader_name
+                FROM public.acc_transaction t
+                WHERE t.create_time >= %s AND t.create_time < %s
+            """, (datetime.combine(max(month_start, date.fromisoformat(dataset['first_date'])), dt_time()),
+                  datetime.combine(DATASET_END + timedelta(days=1), dt_time())))
+            rows = cur.fetchall()
+    finally:
+        conn.close()
+
+    directions = {reader: 'in' for reader in app.TURNSTILE_CONFIG['IN']}
+    directions.update({reader: 'out' for reader in app.TURNSTILE_CONFIG['OUT']})
+    groups = {}
+    for card_no, create_time, reader_name in rows:
+        direction = directions.get((reader_name or '').strip())
+        if direction:
+            groups.setdefault((card_no, create_time.date()), []).append({'time': create_time, 'direction': direction})
+    return {
+        'person_key': app.normalize_name(name) + app.normalize_name(last_name),
+        'first_date': date.fromisoformat(dataset['first_date']),
+        'day_groups': list(groups.values()),
+    }
+
+
+def _calculate_times(app, ctx):
+    for transactions in ctx['day_groups']:
+        app.calculate_times_from_transactions(list(transactions))
+
+
+CASES = {
+    'calculate_times_from_transactions': _calculate_times,
+    'get_employee_logs.person': lambda app, ctx: app.get_employee_logs(
+        ctx['person_key'], ctx['first_date'], DATASET_END, 'active'),
+    'get_employee_logs.all_month': lambda app, ctx: app.get_employee_logs(
+        None, max(ctx['first_date'], DATASET_END.replace(day=1)), DATASET_END, 'active'),
+    'get_employee_logs.all_90d.serial': lambda app, ctx: _employee_logs_90d(app, ctx, parallel=False),
+    'get_employee_logs.all_90d.parallel': lambda app, ctx: _employee_logs_90d(app, ctx, parallel=True),
+    'get_employee_logs_monthly': lambda app, ctx: app.get_employee_logs_monthly(
+        DATASET_END.month, DATASET_END.year, '', 1, app.PER_PAGE_ATTENDANCE, 'active'),
+    'get_tracked_hours_by_dates': lambda app, ctx: app.get_tracked_hours_by_dates(
+        ctx['person_key'], ctx['first_date'], DATASET_END),
+    'get_dashboard_data': lambda app, ctx: app.get_dashboard_data(),
+    'late_sweep': lambda app, ctx: _late_sweep(app),
+}
+
+
+# Hot pages checked by `budgets`; the budget is QUERY_BUDGETS[path] (QUERY_BUDGET_DEFAULT otherwise)
+BUDGET_ROUTES = (
+    '/dashboard',
+    '/attendance',
+    '/attendance?category=teachers',
+    '/api/attendance_grid',
+    '/api/attendance_grid?category=school&page=2',
+    '/employee_logs',
+    '/employees',
+    '/api/employees_list',
+    '/api/employees_list?search=a&category=teachers',
+)
+
+
+def _employee_logs_90d(app, ctx, parallel):
+    """All employees over up to 90 days (several month shards), serial or on the shard processes."""
+    start = max(ctx['first_date'], DATASET_END - timedelta(days=89))
+    if 'parallel' not in inspect.signature(app.get_employee_logs).parameters:
+        return app.get_employee_logs(None, start, DATASET_END, 'active')  # older tree: its own choice
+    return app.get_employee_logs(None, start, DATASET_END, 'active', parallel=parallel)
+
+
+def _late_sweep(app):
+    conn = app.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM public.employee_late_arrivals WHERE late_date = %s", (DATASET_END,))
+        conn.commit()
+    finally:
+        conn.close()
+    app.check_all_employees_late_arrivals(check_date=DATASET_END)
+
+
+def run_cases(dataset, case_names, repeat):
+    """Times the cases in this interpreter (which must be pointed at the benchmark database)."""
+    import logging
+
+    import app
+    from db_instrumentation import add_listener
+
+    logging.getLogger('late_arrival_system').setLevel(logging.WARNING)
+    _freeze_clock(app)
+    _load_directories(app)
+    ctx = _case_context(app, dataset)
+
+    counter = {'queries': 0, 'seconds': 0.0}
+
+    def count(event):
+        counter['queries'] += 1
+        counter['seconds'] += event.seconds
+    add_listener(count)
+
+    results = {}
+    for name in case_names:
+        fn = CASES[name]
+        _clear_caches(app)
+        fn(app, ctx)  # warm-up
+        runs, queries, db_seconds = [], [], []
+        for _ in range(repeat):
+            _clear_caches(app)
+            counter.update(queries=0, seconds=0.0)
+            started = time.perf_counter()
+            fn(app, ctx)
+            runs.append(time.perf_counter() - started)
+            queries.append(counter['queries'])
+            db_seconds.append(counter['seconds'])
+        started = time.perf_counter()
+        fn(app, ctx)
+        warm = time.perf_counter() - started
+        results[name] = {
+            'runs': runs,
+            'min': min(runs),
+            'median': statistics.median(runs),
+            'mean': statistics.mean(runs),
+            'max': max(runs),
+            'stdev': statistics.stdev(runs) if len(runs) > 1 else 0.0,
+            'warm': warm,
+            'queries': statistics.median(queries),
+            'db_seconds': statistics.median(db_seconds),
+        }
+        print(f"   {name:36s} {results[name]['median'] * 1000:10.1f} ms  (warm {warm * 1000:.1f} ms, "
+              f"{results[name]['queries']:.0f} queries)", file=sys.stderr)
+    return results
+
+
+def check_budgets(routes):
+    """
+    Requests each route cold (caches cleared) and warm inside assert_max_queries, in this
+    interpreter (which must be pointed at the benchmark database). Returns the failures.
+    """
+    import logging
+
+    import app
+    from query_budget import QueryBudgetExceeded, assert_max_queries
+
+    logging.getLogger('late_arrival_system').setLevel(logging.WARNING)
+    _freeze_clock(app)
+    _load_directories(app)
+
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = {'id': 0, 'email': 'benchmark@localhost', 'full_name': 'Benchmark', 'role': 'admin'}
+
+    failures = []
+    for url in routes:
+        budget = app.QUERY_BUDGETS.get(url.split('?', 1)[0], app.QUERY_BUDGET_DEFAULT)
+        for run in ('cold', 'warm'):
+            if run == 'cold':
+                _clear_caches(app)
+            name = f"{url} ({run})"
+            try:
+                with assert_max_queries(app.query_budget, budget, connections=app.QUERY_BUDGET_MAX_CONNECTIONS,
+                                        name=name) as scope:
+                    response = client.get(url)
+            except QueryBudgetExceeded as e:
+                failures.append(str(e))
+                print(f"   ❌ {e}")
+                continue
+            if response.status_code != 200:
+                failures.append(f"{name}: HTTP {response.status_code}")
+                print(f"   ❌ {name}: HTTP {response.status_code}")
+                continue
+            print(f"   ✅ {name:52s} {scope.queries:3d} queries, {len(scope.connections)} connections "
+                  f"(budget {budget if budget is not None else '—'})")
+    return failures
+
+
+# --------------------------------------------------------------------------------------
+# Runner
+# --------------------------------------------------------------------------------------
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=BASE_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _environment(scale):
+    conn = _connect(bench_db_settings(scale))
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SHOW server_version")
+            server_version = cur.fetchone()[0]
+    finally:
+        conn.close()
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'postgres': server_version,
+    }
+
+
+def _app_env(scale, scratch):
+    """Environment for a child interpreter importing app against the scale's database."""
+    settings = bench_db_settings(scale)
+    return dict(os.environ,
+                DB_NAME=settings['dbname'], DB_USER=settings['user'], DB_PASSWORD=settings['password'],
+                DB_HOST=settings['host'], DB_PORT=settings['port'],
+                TRACING='off', PROFILING_ENABLED='false', QUERY_STATS_ENABLED='false',
+                QUERY_BUDGET_MODE='off',
+                LATE_ARRIVAL_LOG_FILE=os.path.join(scratch, 'late_arrival_system.log'),
+                RESULT_CACHE_DIR=os.path.join(scratch, 'results'),
+                SNAPSHOT_DIR=os.path.join(scratch, 'snapshots'),
+                DATA_VERSION_DIR=os.path.join(scratch, 'versions'),
+                METRICS_MULTIPROC_DIR=os.path.join(scratch, 'metrics'))
+
+
+def run(scales, case_names, repeat):
+    results = {
+        'commit': _git('rev-parse', 'HEAD'),
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'subject': _git('log', '-1', '--format=%s'),
+        'at': datetime.now().isoformat(timespec='seconds'),
+        'repeat': repeat,
+        'scales': {},
+    }
+    for scale in scales:
+        dataset = seed(scale)
+        results.setdefault('environment', _environment(scale))
+        print(f"⏱️ {scale} ({dataset['transactions']:,} transactions)", file=sys.stderr)
+        with tempfile.TemporaryDirectory(prefix='hr-bench-') as scratch:
+            env = _app_env(scale, scratch)
+            output = os.path.join(scratch, 'cases.json')
+            subprocess.run([sys.executable, os.path.abspath(__file__), '_cases', '--scale', scale,
+                            '--repeat', str(repeat), '--cases', ','.join(case_names), '--output', output],
+                           cwd=BASE_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+            with open(output) as f:
+                cases = json.load(f)
+        results['scales'][scale] = {'dataset': dataset, 'cases': cases}
+    return results
+
+
+def budgets(scales, routes):
+    """Runs check_budgets in a fresh interpreter per scale; returns True if every route passed."""
+    passed = True
+    for scale in scales:
+        seed(scale)
+        print(f"🧮 Query budgets, {scale}")
+        with tempfile.TemporaryDirectory(prefix='hr-bench-') as scratch:
+            child = subprocess.run([sys.executable, os.path.abspath(__file__), '_budgets',
+                                    '--routes', ','.join(routes)],
+                                   cwd=BASE_DIR, env=_app_env(scale, scratch))
+        passed = passed and child.returncode == 0
+    return passed
+
+
+def compare(baseline, current, threshold):
+    """Prints median deltas per scale and case; returns True if any case regressed past threshold %."""
+    print(f"baseline {(baseline.get('commit') or '?')[:10]} {baseline.get('subject') or ''}")
+    print(f"current  {(current.get('commit') or '?')[:10]}{' (dirty)' if current.get('dirty') else ''} "
+          f"{current.get('subject') or ''}")
+    regressed = False
+    for scale, entry in current['scales'].items():
+        base_entry = baseline['scales'].get(scale)
+        if base_entry is None:
+            continue
+        base_params = {key: base_entry['dataset'].get(key) for key in ('persons', 'days', 'seed', 'generator_version')}
+        params = {key: entry['dataset'].get(key) for key in base_params}
+        print(f"\n{scale}{'' if params == base_params else '  ⚠️ datasets differ, deltas are not comparable'}")
+        print(f"   {'case':36s} {'baseline':>10s} {'current':>10s} {'delta':>8s} {'queries':>9s}")
+        for name, result in entry['cases'].items():
+            base = base_entry['cases'].get(name)
+            if base is None:
+                print(f"   {name:36s} {'—':>10s} {result['median'] * 1000:8.1f}ms")
+                continue
+            delta = (result['median'] - base['median']) / base['median'] * 100 if base['median'] else 0.0
+            flag = ''
+            if delta > threshold:
+                flag, regressed = ' 🐢', True
+            elif delta < -threshold:
+                flag = ' 🚀'
+            print(f"   {name:36s} {base['median'] * 1000:8.1f}ms {result['median'] * 1000:8.1f}ms {delta:+7.1f}% "
+                  f"{base['queries']:4.0f}→{result['queries']:<4.0f}{flag}")
+    return regressed
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmarks of the attendance helpers on synthetic data.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='seed (if needed) and time the cases')
+    run_parser.add_argument('--scale', action='append', choices=sorted(SCALES), help='repeatable; default 1k-30d')
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--cases', default=','.join(CASES), help='comma-separated case names')
+    run_parser.add_argument('--output', help='results file (default cache/benchmarks/<time>-<commit>.json)')
+
+    seed_parser = commands.add_parser('seed', help='create and seed benchmark databases')
+    seed_parser.add_argument('--scale', action='append', choices=sorted(SCALES))
+    seed_parser.add_argument('--reseed', action='store_true', help='seed again even if the dataset is current')
+
+    compare_parser = commands.add_parser('compare', help='compare two results files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help='regression threshold in percent')
+
+    budgets_parser = commands.add_parser('budgets', help='check the query budgets of the hot routes')
+    budgets_parser.add_argument('--scale', action='append', choices=sorted(SCALES), help='repeatable; default 1k-30d')
+    budgets_parser.add_argument('--routes', default=','.join(BUDGET_ROUTES), help='comma-separated URLs')
+
+    child_budgets_parser = commands.add_parser('_budgets')  # internal: the child interpreter
+    child_budgets_parser.add_argument('--routes', required=True)
+
+    cases_parser = commands.add_parser('_cases')  # internal: the child interpreter
+    cases_parser.add_argument('--scale', required=True)
+    cases_parser.add_argument('--repeat', type=int, required=True)
+    cases_parser.add_argument('--cases', required=True)
+    cases_parser.add_argument('--output', required=True)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        unknown = [name for name in args.cases.split(',') if name and name not in CASES]
+        if unknown:
+            parser.error(f"unknown cases: {', '.join(unknown)} (known: {', '.join(CASES)})")
+
+    if args.command == 'seed':
+        for scale in args.scale or DEFAULT_SCALES:
+            seed(scale, reseed=args.reseed)
+    elif args.command == 'run':
+        results = run(args.scale or DEFAULT_SCALES, [name for name in args.cases.split(',') if name], args.repeat)
+        output = args.output or os.path.join(
+            BASE_DIR, 'cache', 'benchmarks',
+            f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{(results['commit'] or 'nogit')[:10]}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"📄 Results written to {output}")
+    elif args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        sys.exit(1 if compare(baseline, current, args.threshold) else 0)
+    elif args.command == 'budgets':
+        sys.exit(0 if budgets(args.scale or DEFAULT_SCALES, [url for url in args.routes.split(',') if url]) else 1)
+    elif args.command == '_budgets':
+        sys.exit(1 if check_budgets([url for url in args.routes.split(',') if url]) else 0)
+    else:
+        results = run_cases(load_dataset(args.scale), args.cases.split(','), args.repeat)
+        with open(args.output, 'w') as f:
+            json.dump(results, f)
+
+
+if __name__ == '__main__':
+    main()
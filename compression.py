@@ -0,0 +1,175 @@
+"""
+Response Compression
+gzip (and, if the brotli package is installed, br) compression of HTML, JSON, CSV and other
+text responses.
+
+The app is also deployed without a reverse proxy (run.cgi, Passenger), so compression is done
+in an after_request hook: responses whose type is on the allowlist and whose body is at least
+min_size bytes are compressed with the best encoding the client accepts. Streamed responses
+(export generators) are compressed chunk by chunk as they are sent. Responses that already
+have a Content-Encoding and file responses (static files, send_file) are left alone.
+
+Strong ETags are turned into weak ones on compressed responses, since the bytes differ per
+encoding; conditional GET handlers must compare with weak comparison.
+"""
+
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+
+DEFAULT_MIMETYPES = frozenset({
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/xml',
+    'application/json', 'application/javascript', 'text/javascript',
+    'application/xml', 'image/svg+xml',
+})
+
+
+# Input bytes between explicit flushes of a streamed response
+STREAM_FLUSH_BYTES = 32 * 1024
+
+
+class Compressor:
+    """after_request response compression for a Flask app."""
+
+    def __init__(self, app=None, min_size=1024, level=6, brotli_quality=4,
+                 mimetypes=DEFAULT_MIMETYPES, enabled=True):
+        self.min_size = min_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self.mimetypes = frozenset(mimetypes)
+        self.enabled = enabled
+        self.compressed = 0
+        self.skipped_small = 0
+        self.streamed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from flask import request
+
+        def compress_response(response):
+            return self.process(request, response)
+
+        app.after_request(compress_response)
+
+    # ----------------------------------------------------------------------------------
+    # Public API
+    # ----------------------------------------------------------------------------------
+
+    def process(self, request, response):
+        """Compresses response in place if it qualifies; always returns it."""
+        if not self.enabled or response.mimetype not in self.mimetypes:
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers or response.direct_passthrough
+                or request.method == 'HEAD'):
+            return response
+
+        encoding = self.choose_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+            self.streamed += 1
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                self.skipped_small += 1
+                return response
+            compressed = self._compress(data, encoding)
+            if len(compressed) >= len(data):
+                return response
+            response.set_data(compressed)
+            self.bytes_in += len(data)
+            self.bytes_out += len(compressed)
+
+        response.headers['Content-Encoding'] = encoding
+        self.compressed += 1
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def choose_encoding(self, accept_encoding):
+        """'br', 'gzip' or None for an Accept-Encoding header value."""
+        accepted = {}
+        for part in accept_encoding.split(','):
+            name, _, params = part.strip().partition(';')
+            quality = 1.0
+            params = params.strip()
+            if params.startswith('q='):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            if name:
+                accepted[name.strip().lower()] = quality
+        wildcard = accepted.get('*', 0.0)
+        if brotli is not None and accepted.get('br', wildcard) > 0:
+            return 'br'
+        if accepted.get('gzip', accepted.get('x-gzip', wildcard)) > 0:
+            return 'gzip'
+        return None
+
+    def stats(self):
+        """Cheap counters for monitoring."""
+        return {
+            'enabled': self.enabled,
+            'brotli': brotli is not None,
+            'compressed': self.compressed,
+            'streamed': self.streamed,
+            'skipped_small': self.skipped_small,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+        }
+
+    # ----------------------------------------------------------------------------------
+    # Internals
+    # ----------------------------------------------------------------------------------
+
+    def _compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+        return compressor.compress(data) + compressor.flush()
+
+    def _compress_stream(self, chunks, encoding):
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            process, flush, finish = compressor.process, compressor.flush, compressor.finish
+        else:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            process = compressor.compress
+            flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+            finish = compressor.flush
+        pending = 0
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                self.bytes_in += len(chunk)
+                pending += len(chunk)
+                out = process(chunk)
+                # Flush every STREAM_FLUSH_BYTES of input so rows keep reaching the client
+                # without giving up the compression ratio of larger blocks
+                if pending >= STREAM_FLUSH_BYTES:
+                    out += flush()
+                    pending = 0
+                if out:
+                    self.bytes_out += len(out)
+                    yield out
+            out = finish()
+            self.bytes_out += len(out)
+            yield out
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
@@ -0,0 +1,41 @@
+-- Person -> category materialized view (person_categories.py)
+-- Bu SQL dosyasını PostgreSQL veritabanınızda bir kez çalıştırın; uygulama view'ı sadece yeniler
+-- Kurallar person_categories.CATEGORY_RULES ile aynı olmalıdır
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS public.person_category AS
+-- Administrative: STUDENT, VISITOR, MÜƏLLİM hariç VE School departmanında olmayanlar
+SELECT p.id AS person_id, 'active'::text AS category
+    FROM public.pers_person p
+    LEFT JOIN public.pers_position pp ON p.position_id = pp.id
+    LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
+    WHERE (pp.name IS NULL OR (pp.name NOT ILIKE 'STUDENT'
+                               AND pp.name NOT ILIKE 'VISITOR'
+                               AND pp.name NOT ILIKE 'MÜƏLLİM'))
+      AND (ad.name IS NULL OR ad.name != 'School')
+UNION ALL
+-- School departmanındaki HERKES (müəllimleri de dahil)
+SELECT p.id AS person_id, 'school'::text AS category
+    FROM public.pers_person p
+    LEFT JOIN public.pers_position pp ON p.position_id = pp.id
+    LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
+    WHERE ad.name = 'School'
+UNION ALL
+-- Müəllim pozisyonundakiler ama School departmanında OLMAYANLAR
+SELECT p.id AS person_id, 'teachers'::text AS category
+    FROM public.pers_person p
+    LEFT JOIN public.pers_position pp ON p.position_id = pp.id
+    LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
+    WHERE pp.name = 'Müəllim' AND (ad.name IS NULL OR ad.name != 'School')
+UNION ALL
+-- Student, Visitor ve Müəllim hariç herkes (departmandan bağımsız)
+SELECT p.id AS person_id, 'staff'::text AS category
+    FROM public.pers_person p
+    LEFT JOIN public.pers_position pp ON p.position_id = pp.id
+    LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
+    WHERE (pp.name IS NULL OR (pp.name NOT ILIKE 'student'
+                               AND pp.name NOT ILIKE 'visitor'
+                               AND pp.name NOT ILIKE 'müəllim'));
+
+-- Unique index kategori aramalarına da hizmet eder ve REFRESH ... CONCURRENTLY için gereklidir
+CREATE UNIQUE INDEX IF NOT EXISTS idx_person_category_category_person ON public.person_category(category, person_id);
+CREATE INDEX IF NOT EXISTS idx_person_category_person ON public.person_category(person_id);
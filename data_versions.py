@@ -0,0 +1,73 @@
+"""
+Data Versions
+Cheap cross-worker version stamps for conditional GET (ETag / Last-Modified).
+
+Writers call bump(name) after committing a change; readers call get(name) to build validators
+without touching the database. A version is a small file under the versions directory: its
+content is a random token and its mtime is the time of the last change, so every worker process
+(and the late-arrival job when it runs on its own) sees the same value.
+"""
+
+import os
+import secrets
+import time
+from datetime import datetime, timezone
+
+
+DEFAULT_DIRECTORY = os.environ.get('DATA_VERSION_DIR',
+                                   os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'versions'))
+
+
+class DataVersions:
+    """Named version stamps shared through the filesystem."""
+
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        self.directory = directory
+        self.bumps = 0
+        self.errors = 0
+
+    def bump(self, name):
+        """Marks `name` as changed. Never raises: a missed bump only delays revalidation."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(name)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(secrets.token_hex(8))
+            os.replace(tmp_path, path)
+            self.bumps += 1
+        except OSError as e:
+            self.errors += 1
+            print(f"⚠️ Data version bump failed for {name}: {e}")
+
+    def get(self, name):
+        """(token, last_modified UTC datetime) of `name`; a missing stamp is created first."""
+        path = self._path(name)
+        for _ in range(2):
+            try:
+                with open(path) as f:
+                    token = f.read().strip()
+                mtime = os.stat(path).st_mtime
+                return token, datetime.fromtimestamp(int(mtime), tz=timezone.utc)
+            except FileNotFoundError:
+                self.bump(name)
+            except OSError:
+                break
+        # Unreadable stamps: fall back to a per-process token so responses stay correct
+        self.errors += 1
+        return f"unversioned-{os.getpid()}-{int(time.time())}", datetime.now(timezone.utc)
+
+    def stats(self):
+        """Cheap counters for monitoring."""
+        return {'bumps': self.bumps, 'errors': self.errors}
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.version")
+
+
+_default = DataVersions()
+
+
+def bump_version(name):
+    """bump() on the default versions directory (for modules without their own instance)."""
+    _default.bump(name)
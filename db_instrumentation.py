@@ -0,0 +1,92 @@
+"""
+DB Instrumentation
+Cursor class that times every statement and reports it to registered listeners.
+
+Connections opened with cursor_factory=InstrumentedCursor (the app's pool and its direct
+connections) pass a QueryEvent to every listener after each execute()/executemany(), also
+when the statement failed. Listeners run on the querying thread, so they must be cheap; an
+exception raised by a listener is printed and swallowed, instrumentation never breaks a query.
+"""
+
+import time
+
+import psycopg2.extensions
+
+
+_listeners = []
+
+
+class QueryEvent:
+    """One executed statement as seen by listeners."""
+
+    __slots__ = ('cursor', 'query', 'params', 'seconds', 'rows', 'error', 'many', '_sql')
+
+    def __init__(self, cursor, query, params, seconds, rows, error, many):
+        self.cursor = cursor
+        self.query = query
+        self.params = params
+        self.seconds = seconds
+        self.rows = rows
+        self.error = error
+        self.many = many
+        self._sql = None
+
+    @property
+    def sql(self):
+        """Statement text (psycopg2.sql objects and bytes are converted once, on first use)."""
+        if self._sql is None:
+            query = self.query
+            if hasattr(query, 'as_string'):
+                query = query.as_string(self.cursor)
+            if isinstance(query, bytes):
+                query = query.decode('utf-8', 'replace')
+            self._sql = query
+        return self._sql
+
+
+def add_listener(fn):
+    """Registers fn(event); returns fn so it can be used as a decorator."""
+    _listeners.append(fn)
+    return fn
+
+
+def remove_listener(fn):
+    if fn in _listeners:
+        _listeners.remove(fn)
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """psycopg2 cursor that reports every execute()/executemany() to the listeners."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        error = None
+        try:
+            return super().execute(query, vars)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            _notify(self, query, vars, time.perf_counter() - started, error, False)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        error = None
+        try:
+            return super().executemany(query, vars_list)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            _notify(self, query, vars_list, time.perf_counter() - started, error, True)
+
+
+def _notify(cursor, query, params, seconds, error, many):
+    if not _listeners:
+        return
+    event = QueryEvent(cursor, query, params, seconds, cursor.rowcount if error is None else -1, error, many)
+    for listener in _listeners:
+        try:
+            listener(event)
+        except Exception as e:
+            print(f"⚠️ Query listener {getattr(listener, '__name__', listener)} failed: {e}")
@@ -15,6 +15,7 @@ scp app.py ${VPS_USER}@${VPS_HOST}:${VPS_PATH}/
 scp run.cgi ${VPS_USER}@${VPS_HOST}:${VPS_PATH}/
 scp templates/employees.html ${VPS_USER}@${VPS_HOST}:${VPS_PATH}/templates/
 scp diagnose_vps.py ${VPS_USER}@${VPS_HOST}:${VPS_PATH}/
+scp static_assets.py ${VPS_USER}@${VPS_HOST}:${VPS_PATH}/
 scp VPS_DEPLOYMENT_GUIDE.md ${VPS_USER}@${VPS_HOST}:${VPS_PATH}/
 
 # 2. Set permissions
@@ -22,7 +23,11 @@ echo "🔐 Setting permissions..."
 ssh ${VPS_USER}@${VPS_HOST} "chmod +x ${VPS_PATH}/run.cgi"
 ssh ${VPS_USER}@${VPS_HOST} "chmod +x ${VPS_PATH}/diagnose_vps.py"
 
-# 3. Run diagnostics
+# 3. Fingerprint and pre-compress static files (static/build)
+echo "📦 Building static assets..."
+ssh ${VPS_USER}@${VPS_HOST} "cd ${VPS_PATH} && source .venv/bin/activate && python static_assets.py"
+
+# 4. Run diagnostics
 echo "🔍 Running diagnostics..."
 ssh ${VPS_USER}@${VPS_HOST} "cd ${VPS_PATH} && source .venv/bin/activate && python diagnose_vps.py"
 
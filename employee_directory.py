@@ -0,0 +1,385 @@
+"""
+Employee Directory
+Process-level in-memory snapshot of persons, positions, departments and categories.
+
+pers_person holds a few thousand rows, so lists, dropdowns, lookups and pagination are
+served from memory instead of re-running the person/position/department joins on every
+keystroke. The snapshot is loaded with one query; a cheap change probe runs in the background
+at most every probe_seconds and reloads the snapshot when anything changed. The probe reads the
+tables' insert/update/delete counters from pg_stat_user_tables (a catalog lookup, no table
+scan; other sessions' commits show up within about a second). A whole-row checksum of the
+three tables, which scans and sorts them, only runs every checksum_seconds as a safety net
+for changes the counters miss (track_counts off, statistics reset). Edits made through the app call invalidate() so the next read
+reloads immediately. The same probe drives the person_category view: on_change is called
+when a reload finds data that differs from what this process had loaded before (not on a
+process's first load, so starting a worker does not queue a refresh of the view).
+
+Listings are paginated with opaque keyset tokens on (last_name, name, id); page numbers
+still work for links that carry them.
+"""
+
+import base64
+import hashlib
+import json
+import threading
+import time
+
+import psycopg2
+
+from employee_search import TrigramIndex
+from person_categories import CATEGORY_RULES, normalize_category
+
+
+_LOAD_SQL = f"""
+    SELECT p.id, p.name, p.last_name, p.mobile_phone, p.email, p.birthday, p.photo_path,
+           p.position_id, pp.name AS position_name, ad.name AS department_name,
+           p.create_time AS hire_date,
+           {", ".join(f"COALESCE(({rule}), FALSE) AS in_{category}" for category, rule in CATEGORY_RULES.items())}
+    FROM public.pers_person p
+    LEFT JOIN public.pers_position pp ON p.position_id = pp.id
+    LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id
+    ORDER BY p.last_name, p.name
+"""
+
+_POSITIONS_SQL = "SELECT id, name FROM public.pers_position ORDER BY name"
+
+# Searchable fields
+SEARCH_FIELDS = ('name', 'last_name', 'email', 'position', 'full_name')
+
+# Cumulative write counters of the three tables: any committed insert, update or delete moves them
+_PROBE_SQL = """
+    SELECT relid::regclass::text, n_tup_ins, n_tup_upd, n_tup_del
+    FROM pg_stat_user_tables
+    WHERE relid IN ('public.pers_person'::regclass, 'public.pers_position'::regclass,
+                    'public.auth_department'::regclass)
+    ORDER BY 1
+"""
+
+# Whole-row checksums: any edit (names, contacts, photos, positions, departments) changes them
+_CHECKSUM_SQL = """
+    SELECT (SELECT md5(COALESCE(string_agg(p::text, ',' ORDER BY p.id), '')) FROM public.pers_person p),
+           (SELECT md5(COALESCE(string_agg(pp::text, ',' ORDER BY pp.id), '')) FROM public.pers_position pp),
+           (SELECT md5(COALESCE(string_agg(ad::text, ',' ORDER BY ad.id), '')) FROM public.auth_department ad)
+"""
+
+
+class Person:
+    """One directory entry (read-only; shared between requests)."""
+
+    __slots__ = ('id', 'name', 'last_name', 'full_name', 'key', 'mobile_phone', 'email', 'birthday',
+                 'photo_path', 'position_id', 'position', 'department', 'hire_date', 'categories',
+                 'order')
+
+    def __init__(self, row, key_fn, order):
+        (self.id, self.name, self.last_name, self.mobile_phone, self.email, self.birthday,
+         self.photo_path, self.position_id, self.position, self.department, self.hire_date) = row[:11]
+        self.categories = frozenset(category for category, member in zip(CATEGORY_RULES, row[11:]) if member)
+        self.full_name = f"{self.name} {self.last_name}"
+        self.key = key_fn(self.name) + key_fn(self.last_name)
+        self.order = order  # position in (last_name, name) order
+
+
+class _Snapshot:
+    __slots__ = ('persons', 'by_id', 'by_key', 'by_category', 'positions', 'loaded_at',
+                 'search_indexes', 'index_lock')
+
+    def __init__(self, persons, positions):
+        self.persons = persons
+        self.by_id = {person.id: person for person in persons}
+        self.by_key = {}
+        for person in persons:
+            self.by_key.setdefault(person.key, person)
+        self.by_category = {category: [person for person in persons if category in person.categories]
+                            for category in CATEGORY_RULES}
+        self.positions = positions
+        self.loaded_at = time.time()
+        self.search_indexes = {}  # fields -> TrigramIndex over all persons, built on first use
+        self.index_lock = threading.Lock()
+
+    def search_index(self, fields):
+        index = self.search_indexes.get(fields)
+        if index is None:
+            with self.index_lock:
+                index = self.search_indexes.get(fields)
+                if index is None:
+                    index = TrigramIndex([[getattr(person, field) for field in fields]
+                                          for person in self.persons])
+                    self.search_indexes[fields] = index
+        return index
+
+
+class EmployeeDirectory:
+    """In-memory employee directory with background change detection."""
+
+    def __init__(self, connect, release, key_fn, probe_seconds=10, checksum_seconds=600, on_change=None):
+        """
+        connect() returns a psycopg2 connection or None; release(conn) gives it back.
+        on_change() is called after a reload whose data differs from the previously loaded one.
+        """
+        self.connect = connect
+        self.release = release
+        self.key_fn = key_fn
+        self.probe_seconds = probe_seconds
+        self.checksum_seconds = checksum_seconds
+        self.on_change = on_change
+        self._snapshot = None
+        self._signature = None
+        self._dirty = False
+        self._last_probe = 0.0
+        self._checksum = None  # whole-row checksum, recorded by the first slow probe after a load
+        self._last_checksum = time.monotonic()
+        self._probing = False
+        self._load_lock = threading.Lock()
+        self.load_count = 0
+        self.last_load_seconds = None
+
+    # ----------------------------------------------------------------------------------
+    # Public API
+    # ----------------------------------------------------------------------------------
+
+    def ready(self):
+        """Loads the snapshot if needed; returns False if the database is unavailable."""
+        return self._current() is not None
+
+    def poll(self):
+        """
+        Starts the change probe in the background if it is due. Never queries in the calling
+        thread, so it is safe while the caller holds a pooled connection.
+        """
+        if self._snapshot is not None:
+            self._maybe_probe()
+
+    def persons(self, category=None):
+        """All persons (ordered by last name, name), optionally limited to a category."""
+        snapshot = self._current()
+        if snapshot is None:
+            return []
+        if category is None:
+            return snapshot.persons
+        return snapshot.by_category[normalize_category(category)]
+
+    def search(self, term, category=None, fields=SEARCH_FIELDS, limit=None):
+        """
+        Persons matching term in any of the fields, best match first (Azerbaijani-folded
+        substring or trigram similarity, see employee_search). Without a term: all persons
+        in (last_name, name) order.
+        """
+        snapshot = self._current()
+        if snapshot is None:
+            return []
+        persons = self.persons(category)
+        if not term or not term.strip():
+            return persons[:limit] if limit is not None else persons
+
+        scores = snapshot.search_index(tuple(fields)).scores(term)
+        matches = [person for person in persons if person.order in scores]
+        matches.sort(key=lambda person: (-scores[person.order], person.order))
+        return matches[:limit] if limit is not None else matches
+
+    def get(self, person_id):
+        snapshot = self._current()
+        return snapshot.by_id.get(person_id) if snapshot else None
+
+    def get_by_key(self, key):
+        snapshot = self._current()
+        return snapshot.by_key.get(key) if snapshot else None
+
+    def positions(self):
+        """[{'id', 'name'}] ordered by name."""
+        snapshot = self._current()
+        return snapshot.positions if snapshot else []
+
+    def counts(self, categories):
+        """{category: number of persons} straight from the snapshot."""
+        snapshot = self._current()
+        if snapshot is None:
+            return {category: 0 for category in categories}
+        return {category: len(snapshot.by_category[category]) for category in categories}
+
+    def version(self):
+        """
+        (token, loaded_at) identifying the current snapshot's data, or None before the first load.
+        The token is derived from the table write counters, so it is the same in every worker process.
+        Never queries the database in the request path (a due change probe runs in the background).
+        """
+        if self._snapshot is None or self._dirty:
+            return None
+        self._current()
+        snapshot, signature = self._snapshot, self._signature
+        if snapshot is None or signature is None:
+            return None
+        token = hashlib.sha1(repr(signature).encode('utf-8')).hexdigest()[:16]
+        return token, snapshot.loaded_at
+
+    def invalidate(self):
+        """Forces a reload on the next read (used after edits made through the app)."""
+        self._dirty = True
+
+    def stats(self):
+        """Cheap counters for monitoring."""
+        snapshot = self._snapshot
+        return {
+            'persons': len(snapshot.persons) if snapshot else 0,
+            'age_seconds': int(time.time() - snapshot.loaded_at) if snapshot else None,
+            'load_count': self.load_count,
+            'last_load_seconds': self.last_load_seconds,
+        }
+
+    # ----------------------------------------------------------------------------------
+    # Loading
+    # ----------------------------------------------------------------------------------
+
+    def _current(self):
+        if self._snapshot is None or self._dirty:
+            with self._load_lock:
+                if self._snapshot is None or self._dirty:
+                    self._load()
+        else:
+            self._maybe_probe()
+        return self._snapshot
+
+    def _maybe_probe(self):
+        if not self._probing and time.monotonic() - self._last_probe >= self.probe_seconds:
+            self._probing = True
+            threading.Thread(target=self._probe, daemon=True).start()
+
+    def _load(self, checksum_changed=False):
+        conn = self.connect()
+        if conn is None:
+            return
+        started = time.perf_counter()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(_PROBE_SQL)
+                signature = tuple(cur.fetchall())
+                cur.execute(_LOAD_SQL)
+                persons = [Person(row, self.key_fn, order) for order, row in enumerate(cur.fetchall())]
+                cur.execute(_POSITIONS_SQL)
+                positions = [{'id': row[0], 'name': row[1]} for row in cur.fetchall()]
+        except psycopg2.Error as e:
+            print(f"🚨 Employee directory load error: {e}")
+            return
+        finally:
+            self.release(conn)
+
+        # The first load has nothing to compare with: the tables did not change, this process started
+        changed = checksum_changed or (self._signature is not None and signature != self._signature)
+        self._snapshot = _Snapshot(persons, positions)
+        self._signature = signature
+        self._checksum = None
+        self._dirty = False
+        self._last_probe = time.monotonic()
+        self.load_count += 1
+        self.last_load_seconds = round(time.perf_counter() - started, 3)
+        if changed and self.on_change is not None:
+            self.on_change()
+
+    def _probe(self):
+        try:
+            conn = self.connect()
+            if conn is None:
+                return
+            try:
+                checksum = None
+                with conn.cursor() as cur:
+                    cur.execute(_PROBE_SQL)
+                    signature = tuple(cur.fetchall())
+                    if time.monotonic() - self._last_checksum >= self.checksum_seconds:
+                        cur.execute(_CHECKSUM_SQL)
+                        checksum = cur.fetchone()
+            finally:
+                self.release(conn)
+            self._last_probe = time.monotonic()
+            checksum_changed = False
+            if checksum is not None:
+                self._last_checksum = time.monotonic()
+                checksum_changed = self._checksum is not None and checksum != self._checksum
+                self._checksum = checksum
+            if signature != self._signature or checksum_changed:
+                with self._load_lock:
+                    self._load(checksum_changed=checksum_changed)
+        except psycopg2.Error as e:
+            print(f"⚠️ Employee directory probe error: {e}")
+        finally:
+            self._probing = False
+
+
+# --------------------------------------------------------------------------------------
+# Keyset pagination
+# --------------------------------------------------------------------------------------
+
+def _sort_key(person):
+    return (person.last_name or '', person.name or '', str(person.id))
+
+
+def _scope_digest(scope):
+    return hashlib.sha1(repr(scope).encode('utf-8')).hexdigest()[:12]
+
+
+def encode_page_token(person, direction, scope):
+    """Opaque token resuming a listing after ('a') or before ('b') the given person."""
+    payload = {'d': direction, 'k': list(_sort_key(person)), 's': _scope_digest(scope)}
+    return base64.urlsafe_b64encode(json.dumps(payload, ensure_ascii=False).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_page_token(token, scope):
+    """(direction, key) from a token, or None if it is malformed or was issued for another filter."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        if payload['s'] != _scope_digest(scope) or payload['d'] not in ('a', 'b'):
+            return None
+        return payload['d'], tuple(payload['k'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def paginate(persons, per_page, page=1, page_token=None, scope=None):
+    """
+    Slices an ordered person list. A valid page_token (see encode_page_token) wins over
+    the page number; tokens are bound to `scope` (e.g. category and search term) so a token
+    from another filter falls back to page numbers.
+
+    The token's row is found by id; if it was deleted meanwhile, the listing resumes at the
+    next row in (last_name, name, id) order. Totals come from the in-memory list, so no
+    COUNT query is needed.
+    """
+    total_items = len(persons)
+    total_pages = (total_items + per_page - 1) // per_page
+
+    start = None
+    decoded = decode_page_token(page_token, scope) if page_token else None
+    if decoded is not None:
+        direction, key = decoded
+        boundary = _locate(persons, key, after=(direction == 'a'))
+        start = boundary if direction == 'a' else max(0, boundary - per_page)
+
+    if start is None:
+        if page < 1: page = 1
+        if page > total_pages and total_pages > 0: page = total_pages
+        start = (page - 1) * per_page
+
+    items = persons[start:start + per_page]
+    return {
+        'items': items,
+        'current_page': start // per_page + 1,
+        'total_pages': total_pages,
+        'total_items': total_items,
+        'next_token': encode_page_token(items[-1], 'a', scope) if items and start + per_page < total_items else None,
+        'prev_token': encode_page_token(items[0], 'b', scope) if items and start > 0 else None,
+    }
+
+
+def _locate(persons, key, after):
+    """
+    Index of the first row after (or, for before-tokens, of) the token's row. A row that
+    disappeared since the token was issued is located by its sort key instead.
+    """
+    person_id = key[2]
+    for index, person in enumerate(persons):
+        if str(person.id) == person_id:
+            return index + 1 if after else index
+    for index, person in enumerate(persons):
+        if _sort_key(person) > key:
+            return index
+    return len(persons)
@@ -0,0 +1,130 @@
+"""
+Employee Search
+Fuzzy, Azerbaijani-aware name search ranked by trigram similarity.
+
+Text is folded before indexing and searching: Azerbaijani letters map onto their plain Latin
+base (İ/I/ı -> i, ə -> e, ö -> o, ü -> u, ç -> c, ş -> s, ğ -> g), so "Məmmədov" and
+"memmedov" fold to the same string. a and e stay distinct ("Ali" is not "Eli"). Because ə is
+also commonly written as a ("Mammadov"), indexed values containing ə are additionally indexed
+with ə folded to a; queries are folded once, so only ə itself matches either spelling.
+
+Trigrams are extracted the way pg_trgm does it (each word padded with two leading and one
+trailing space) and similarity is |shared| / |union|, so scores match pg_trgm similarity()
+on the folded text. An inverted trigram -> term index (the in-memory equivalent of a GIN
+trigram index) limits scoring to terms that share at least one trigram with the query;
+plain substring matches are always included so short queries behave like the old LIKE filter.
+"""
+
+import re
+from collections import defaultdict
+
+
+# pg_trgm's default similarity threshold
+SIMILARITY_THRESHOLD = 0.3
+
+# Score of a plain substring match; whole-word and close matches still rank above it
+SUBSTRING_SCORE = 0.5
+
+_FOLD_TABLE = str.maketrans({
+    'İ': 'i', 'I': 'i', 'ı': 'i',
+    'Ə': 'e', 'ə': 'e',
+    'Ö': 'o', 'ö': 'o',
+    'Ü': 'u', 'ü': 'u',
+    'Ç': 'c', 'ç': 'c',
+    'Ş': 's', 'ş': 's',
+    'Ğ': 'g', 'ğ': 'g',
+})
+
+# ə is transliterated as either e or a; documents are indexed under both spellings
+_SCHWA_AS_A = str.maketrans({'Ə': 'a', 'ə': 'a'})
+
+_WORD_SPLIT = re.compile(r'[\W_]+')
+
+
+def fold_az(text):
+    """Lower-cases text and folds Azerbaijani letters onto their plain Latin base."""
+    if not text:
+        return ''
+    return text.translate(_FOLD_TABLE).lower()
+
+
+def _folded_variants(text):
+    """fold_az(text), plus the ə -> a spelling when text contains ə."""
+    folded = fold_az(text)
+    if 'ə' not in text and 'Ə' not in text:
+        return [folded]
+    return [folded, fold_az(text.translate(_SCHWA_AS_A))]
+
+
+def trigrams(folded):
+    """pg_trgm-style trigram set of already folded text."""
+    result = set()
+    for word in _WORD_SPLIT.split(folded):
+        if not word:
+            continue
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            result.add(padded[i:i + 3])
+    return result
+
+
+def similarity(a, b):
+    """pg_trgm similarity() of two strings after folding."""
+    ta, tb = trigrams(fold_az(a)), trigrams(fold_az(b))
+    if not ta or not tb:
+        return 0.0
+    shared = len(ta & tb)
+    return shared / (len(ta) + len(tb) - shared)
+
+
+class TrigramIndex:
+    """
+    Ranks documents against a query. Each document is a list of field values; a document's
+    score is its best-matching field or word (at least SUBSTRING_SCORE for a folded substring match).
+    """
+
+    def __init__(self, documents):
+        self._folded = []  # per document: folded fields joined for substring checks
+        self._terms = []   # term id -> (document id, trigram set)
+        self._postings = defaultdict(list)  # trigram -> term ids
+        for doc_id, fields in enumerate(documents):
+            folded_fields = [folded for value in fields if value for folded in _folded_variants(value)]
+            self._folded.append('\n'.join(folded_fields))
+            terms = set(folded_fields)
+            for value in folded_fields:
+                terms.update(word for word in _WORD_SPLIT.split(value) if word)
+            for term in terms:
+                term_trigrams = trigrams(term)
+                if not term_trigrams:
+                    continue
+                term_id = len(self._terms)
+                self._terms.append((doc_id, term_trigrams))
+                for trigram in term_trigrams:
+                    self._postings[trigram].append(term_id)
+
+    def scores(self, query, threshold=SIMILARITY_THRESHOLD):
+        """{document id: score} for every document matching the query."""
+        folded_query = fold_az(query).strip()
+        if not folded_query:
+            return {}
+
+        results = {}
+        for doc_id, folded in enumerate(self._folded):
+            if folded_query in folded:
+                results[doc_id] = SUBSTRING_SCORE
+
+        query_trigrams = trigrams(folded_query)
+        if not query_trigrams:
+            return results
+
+        shared_counts = defaultdict(int)
+        for trigram in query_trigrams:
+            for term_id in self._postings.get(trigram, ()):
+                shared_counts[term_id] += 1
+
+        for term_id, shared in shared_counts.items():
+            doc_id, term_trigrams = self._terms[term_id]
+            score = shared / (len(query_trigrams) + len(term_trigrams) - shared)
+            if score >= threshold and score > results.get(doc_id, 0.0):
+                results[doc_id] = score
+        return results
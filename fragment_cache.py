@@ -0,0 +1,86 @@
+"""
+Fragment Cache
+{% cache %} template tag for stable, repeatedly rendered template blocks.
+
+    {% cache 'sidebar_nav', request.endpoint, is_admin %} ... {% endcache %}
+
+The rendered block is stored in process memory under the fragment name plus the given key
+values, so every value the block depends on must be part of the key. Entries expire after
+ttl seconds and the least recently used ones are dropped beyond max_entries. When the
+environment has no cache attached (development) the block is simply rendered.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+
+class FragmentCache:
+    """Thread-safe TTL + LRU store for rendered fragments."""
+
+    def __init__(self, ttl=300, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, markup)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key, render):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        markup = render()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, markup)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return markup
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Cheap counters for monitoring."""
+        with self._lock:
+            entries = len(self._entries)
+        return {'entries': entries, 'hits': self.hits, 'misses': self.misses}
+
+
+class FragmentCacheExtension(Extension):
+    """Adds {% cache name, key... %}...{% endcache %}; uses environment.fragment_cache if set."""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key_parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render_cached', [nodes.List(key_parts)]),
+                               [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, key_parts, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        # Undefined values and other unhashable parts are keyed by their text
+        key = tuple(part if isinstance(part, (str, int, float, bool, type(None))) else str(part)
+                    for part in key_parts)
+        return cache.get_or_render(key, caller)
@@ -0,0 +1,61 @@
+"""
+Job History
+Recent runs and per-job totals of background jobs and cache loads in this process.
+
+record() is called once per run (timed_job in app.py); recent() returns the last runs, newest
+first, and summary() the per-job totals: runs, errors, mean and max duration, and the last run
+and last success. Everything stays in memory and is bounded by the ring buffer size.
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class JobHistory:
+    """Ring buffer of job runs plus running totals per job."""
+
+    def __init__(self, size=200):
+        self._runs = deque(maxlen=size)
+        self._totals = {}  # job -> dict
+        self._lock = threading.Lock()
+
+    def record(self, job, seconds, outcome, error=None):
+        finished_at = time.time()
+        run = {'job': job, 'finished_at': finished_at, 'seconds': seconds, 'outcome': outcome,
+               'error': str(error)[:300] if error is not None else None}
+        with self._lock:
+            self._runs.append(run)
+            totals = self._totals.get(job)
+            if totals is None:
+                totals = self._totals[job] = {'job': job, 'runs': 0, 'errors': 0, 'total_seconds': 0.0,
+                                              'max_seconds': 0.0, 'last_run': None, 'last_success': None,
+                                              'last_seconds': None, 'last_outcome': None}
+            totals['runs'] += 1
+            totals['total_seconds'] += seconds
+            totals['max_seconds'] = max(totals['max_seconds'], seconds)
+            totals['last_run'] = finished_at
+            totals['last_seconds'] = seconds
+            totals['last_outcome'] = outcome
+            if outcome == 'success':
+                totals['last_success'] = finished_at
+            else:
+                totals['errors'] += 1
+
+    def recent(self, limit=50, job=None):
+        with self._lock:
+            runs = [dict(run) for run in reversed(self._runs) if job is None or run['job'] == job]
+        return runs[:limit]
+
+    def summary(self):
+        """Per-job totals, slowest mean first."""
+        with self._lock:
+            totals = [dict(entry) for entry in self._totals.values()]
+        for entry in totals:
+            entry['mean_seconds'] = entry['total_seconds'] / entry['runs']
+        return sorted(totals, key=lambda entry: -entry['mean_seconds'])
+
+    def last(self, job):
+        with self._lock:
+            totals = self._totals.get(job)
+            return dict(totals) if totals is not None else None
@@ -13,19 +13,33 @@ import os
 from dotenv import load_dotenv
 import logging
 
+from data_versions import bump_version
+from db_instrumentation import InstrumentedCursor
+
 load_dotenv()
 
 # Logging setup
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('late_arrival_system.log'),
-        logging.StreamHandler()
-    ]
-)
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_FILE = os.environ.get('LATE_ARRIVAL_LOG_FILE', 'late_arrival_system.log')
 logger = logging.getLogger(__name__)
 
+
+def setup_logging():
+    """
+    Console logging plus the late_arrival_system.log file. Done when a check actually runs
+    instead of at import, so importing this module (the web app does) opens no files.
+    """
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT, handlers=[logging.StreamHandler()])
+    if any(isinstance(handler, logging.FileHandler) for handler in logger.handlers):
+        return
+    try:
+        file_handler = logging.FileHandler(LOG_FILE)
+    except OSError as e:
+        logger.warning(f"Log file {LOG_FILE} unavailable: {e}")
+        return
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logger.addHandler(file_handler)
+
 # Database connection
 DB_CONFIG = {
     'dbname': os.environ.get('DB_NAME'),
@@ -38,7 +52,7 @@ DB_CONFIG = {
 def get_db_connection():
     """Database bağlantısı oluştur"""
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = psycopg2.connect(cursor_factory=InstrumentedCursor, **DB_CONFIG)
         return conn
     except psycopg2.Error as e:
         logger.error(f"Database connection error: {e}")
@@ -201,6 +215,7 @@ def save_late_arrival_record(late_data):
         
         record_id = cur.fetchone()[0]
         conn.commit()
+        bump_version('late_arrivals')
         logger.info(f"Late arrival record saved: {record_id}")
         return record_id
         
@@ -496,6 +511,7 @@ def save_email_record(employee_id, employee_info, subject, body, status, error_m
         ))
         
         conn.commit()
+        bump_version('late_arrival_emails')
         return True
         
     except psycopg2.Error as e:
@@ -520,6 +536,7 @@ def update_late_arrival_email_status(employee_id, check_date):
         """, (employee_id, check_date))
         
         conn.commit()
+        bump_version('late_arrivals')
         return True
         
     except psycopg2.Error as e:
@@ -576,6 +593,7 @@ def is_email_already_sent_today(employee_id, check_date):
 
 def check_all_employees_late_arrivals(check_date=None, limit=None):
     """Tüm çalışanların gecikme durumunu kontrol et"""
+    setup_logging()
     if not check_date:
         check_date = date.today()
     
@@ -691,6 +709,7 @@ def check_all_employees_late_arrivals(check_date=None, limit=None):
 
 def update_monthly_statistics(year=None, month=None):
     """Aylık gecikme istatistiklerini güncelle"""
+    setup_logging()
     if not year or not month:
         today = date.today()
         year = today.year
@@ -740,6 +759,7 @@ def update_monthly_statistics(year=None, month=None):
 
 if __name__ == "__main__":
     # Test çalıştırma
+    setup_logging()
     logger.info("Starting late arrival check...")
     check_all_employees_late_arrivals()
     update_monthly_statistics()
@@ -0,0 +1,365 @@
+"""
+Metrics
+Prometheus text-format metrics (counters, gauges, histograms) without the prometheus_client
+dependency.
+
+Counters and histograms live in process memory. With a multiprocess directory each process also
+writes its values to <directory>/<pid>-<token>.json (at most every flush_seconds, at exit and
+whenever it renders /metrics), and render() adds the files of all processes up, so gunicorn or
+Passenger workers (and short-lived run.cgi processes) are reported as one application whichever
+worker answers the scrape. The file name is taken on the first flush in each process, and a
+forked child (gunicorn --preload workers) starts with empty counters and a file of its own.
+Files of exited processes are folded into archive.json, so their
+counts are kept; their gauges are dropped.
+
+Gauges are read at collection time from collector functions (pool usage, cache counters) and are
+combined across live processes with their aggregate: 'sum', 'max' or 'min'. Derived gauges (hit
+ratios) are computed from the combined values.
+"""
+
+import atexit
+import json
+import os
+import secrets
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: exited processes are not archived
+    fcntl = None
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ARCHIVE_NAME = 'archive.json'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _label_key(labels):
+    return tuple(sorted((str(key), str(value)) for key, value in labels.items()))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _pid_alive(pid):
+    if os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Metrics:
+    """Process-local metric registry with optional cross-process aggregation."""
+
+    def __init__(self, directory=None, flush_seconds=5.0, prefix=''):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self.prefix = prefix
+        self._meta = {}  # name -> (type, help, buckets or aggregate)
+        self._counters = {}  # (name, label key) -> value
+        self._histograms = {}  # (name, label key) -> [bucket counts..., sum, count]
+        self._collectors = []
+        self._derived = []
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._file = None  # this process's file, see _process_file()
+        self._file_pid = None
+        if directory:
+            atexit.register(self.flush)
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=self._after_fork)
+
+    # ----------------------------------------------------------------------------------
+    # Definition
+    # ----------------------------------------------------------------------------------
+
+    def counter(self, name, help_text):
+        self._meta[self.prefix + name] = ('counter', help_text, None)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self._meta[self.prefix + name] = ('histogram', help_text, tuple(sorted(buckets)))
+
+    def gauge(self, name, help_text, aggregate='sum'):
+        """Gauges are reported by collectors; aggregate combines processes: sum, max or min."""
+        self._meta[self.prefix + name] = ('gauge', help_text, aggregate)
+
+    def add_collector(self, fn):
+        """fn() yields (gauge name, labels dict, value); called on every flush/render."""
+        self._collectors.append(fn)
+        return fn
+
+    def add_derived(self, name, help_text, fn):
+        """Gauge computed from the combined gauges: fn({name: {label key: value}}) -> {labels: value}."""
+        self._meta[self.prefix + name] = ('gauge', help_text, 'derived')
+        self._derived.append((self.prefix + name, fn))
+
+    # ----------------------------------------------------------------------------------
+    # Recording
+    # ----------------------------------------------------------------------------------
+
+    def inc(self, name, value=1, **labels):
+        key = (self.prefix + name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        name = self.prefix + name
+        buckets = self._meta[name][2]
+        key = (name, _label_key(labels))
+        with self._lock:
+            state = self._histograms.get(key)
+            if state is None:
+                state = self._histograms[key] = [0] * len(buckets) + [0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def maybe_flush(self):
+        """Writes this process's file if flush_seconds have passed (cheap when they have not)."""
+        if self.directory and time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        if not self.directory:
+            return
+        self._last_flush = time.monotonic()
+        data = self._local_state()
+        data['pid'] = os.getpid()
+        path = self._process_file()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Metrics flush failed: {e}")
+
+    # ----------------------------------------------------------------------------------
+    # Exposition
+    # ----------------------------------------------------------------------------------
+
+    def render(self):
+        """Prometheus text exposition of all processes (or of this one without a directory)."""
+        if not self.directory:
+            states = [self._local_state()]
+        else:
+            self.flush()
+            states = self._read_all_processes()
+
+        counts = Metrics._merge_counts(states)
+        counters = {(name, tuple(map(tuple, labels))): value for name, labels, value in counts['counters']}
+        histograms = {(name, tuple(map(tuple, labels))): values for name, labels, values in counts['histograms']}
+        gauges = {}
+        for state in states:
+            for name, labels, value in state.get('gauges', ()):
+                meta = self._meta.get(name)
+                if meta is None:
+                    continue
+                key = (name, tuple(map(tuple, labels)))
+                if key not in gauges:
+                    gauges[key] = value
+                elif meta[2] == 'max':
+                    gauges[key] = max(gauges[key], value)
+                elif meta[2] == 'min':
+                    gauges[key] = min(gauges[key], value)
+                else:
+                    gauges[key] += value
+
+        by_name = {}
+        for (name, labels), value in gauges.items():
+            by_name.setdefault(name, {})[labels] = value
+        for name, fn in self._derived:
+            try:
+                for labels, value in fn(by_name).items():
+                    gauges[(name, labels)] = value
+            except Exception as e:
+                print(f"⚠️ Derived metric {name} failed: {e}")
+
+        lines = []
+        for name in sorted(self._meta):
+            kind, help_text, extra = self._meta[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == 'counter':
+                for (sample_name, labels), value in sorted(counters.items()):
+                    if sample_name == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            elif kind == 'gauge':
+                for (sample_name, labels), value in sorted(gauges.items()):
+                    if sample_name == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            else:
+                for (sample_name, labels), values in sorted(histograms.items()):
+                    if sample_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(extra, values[:-2]):
+                        cumulative += count
+                        bucket_labels = labels + (('le', _format_value(float(bound))),)
+                        lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {values[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(float(values[-2]))}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {values[-1]}")
+        return '\n'.join(lines) + '\n'
+
+    def histogram_summary(self, name, quantiles=(0.5, 0.95)):
+        """
+        [{'labels', 'count', 'sum', 'mean', 'quantiles': {q: seconds}}] of a histogram over all
+        processes; quantiles are interpolated within buckets like PromQL histogram_quantile().
+        """
+        full_name = self.prefix + name
+        buckets = self._meta[full_name][2]
+        if not self.directory:
+            states = [self._local_state()]
+        else:
+            self.flush()
+            states = self._read_all_processes()
+        summaries = []
+        for sample_name, labels, values in Metrics._merge_counts(states)['histograms']:
+            count = values[-1]
+            if sample_name != full_name or not count:
+                continue
+            estimates = {}
+            for q in quantiles:
+                rank, cumulative, lower = q * count, 0, 0.0
+                estimates[q] = buckets[-1]  # in the +Inf bucket: report the largest bound
+                for bound, bucket_count in zip(buckets, values[:-2]):
+                    if bucket_count and cumulative + bucket_count >= rank:
+                        estimates[q] = lower + (bound - lower) * (rank - cumulative) / bucket_count
+                        break
+                    cumulative += bucket_count
+                    lower = bound
+            summaries.append({'labels': dict(map(tuple, labels)), 'count': count, 'sum': values[-2],
+                              'mean': values[-2] / count, 'quantiles': estimates})
+        return summaries
+
+    # ----------------------------------------------------------------------------------
+    # Internals
+    # ----------------------------------------------------------------------------------
+
+    def _process_file(self):
+        """<directory>/<pid>-<token>.json, chosen per process (the pid changes in forked workers)."""
+        pid = os.getpid()
+        if self._file_pid != pid:
+            self._file = os.path.join(self.directory, f"{pid}-{secrets.token_hex(4)}.json")
+            self._file_pid = pid
+        return self._file
+
+    def _after_fork(self):
+        # The parent's counts stay in the parent's file; the child reports only its own
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._last_flush = 0.0
+        self._file = self._file_pid = None
+
+    def _local_state(self):
+        gauges = []
+        for collector in self._collectors:
+            try:
+                for name, labels, value in collector():
+                    if value is not None:
+                        gauges.append([self.prefix + name, _label_key(labels), value])
+            except Exception as e:
+                print(f"⚠️ Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+        with self._lock:
+            counters = [[name, labels, value] for (name, labels), value in self._counters.items()]
+            histograms = [[name, labels, list(values)] for (name, labels), values in self._histograms.items()]
+        return {'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+    def _read_all_processes(self):
+        lock_file = None
+        if fcntl is not None:
+            try:
+                lock_file = open(os.path.join(self.directory, '.lock'), 'w')
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            except OSError:
+                lock_file = None
+        try:
+            archive_path = os.path.join(self.directory, ARCHIVE_NAME)
+            archive = self._read(archive_path) or {'counters': [], 'histograms': []}
+            states, exited = [], []
+            for filename in os.listdir(self.directory):
+                if not filename.endswith('.json') or filename == ARCHIVE_NAME:
+                    continue
+                path = os.path.join(self.directory, filename)
+                state = self._read(path)
+                if state is None:
+                    continue
+                if path == self._process_file() or _pid_alive(state.get('pid', 0)):
+                    states.append(state)
+                else:
+                    exited.append((path, state))
+
+            if exited and lock_file is not None:
+                # Fold exited processes into the archive (their counters only) and remove them
+                merged = Metrics._merge_counts([archive] + [state for _, state in exited])
+                try:
+                    tmp_path = f"{archive_path}.tmp"
+                    with open(tmp_path, 'w') as f:
+                        json.dump(merged, f)
+                    os.replace(tmp_path, archive_path)
+                    for path, _ in exited:
+                        os.remove(path)
+                    archive = merged
+                except OSError as e:
+                    print(f"⚠️ Metrics archive update failed: {e}")
+                    states.extend({'counters': s.get('counters', ()), 'histograms': s.get('histograms', ())}
+                                  for _, s in exited)
+            elif exited:
+                states.extend({'counters': s.get('counters', ()), 'histograms': s.get('histograms', ())}
+                              for _, s in exited)
+            return [archive] + states
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+
+    @staticmethod
+    def _merge_counts(states):
+        counters, histograms = {}, {}
+        for state in states:
+            for name, labels, value in state.get('counters', ()):
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, values in state.get('histograms', ()):
+                key = (name, tuple(map(tuple, labels)))
+                merged = histograms.get(key)
+                histograms[key] = list(values) if merged is None else [a + b for a, b in zip(merged, values)]
+        return {
+            'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+            'histograms': [[name, labels, values] for (name, labels), values in histograms.items()],
+        }
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Metrics file {path} unreadable: {e}")
+            return None
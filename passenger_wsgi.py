@@ -2,7 +2,13 @@ import sys
 import os
 
 # Proje dizinini yola ekle
-sys.path.insert(0, os.path.dirname(__file__))
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, APP_DIR)
+os.chdir(APP_DIR)
 
 # Senin projenin ana nesnesi app.py içindeki 'app'
-from app import app as application
\ No newline at end of file
+from app import app as application, warm_up
+
+# Passenger keeps this process alive between requests: import, pool and caches are paid once
+if os.environ.get('WARM_UP', 'true').lower() == 'true':
+    warm_up()
\ No newline at end of file
@@ -104,15 +104,23 @@ DB_CONFIG = {
     'port': os.environ.get('DB_PORT', '5432')
 }
 
-db_pool = DatabasePool(DB_CONFIG)
+# Created on first use: opening the minimum connections at import made importing this module
+# block on (or fail without) the database
+db_pool = None
+
+def get_db_pool():
+    global db_pool
+    if db_pool is None:
+        db_pool = DatabasePool(DB_CONFIG)
+    return db_pool
 
 def get_db_connection_optimized():
     """Get optimized database connection from pool"""
-    return db_pool.get_connection()
+    return get_db_pool().get_connection()
 
 def return_db_connection(conn):
     """Return connection to pool"""
-    db_pool.return_connection(conn)
+    get_db_pool().return_connection(conn)
 
 # Optimized dashboard data with caching and single query
 @cache_result(timeout=60)  # Cache for 1 minute
@@ -0,0 +1,285 @@
+"""
+Person Categories
+Maintained person -> category mapping (materialized view public.person_category).
+
+The Administrative / School / Teachers rules (and the broader "staff" rule used by the
+dashboard and attendance views) are defined once here. The view stores one row per
+(category, person_id) pair, so list queries filter with an indexed semi-join instead of
+re-running the case-insensitive position tests for every row, and the category counts
+come from one grouped query.
+
+The view itself is created by the create_person_category_view.sql migration; the app
+only refreshes it. mark_dirty() is called after employee edits made through the app and
+by the employee directory's change probe when persons, positions or departments changed
+elsewhere; a background thread then refreshes the view. While the view is missing or
+dirty the original predicates are used instead, so list pages never show stale categories.
+
+Run this file directly to refresh the view by hand.
+"""
+
+import threading
+import time
+
+import psycopg2
+
+
+VIEW_NAME = 'public.person_category'
+
+# Category -> predicate over pers_person p LEFT JOIN pers_position pp LEFT JOIN auth_department ad
+CATEGORY_RULES = {
+    # Administrative: STUDENT, VISITOR, MÜƏLLİM hariç VE School departmanında olmayanlar
+    'active': """(pp.name IS NULL OR (pp.name NOT ILIKE 'STUDENT'
+                                      AND pp.name NOT ILIKE 'VISITOR'
+                                      AND pp.name NOT ILIKE 'MÜƏLLİM'))
+                 AND (ad.name IS NULL OR ad.name != 'School')""",
+    # School departmanındaki HERKES (müəllimleri de dahil)
+    'school': "ad.name = 'School'",
+    # Müəllim pozisyonundakiler ama School departmanında OLMAYANLAR
+    'teachers': "pp.name = 'Müəllim' AND (ad.name IS NULL OR ad.name != 'School')",
+    # Student, Visitor ve Müəllim hariç herkes (departmandan bağımsız)
+    'staff': """(pp.name IS NULL OR (pp.name NOT ILIKE 'student'
+                                     AND pp.name NOT ILIKE 'visitor'
+                                     AND pp.name NOT ILIKE 'müəllim'))""",
+}
+
+# Categories shown as tabs on the list pages
+TAB_CATEGORIES = ('active', 'school', 'teachers')
+
+_PERSON_JOINS = """FROM public.pers_person p
+    LEFT JOIN public.pers_position pp ON p.position_id = pp.id
+    LEFT JOIN public.auth_department ad ON p.auth_dept_id = ad.id"""
+
+# Arbitrary constant for pg_try_advisory_xact_lock so only one worker refreshes at a time
+_REFRESH_LOCK_ID = 0x70657273  # 'pers'
+_REFRESH_RETRIES = 5
+_REFRESH_RETRY_SECONDS = 2
+
+
+def normalize_category(category):
+    """Maps request values ('teacher', unknown, None) onto a known category."""
+    if category in ('teachers', 'teacher'):
+        return 'teachers'
+    if category in CATEGORY_RULES:
+        return category
+    return 'active'
+
+
+class PersonCategoryIndex:
+    """Keeps the person_category view available, fresh and its counts cached."""
+
+    def __init__(self, connect, release, counts_ttl=60):
+        """connect() returns a psycopg2 connection or None; release(conn) gives it back."""
+        self.connect = connect
+        self.release = release
+        self.counts_ttl = counts_ttl
+        self.available = None  # None = not checked yet
+        self._counts = None
+        self._counts_at = 0.0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._refreshing = False
+        self.refresh_count = 0
+        self.last_refresh_seconds = None
+
+    # ----------------------------------------------------------------------------------
+    # SQL fragments
+    # ----------------------------------------------------------------------------------
+
+    def filter_sql(self, category, person_alias='p'):
+        """
+        AND-fragment restricting person_alias to the category. Uses the view when available and
+        not dirty, otherwise the original predicate (which expects pp / ad joins in the query).
+        """
+        category = normalize_category(category)
+        if self.available and not self._dirty:
+            return (f"AND EXISTS (SELECT 1 FROM {VIEW_NAME} pc "
+                    f"WHERE pc.person_id = {person_alias}.id AND pc.category = '{category}')")
+        return f"AND ({CATEGORY_RULES[category]})"
+
+    # ----------------------------------------------------------------------------------
+    # Public API
+    # ----------------------------------------------------------------------------------
+
+    def ensure(self):
+        """Checks once whether the view exists (see create_person_category_view.sql)."""
+        if self.available is not None:
+            return self.available
+        with self._lock:
+            if self.available is not None:
+                return self.available
+            conn = self.connect()
+            if conn is None:
+                return False  # try again on the next call
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT to_regclass(%s)", (VIEW_NAME,))
+                    self.available = cur.fetchone()[0] is not None
+                if not self.available:
+                    print("⚠️ person_category view missing (run create_person_category_view.sql), "
+                          "using category predicates")
+            except psycopg2.Error as e:
+                conn.rollback()
+                print(f"⚠️ person_category view unavailable, using category predicates: {e}")
+                self.available = False
+            finally:
+                self.release(conn)
+        return self.available
+
+    def counts(self):
+        """{'active': n, 'school': n, 'teachers': n} from one grouped query, cached for counts_ttl seconds."""
+        self.ensure()
+        self.maybe_refresh()
+        with self._lock:
+            if self._counts is not None and time.monotonic() - self._counts_at < self.counts_ttl:
+                return dict(self._counts)
+
+        counts = {category: 0 for category in TAB_CATEGORIES}
+        conn = self.connect()
+        if conn is None:
+            return counts
+        try:
+            with conn.cursor() as cur:
+                if self.available and not self._dirty:
+                    cur.execute(f"""
+                        SELECT category, COUNT(*)
+                        FROM {VIEW_NAME}
+                        WHERE category IN %s
+                        GROUP BY category
+                    """, (TAB_CATEGORIES,))
+                    for category, count in cur.fetchall():
+                        counts[category] = count
+                else:
+                    filters = ",\n".join(f"COUNT(*) FILTER (WHERE {CATEGORY_RULES[category]})"
+                                         for category in TAB_CATEGORIES)
+                    cur.execute(f"SELECT {filters} {_PERSON_JOINS}")
+                    counts.update(zip(TAB_CATEGORIES, cur.fetchone()))
+        except psycopg2.Error as e:
+            print(f"🚨 Category counts error: {e}")
+            return counts
+        finally:
+            self.release(conn)
+
+        with self._lock:
+            self._counts = counts
+            self._counts_at = time.monotonic()
+        return dict(counts)
+
+    def maybe_refresh(self):
+        """
+        Background upkeep that never queries in the calling thread: checks whether the view
+        exists if that is not known yet, and restarts a refresh still pending after a failure.
+        """
+        if self.available is None or self._dirty:
+            self._start_refresh()
+
+    def mark_dirty(self):
+        """
+        Called after an employee edit: list pages fall back to the predicates until a
+        background refresh has caught the view up, so the request never waits for it.
+        """
+        with self._lock:
+            self._dirty = True
+        self._drop_counts()
+        self._start_refresh()
+
+    def refresh(self):
+        """Refreshes the view now (background threads and the command line). Returns True on success."""
+        if not self.ensure():
+            self._drop_counts()
+            return False
+        conn = self.connect()
+        if conn is None:
+            return False
+        started = time.perf_counter()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (_REFRESH_LOCK_ID,))
+                if not cur.fetchone()[0]:
+                    return False  # another worker is refreshing right now
+                cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {VIEW_NAME}")
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            print(f"🚨 person_category refresh error: {e}")
+            return False
+        finally:
+            self.release(conn)
+
+        self.refresh_count += 1
+        self.last_refresh_seconds = round(time.perf_counter() - started, 3)
+        self._drop_counts()
+        return True
+
+    def stats(self):
+        """Cheap counters for monitoring."""
+        return {
+            'available': self.available,
+            'dirty': self._dirty,
+            'refresh_count': self.refresh_count,
+            'last_refresh_seconds': self.last_refresh_seconds,
+            'counts_cached': self._counts is not None,
+        }
+
+    # ----------------------------------------------------------------------------------
+    # Internals
+    # ----------------------------------------------------------------------------------
+
+    def _start_refresh(self):
+        if self.available is False:
+            return  # no view to refresh
+        with self._lock:
+            if self._refreshing:
+                return  # the running refresh loop picks the new change up
+            self._refreshing = True
+        threading.Thread(target=self._refresh_while_dirty, daemon=True).start()
+
+    def _refresh_while_dirty(self):
+        # mark_dirty() / maybe_refresh() can come before anything called ensure(); check here,
+        # in the background thread, rather than in the caller's
+        if not self.ensure():
+            with self._lock:
+                self._refreshing = False
+            return
+        failures = 0
+        while True:
+            with self._lock:
+                if not self._dirty:
+                    self._refreshing = False
+                    return
+                self._dirty = False
+            if self.refresh():
+                failures = 0
+                continue
+            # Another worker holds the refresh lock or the database is busy: retry shortly,
+            # then leave the view dirty for maybe_refresh to pick up again
+            with self._lock:
+                self._dirty = True
+            failures += 1
+            if failures >= _REFRESH_RETRIES:
+                with self._lock:
+                    self._refreshing = False
+                return
+            time.sleep(_REFRESH_RETRY_SECONDS)
+
+    def _drop_counts(self):
+        with self._lock:
+            self._counts = None
+
+
+if __name__ == '__main__':
+    import os
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    db_config = {
+        'dbname': os.environ.get('DB_NAME'),
+        'user': os.environ.get('DB_USER'),
+        'password': os.environ.get('DB_PASSWORD'),
+        'host': os.environ.get('DB_HOST'),
+        'port': os.environ.get('DB_PORT', '5432'),
+    }
+    index = PersonCategoryIndex(lambda: psycopg2.connect(**db_config), lambda conn: conn.close())
+    if index.refresh():
+        print(f"✅ person_category refreshed in {index.last_refresh_seconds}s: {index.counts()}")
+    else:
+        print("❌ person_category could not be refreshed (run create_person_category_view.sql first)")
@@ -0,0 +1,225 @@
+"""
+Profiler
+Opt-in sampling profiler that keeps stack profiles of slow requests.
+
+start() marks the calling thread for profiling; while any thread is marked, one daemon thread
+reads sys._current_frames() every interval_ms and counts the marked threads' call stacks. stop()
+unmarks it and, if the request took at least threshold_ms (or was forced), saves a capture:
+<directory>/<capture id>.json with the route, method, arguments, duration, trace id and the
+stacks in folded form ('outer;inner;leaf' -> samples), which flamegraph.pl, speedscope and
+inferno read directly (folded()).
+
+Only a sample_rate fraction of requests is profiled, so the cost (one stack walk per marked
+thread per interval, nothing for unmarked requests) stays bounded. Work done in other threads or
+processes (parallel shards) is not seen; their caller shows as waiting.
+"""
+
+import json
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+
+
+CAPTURE_ID = re.compile(r'^\d{8}-\d{6}-[0-9a-f]{8}$')
+MAX_STACK_DEPTH = 200
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Session:
+    __slots__ = ('thread_id', 'started', 'stacks', 'samples', 'forced')
+
+    def __init__(self, thread_id, forced):
+        self.thread_id = thread_id
+        self.started = time.perf_counter()
+        self.stacks = Counter()
+        self.samples = 0
+        self.forced = forced
+
+
+class SamplingProfiler:
+    """Samples the stacks of marked threads and stores captures of slow requests."""
+
+    def __init__(self, directory, enabled=False, sample_rate=0.1, threshold_ms=2000, interval_ms=5,
+                 max_captures=200):
+        self.directory = directory
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.threshold_ms = threshold_ms
+        self.interval = interval_ms / 1000.0
+        self.max_captures = max_captures
+        self._sessions = {}  # thread id -> _Session
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._thread = None
+        self.profiled = 0
+        self.captured = 0
+
+    # ----------------------------------------------------------------------------------
+    # Public API
+    # ----------------------------------------------------------------------------------
+
+    def start(self, force=False):
+        """Profiles the calling thread if it is sampled (or forced); returns the session or None."""
+        if not force and not (self.enabled and random.random() < self.sample_rate):
+            return None
+        session = _Session(threading.get_ident(), force)
+        with self._lock:
+            self._sessions[session.thread_id] = session
+            self.profiled += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+            self._active.set()
+        return session
+
+    def stop(self, session, **metadata):
+        """Ends the session; saves and returns a capture if it was slow or forced, else None."""
+        elapsed_ms = self.discard(session)
+        if elapsed_ms is None or not session.samples:
+            return None
+        if not session.forced and elapsed_ms < self.threshold_ms:
+            return None
+        capture = dict(metadata)
+        capture.update({
+            'id': f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(4)}",
+            'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'duration_ms': round(elapsed_ms, 1),
+            'samples': session.samples,
+            'interval_ms': self.interval * 1000,
+            'forced': session.forced,
+            'pid': os.getpid(),
+            'stacks': dict(session.stacks.most_common()),
+        })
+        try:
+            self._save(capture)
+        except OSError as e:
+            print(f"⚠️ Profile capture could not be saved: {e}")
+            return None
+        self.captured += 1
+        return capture
+
+    def discard(self, session):
+        """Ends the session without saving; returns its duration in ms (None if already ended)."""
+        with self._lock:
+            if self._sessions.get(session.thread_id) is not session:
+                return None
+            del self._sessions[session.thread_id]
+            if not self._sessions:
+                self._active.clear()
+        return (time.perf_counter() - session.started) * 1000
+
+    def captures(self, limit=100, route=None):
+        """Newest captures' metadata (without stacks), optionally for one route."""
+        entries = []
+        for capture_id in self._capture_ids()[:limit * 4 if route else limit]:
+            capture = self.capture(capture_id)
+            if capture is None or (route and capture.get('route') != route):
+                continue
+            capture.pop('stacks', None)
+            entries.append(capture)
+            if len(entries) >= limit:
+                break
+        return entries
+
+    def capture(self, capture_id):
+        if not CAPTURE_ID.match(capture_id or ''):
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{capture_id}.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def folded(capture):
+        """Brendan Gregg's folded stack format: one 'frame;frame;frame count' line per stack."""
+        return ''.join(f"{stack} {count}\n" for stack, count in capture['stacks'].items())
+
+    @staticmethod
+    def hot_functions(capture, limit=25):
+        """[(function, self samples, total samples)] by self samples."""
+        own, total = Counter(), Counter()
+        for stack, count in capture['stacks'].items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        return [(frame, samples, total[frame]) for frame, samples in own.most_common(limit)]
+
+    @staticmethod
+    def flame_tree(capture, min_fraction=0.005):
+        """Nested {'name', 'samples', 'children'} tree for rendering, dropping tiny branches."""
+        root = {'name': 'all', 'samples': 0, 'children': {}}
+        for stack, count in capture['stacks'].items():
+            root['samples'] += count
+            node = root
+            for frame in stack.split(';'):
+                node = node['children'].setdefault(frame, {'name': frame, 'samples': 0, 'children': {}})
+                node['samples'] += count
+        minimum = root['samples'] * min_fraction
+
+        def finish(node):
+            children = sorted((child for child in node['children'].values() if child['samples'] >= minimum),
+                              key=lambda child: -child['samples'])
+            node['children'] = [finish(child) for child in children]
+            return node
+        return finish(root)
+
+    def stats(self):
+        """Cheap counters for monitoring."""
+        return {'enabled': self.enabled, 'profiled': self.profiled, 'captured': self.captured,
+                'active': len(self._sessions)}
+
+    # ----------------------------------------------------------------------------------
+    # Internals
+    # ----------------------------------------------------------------------------------
+
+    def _run(self):
+        while True:
+            self._active.wait()
+            time.sleep(self.interval)
+            # Sampling under the lock: a stopped session receives no further samples
+            with self._lock:
+                if not self._sessions:
+                    continue
+                frames = sys._current_frames()
+                for session in self._sessions.values():
+                    frame = frames.get(session.thread_id)
+                    if frame is None:
+                        continue
+                    stack = []
+                    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                        stack.append(_frame_name(frame.f_code))
+                        frame = frame.f_back
+                    stack.reverse()
+                    session.stacks[';'.join(stack)] += 1
+                    session.samples += 1
+                del frames
+
+    def _capture_ids(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((name[:-5] for name in names if name.endswith('.json') and CAPTURE_ID.match(name[:-5])),
+                      reverse=True)
+
+    def _save(self, capture):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{capture['id']}.json")
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(capture, f, default=str)
+        os.replace(f"{path}.tmp", path)
+        for capture_id in self._capture_ids()[self.max_captures:]:
+            try:
+                os.remove(os.path.join(self.directory, f"{capture_id}.json"))
+            except OSError:
+                pass
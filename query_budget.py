@@ -0,0 +1,190 @@
+"""
+Query Budget
+Per-request / per-job query counting with N+1 detection and query budgets (development, staging
+and test runs).
+
+begin(name) opens a scope on the current thread (a request route or 'job:<name>'); the
+db_instrumentation listener record() counts every statement into all open scopes of the thread:
+statements, database time, distinct connections and calls per statement fingerprint. end()
+closes the scope and checks it:
+
+  - more statements than the scope's budget (budgets[name], else default_budget),
+  - more distinct connections than connection_budget,
+  - one fingerprint executed repeat_threshold times or more (an N+1 pattern: a query in a loop).
+
+mode 'log' prints the problems, 'raise' raises QueryBudgetExceeded (a failing request or job, for
+staging and test runs), 'off' does nothing. assert_max_queries() is the same check for tests.
+Statements executed on other threads (parallel shards) are not counted in the caller's scope.
+"""
+
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from query_stats import fingerprint
+
+
+MODES = ('off', 'log', 'raise')
+
+
+class QueryBudgetExceeded(Exception):
+    """A scope ran more statements or connections than allowed, or an N+1 pattern."""
+
+    def __init__(self, scope, problems):
+        super().__init__(f"{scope.name}: " + '; '.join(problems))
+        self.scope = scope
+        self.problems = problems
+
+
+class QueryScope:
+    """Statements of one request or job."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.seconds = 0.0
+        self.connections = set()
+        self.fingerprints = Counter()
+        self.samples = {}  # fingerprint -> normalized statement
+
+    def add(self, event):
+        fp, normalized = fingerprint(event.sql)
+        self.queries += 1
+        self.seconds += event.seconds
+        self.connections.add(id(event.cursor.connection))
+        self.fingerprints[fp] += 1
+        self.samples.setdefault(fp, normalized)
+
+    def repeated(self, threshold):
+        """[(count, normalized statement)] of fingerprints executed at least threshold times."""
+        return [(count, self.samples[fp]) for fp, count in self.fingerprints.most_common()
+                if count >= threshold]
+
+
+class QueryBudget:
+    """Thread-local query scopes checked against budgets when they end."""
+
+    def __init__(self, mode='off', budgets=None, default_budget=None, connection_budget=None,
+                 repeat_threshold=10):
+        if mode not in MODES:
+            raise ValueError(f"query budget mode must be one of {MODES}, not {mode!r}")
+        self.mode = mode
+        self.budgets = dict(budgets or {})
+        self.default_budget = default_budget
+        self.connection_budget = connection_budget
+        self.repeat_threshold = repeat_threshold
+        self._local = threading.local()
+        self.scopes_checked = 0
+        self.violations = 0
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    # ----------------------------------------------------------------------------------
+    # Public API
+    # ----------------------------------------------------------------------------------
+
+    def record(self, event):
+        """db_instrumentation listener."""
+        for scope in getattr(self._local, 'stack', ()):
+            scope.add(event)
+
+    def begin(self, name):
+        if not self.enabled:
+            return None
+        scope = QueryScope(name)
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(scope)
+        return scope
+
+    def end(self, scope=None, check=True):
+        """
+        Closes `scope` (default: the innermost scope of this thread) together with any scope
+        opened inside it, and checks it. Returns the closed scope, or None if it was not open.
+        """
+        stack = getattr(self._local, 'stack', None)
+        if not stack or (scope is not None and scope not in stack):
+            return None
+        if scope is None:
+            scope = stack[-1]
+        del stack[stack.index(scope):]
+        if check:
+            self.check(scope)
+        return scope
+
+    def discard(self, scope):
+        """Closes `scope` without checking it (error paths)."""
+        self.end(scope, check=False)
+
+    @contextmanager
+    def scope(self, name):
+        scope = self.begin(name)
+        if scope is None:
+            yield None
+            return
+        try:
+            yield scope
+        except BaseException:
+            self.discard(scope)
+            raise
+        self.end(scope)
+
+    def problems(self, scope):
+        """Budget and N+1 findings for a finished scope."""
+        found = []
+        budget = self.budgets.get(scope.name, self.default_budget)
+        if budget is not None and scope.queries > budget:
+            found.append(f"{scope.queries} queries (budget {budget})")
+        if self.connection_budget is not None and len(scope.connections) > self.connection_budget:
+            found.append(f"{len(scope.connections)} connections (budget {self.connection_budget})")
+        for count, statement in scope.repeated(self.repeat_threshold):
+            found.append(f"possible N+1: {count}x {statement[:200]}")
+        return found
+
+    def check(self, scope):
+        self.scopes_checked += 1
+        found = self.problems(scope)
+        if not found:
+            return
+        self.violations += 1
+        if self.mode == 'raise':
+            raise QueryBudgetExceeded(scope, found)
+        print(f"⚠️ Query budget: {scope.name} ran {scope.queries} queries on "
+              f"{len(scope.connections)} connections in {scope.seconds * 1000:.0f} ms")
+        for problem in found:
+            print(f"   - {problem}")
+
+    def stats(self):
+        """Cheap counters for monitoring."""
+        return {'mode': self.mode, 'scopes_checked': self.scopes_checked, 'violations': self.violations}
+
+
+@contextmanager
+def assert_max_queries(budget_tracker, limit, connections=None, name='test'):
+    """
+    Test helper: fails with QueryBudgetExceeded if the block runs more than `limit` statements
+    (or connections) or repeats a statement repeat_threshold times.
+
+        with assert_max_queries(query_budget, 12):
+            client.get('/attendance')
+
+    Works in any mode of budget_tracker, as long as its listener is registered.
+    """
+    checker = QueryBudget('raise', default_budget=limit, connection_budget=connections,
+                          repeat_threshold=budget_tracker.repeat_threshold)
+    stack = getattr(budget_tracker._local, 'stack', None)
+    if stack is None:
+        stack = budget_tracker._local.stack = []
+    scope = QueryScope(name)
+    stack.append(scope)
+    try:
+        yield scope
+    finally:
+        if scope in stack:
+            stack.remove(scope)
+    checker.check(scope)
@@ -0,0 +1,345 @@
+"""
+Query Stats
+Per-statement statistics, slow-query log and sampled EXPLAIN (ANALYZE, BUFFERS) plans.
+
+record() is a db_instrumentation listener. Every statement is reduced to a fingerprint (literals,
+parameters and IN lists replaced by ?, whitespace collapsed) and its calls, total/max time, rows
+and errors are added up per fingerprint. Statements slower than slow_ms are printed and appended
+to slow_queries.jsonl; for a sample of those (explain_sample_rate, off by default, at most once
+per fingerprint every explain_interval seconds) a background thread re-runs the statement on its
+own read-only connection under EXPLAIN (ANALYZE, BUFFERS) and keeps the plan in
+plans/<fingerprint>.json. Only plain SELECT statements are explained, since ANALYZE executes the
+statement. Plan files store the normalized statement text, never the bound parameter values.
+
+Each process writes its statistics to stats/<pid>-<token>.json (like metrics.py, named on the
+first flush, so forked workers get files of their own); top() adds up the files of all
+processes, so the admin page shows every worker.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import random
+import re
+import secrets
+import threading
+import time
+from functools import lru_cache
+
+
+SLOW_LOG_NAME = 'slow_queries.jsonl'
+SLOW_LOG_MAX_BYTES = 5 * 1024 * 1024
+SQL_TEXT_LIMIT = 4000
+
+_COMMENT = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PARAM = re.compile(r'%\(\w+\)s|%s|\$\d+')
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_ARRAY = re.compile(r'ARRAY\[\s*\?(?:\s*,\s*\?)*\s*\]', re.I)
+_SPACE = re.compile(r'\s+')
+_FINGERPRINT = re.compile(r'^[0-9a-f]{16}$')
+_MODIFYING = re.compile(r'\b(INSERT|UPDATE|DELETE|MERGE|TRUNCATE|CREATE|DROP|ALTER|GRANT|COPY|CALL|'
+                        r'LOCK|NEXTVAL|SETVAL|PG_ADVISORY\w*)\b', re.I)
+
+
+@lru_cache(maxsize=4096)
+def normalize(sql):
+    """Statement text with literals and parameters replaced by ?, e.g. for grouping."""
+    text = _COMMENT.sub(' ', sql)
+    text = _STRING.sub('?', text)
+    text = _PARAM.sub('?', text)
+    text = _NUMBER.sub('?', text)
+    text = _LIST.sub('(?...)', text)
+    text = _ARRAY.sub('ARRAY[?...]', text)
+    return _SPACE.sub(' ', text).strip()
+
+
+def fingerprint(sql):
+    """(fingerprint id, normalized text) of a statement."""
+    normalized = normalize(sql)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16], normalized
+
+
+def explainable(sql):
+    """True for read-only statements that are safe to run again under EXPLAIN ANALYZE."""
+    head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ''
+    return head in ('SELECT', 'WITH') and not _MODIFYING.search(_STRING.sub("''", sql))
+
+
+class QueryStats:
+    """Statement statistics of this process plus the shared slow log and plan store."""
+
+    def __init__(self, directory, connect=None, context_fn=None, slow_ms=500, explain_sample_rate=0.0,
+                 explain_interval=600, explain_timeout_ms=60000, max_statements=500, flush_seconds=10.0,
+                 retention_days=7, trace_fn=None):
+        self.directory = directory
+        self.connect = connect
+        self.context_fn = context_fn
+        self.trace_fn = trace_fn
+        self.slow_ms = slow_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_interval = explain_interval
+        self.explain_timeout_ms = explain_timeout_ms
+        self.max_statements = max_statements
+        self.flush_seconds = flush_seconds
+        self.retention_days = retention_days
+        self._statements = {}  # fingerprint -> dict
+        self._lock = threading.Lock()
+        self._explained_at = {}  # fingerprint -> monotonic time of the last EXPLAIN
+        self._explaining = False
+        self._last_flush = 0.0
+        self._stats_dir = os.path.join(directory, 'stats')
+        self._file = None  # this process's file, see _process_file()
+        self._file_pid = None
+        self.slow_count = 0
+        self.explain_count = 0
+        atexit.register(self.flush)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    # ----------------------------------------------------------------------------------
+    # Recording
+    # ----------------------------------------------------------------------------------
+
+    def record(self, event):
+        """db_instrumentation listener."""
+        fp, normalized = fingerprint(event.sql)
+        milliseconds = event.seconds * 1000
+        rows = max(event.rows, 0)
+        with self._lock:
+            entry = self._statements.get(fp)
+            if entry is None:
+                if len(self._statements) >= self.max_statements:
+                    cheapest = min(self._statements, key=lambda key: self._statements[key]['total_ms'])
+                    del self._statements[cheapest]
+                entry = self._statements[fp] = {
+                    'sql': normalized[:SQL_TEXT_LIMIT], 'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                    'rows': 0, 'errors': 0, 'slow': 0, 'contexts': {},
+                }
+            entry['calls'] += 1
+            entry['total_ms'] += milliseconds
+            entry['max_ms'] = max(entry['max_ms'], milliseconds)
+            entry['rows'] += rows
+            if event.error is not None:
+                entry['errors'] += 1
+            context = self.context_fn() if self.context_fn is not None else None
+            if context is not None and (context in entry['contexts'] or len(entry['contexts']) < 10):
+                entry['contexts'][context] = entry['contexts'].get(context, 0) + 1
+            if milliseconds >= self.slow_ms:
+                entry['slow'] += 1
+
+        if milliseconds >= self.slow_ms:
+            self._record_slow(event, fp, milliseconds, rows, context)
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        with self._lock:
+            if not self._statements:
+                return
+            data = {'pid': os.getpid(), 'updated_at': time.time(),
+                    'statements': {fp: dict(entry, contexts=dict(entry['contexts']))
+                                   for fp, entry in self._statements.items()}}
+        path = self._process_file()
+        try:
+            os.makedirs(self._stats_dir, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Query stats flush failed: {e}")
+
+    def _process_file(self):
+        """stats/<pid>-<token>.json, chosen per process (the pid changes in forked workers)."""
+        pid = os.getpid()
+        if self._file_pid != pid:
+            self._file = os.path.join(self._stats_dir, f"{pid}-{secrets.token_hex(4)}.json")
+            self._file_pid = pid
+        return self._file
+
+    def _after_fork(self):
+        # The parent's statements stay in the parent's file; the child reports only its own
+        self._lock = threading.Lock()
+        self._statements = {}
+        self._explaining = False
+        self._last_flush = 0.0
+        self._file = self._file_pid = None
+
+    # ----------------------------------------------------------------------------------
+    # Reading
+    # ----------------------------------------------------------------------------------
+
+    def top(self, limit=50, order_by='total_ms'):
+        """Statements of all processes (within retention), most expensive first."""
+        self.flush()
+        merged = {}
+        stats_dir = self._stats_dir
+        cutoff = time.time() - self.retention_days * 86400
+        try:
+            filenames = os.listdir(stats_dir)
+        except FileNotFoundError:
+            filenames = []
+        for filename in filenames:
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(stats_dir, filename)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    continue
+                with open(path) as f:
+                    statements = json.load(f)['statements']
+            except (OSError, ValueError, KeyError):
+                continue
+            for fp, entry in statements.items():
+                total = merged.get(fp)
+                if total is None:
+                    merged[fp] = dict(entry, fingerprint=fp, contexts=dict(entry['contexts']))
+                    continue
+                for key in ('calls', 'total_ms', 'rows', 'errors', 'slow'):
+                    total[key] += entry[key]
+                total['max_ms'] = max(total['max_ms'], entry['max_ms'])
+                for context, calls in entry['contexts'].items():
+                    total['contexts'][context] = total['contexts'].get(context, 0) + calls
+
+        for entry in merged.values():
+            entry['mean_ms'] = entry['total_ms'] / entry['calls'] if entry['calls'] else 0.0
+            entry['rows_per_call'] = entry['rows'] / entry['calls'] if entry['calls'] else 0.0
+            entry['has_plan'] = os.path.exists(self._plan_path(entry['fingerprint']))
+        return sorted(merged.values(), key=lambda entry: entry[order_by], reverse=True)[:limit]
+
+    def recent_slow(self, limit=50):
+        """Latest slow-log entries, newest first."""
+        try:
+            with open(os.path.join(self.directory, SLOW_LOG_NAME), 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - 256 * 1024))
+                lines = f.read().decode('utf-8', 'replace').splitlines()
+        except FileNotFoundError:
+            return []
+        entries = []
+        for line in reversed(lines):
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+            if len(entries) >= limit:
+                break
+        return entries
+
+    def plan(self, fp):
+        """Stored EXPLAIN capture for a fingerprint, or None."""
+        if not _FINGERPRINT.match(fp or ''):
+            return None
+        try:
+            with open(self._plan_path(fp)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def reset(self):
+        """Forgets the statistics of every process (slow log and plans are kept)."""
+        with self._lock:
+            self._statements.clear()
+        stats_dir = self._stats_dir
+        for filename in os.listdir(stats_dir) if os.path.isdir(stats_dir) else ():
+            try:
+                os.remove(os.path.join(stats_dir, filename))
+            except OSError:
+                pass
+
+    def stats(self):
+        """Cheap counters for monitoring."""
+        with self._lock:
+            statements = len(self._statements)
+        return {'statements': statements, 'slow': self.slow_count, 'explained': self.explain_count}
+
+    # ----------------------------------------------------------------------------------
+    # Slow queries and plans
+    # ----------------------------------------------------------------------------------
+
+    def _record_slow(self, event, fp, milliseconds, rows, context):
+        self.slow_count += 1
+        sql = event.sql
+        trace_id = self.trace_fn() if self.trace_fn is not None else None
+        print(f"🐢 Slow query {milliseconds:.0f} ms, {rows} rows [{fp}] {context or ''}"
+              f"{f' trace={trace_id}' if trace_id else ''}: {_SPACE.sub(' ', sql).strip()[:300]}")
+        entry = {'at': time.strftime('%Y-%m-%d %H:%M:%S'), 'fingerprint': fp, 'ms': round(milliseconds, 1),
+                 'rows': rows, 'context': context, 'trace_id': trace_id,
+                 'error': str(event.error) if event.error else None,
+                 'sql': _SPACE.sub(' ', sql).strip()[:SQL_TEXT_LIMIT]}
+        path = os.path.join(self.directory, SLOW_LOG_NAME)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if os.path.exists(path) and os.path.getsize(path) > SLOW_LOG_MAX_BYTES:
+                os.replace(path, f"{path}.1")
+            with open(path, 'a') as f:
+                f.write(json.dumps(entry, default=str) + '\n')
+        except OSError as e:
+            print(f"⚠️ Slow query log write failed: {e}")
+
+        if (self.connect is not None and event.error is None and not event.many
+                and random.random() < self.explain_sample_rate and explainable(sql)):
+            self._maybe_explain(event, fp, milliseconds)
+
+    def _maybe_explain(self, event, fp, milliseconds):
+        # The bound statement only lives in the explain thread; the plan file gets the normalized text
+        now = time.monotonic()
+        with self._lock:
+            if self._explaining or now - self._explained_at.get(fp, -self.explain_interval) < self.explain_interval:
+                return
+            self._explaining = True
+            self._explained_at[fp] = now
+        try:
+            # Bind the parameters now, on the original cursor; the plan is taken on another connection
+            statement = event.cursor.mogrify(event.query, event.params)
+            if isinstance(statement, bytes):
+                statement = statement.decode('utf-8', 'replace')
+        except Exception as e:
+            print(f"⚠️ EXPLAIN skipped for {fp}: {e}")
+            with self._lock:
+                self._explaining = False
+            return
+        threading.Thread(target=self._explain, args=(fp, statement, normalize(event.sql), milliseconds),
+                         name='explain-sampler', daemon=True).start()
+
+    def _explain(self, fp, statement, normalized, milliseconds):
+        conn = None
+        capture = {'fingerprint': fp, 'captured_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                   'query_ms': round(milliseconds, 1), 'sql': normalized[:SQL_TEXT_LIMIT * 4]}
+        try:
+            conn = self.connect()
+            conn.set_session(readonly=True)
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL statement_timeout = %s", (int(self.explain_timeout_ms),))
+                cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + statement)
+                # Filter / Index Cond lines repeat the bound values; keep only their shape
+                capture['plan'] = _STRING.sub("'?'", '\n'.join(row[0] for row in cur.fetchall()))
+            self.explain_count += 1
+        except Exception as e:
+            capture['error'] = str(e)
+            print(f"⚠️ EXPLAIN failed for {fp}: {e}")
+        finally:
+            if conn is not None:
+                try:
+                    conn.rollback()
+                    conn.close()
+                except Exception:
+                    pass
+            with self._lock:
+                self._explaining = False
+        try:
+            os.makedirs(os.path.dirname(self._plan_path(fp)), exist_ok=True)
+            with open(self._plan_path(fp), 'w') as f:
+                json.dump(capture, f)
+        except OSError as e:
+            print(f"⚠️ EXPLAIN plan write failed: {e}")
+
+    def _plan_path(self, fp):
+        return os.path.join(self.directory, 'plans', f"{fp}.json")
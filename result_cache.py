@@ -0,0 +1,223 @@
+"""
+Period Result Cache
+Caches computed attendance results per (view, period, filters).
+
+Periods that ended before today cannot change (except through rare corrections), so their
+results are written to local disk and kept until invalidate() is called for that period.
+Periods that include today (or later) are kept for a short TTL only; they are also written to
+disk so that other worker processes can reuse a result computed moments ago.
+
+The key also holds version_fn() (the employee directory's data version), so editing, moving or
+deleting a person makes earlier results unreachable; while no version is known nothing is
+cached. The disk store holds at most max_disk_entries files, least recently used evicted first.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+
+
+class PeriodResultCache:
+    """Two-level (memory + disk) cache for closed-period results."""
+
+    def __init__(self, directory, clock, open_ttl=60, memory_entries=256, enabled=True,
+                 max_disk_entries=2000, version_fn=None):
+        self.directory = directory
+        self.clock = clock
+        self.open_ttl = open_ttl
+        self.memory_entries = memory_entries
+        self.enabled = enabled
+        self.max_disk_entries = max_disk_entries
+        self.version_fn = version_fn
+        self._memory = OrderedDict()  # filename -> (expires_at or None, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evicted = 0
+
+    # ----------------------------------------------------------------------------------
+    # Public API
+    # ----------------------------------------------------------------------------------
+
+    def get_or_compute(self, view, period_start, period_end, filters, compute, is_valid=None):
+        """
+        Returns the cached result for (view, period, filters) or computes and stores it.
+        is_valid(result) can reject results that must not be cached (e.g. error fallbacks).
+        """
+        if not self.enabled:
+            return compute()
+
+        version = None
+        if self.version_fn is not None:
+            version = self.version_fn()
+            if version is None:
+                self.bypassed += 1
+                return compute()
+
+        period_start, period_end = _as_date(period_start), _as_date(period_end)
+        filename = self._filename(view, period_start, period_end, (filters, version))
+        closed = period_end < self.clock().date()
+
+        result = self._lookup(filename, closed)
+        if result is not None:
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        result = compute()
+        if is_valid is not None and not is_valid(result):
+            return result
+
+        self._write_disk(filename, result)
+        if closed:
+            self._remember(filename, None, result)
+        else:
+            self._remember(filename, time.monotonic() + self.open_ttl, result)
+        return result
+
+    def invalidate(self, start_date=None, end_date=None):
+        """Removes every cached result whose period overlaps [start_date, end_date]. Returns the count."""
+        start_date, end_date = _as_date(start_date), _as_date(end_date)
+        removed = set()
+
+        with self._lock:
+            for filename in list(self._memory):
+                if _overlaps(filename, start_date, end_date):
+                    del self._memory[filename]
+                    removed.add(filename)
+
+        if os.path.isdir(self.directory):
+            for filename in os.listdir(self.directory):
+                if filename.endswith('.pkl') and _overlaps(filename, start_date, end_date):
+                    try:
+                        os.remove(os.path.join(self.directory, filename))
+                        removed.add(filename)
+                    except OSError:
+                        pass
+        return len(removed)
+
+    def stats(self):
+        """Cheap counters for monitoring."""
+        with self._lock:
+            memory_entries = len(self._memory)
+        disk_entries = 0
+        if os.path.isdir(self.directory):
+            disk_entries = sum(1 for name in os.listdir(self.directory) if name.endswith('.pkl'))
+        return {
+            'enabled': self.enabled,
+            'memory_entries': memory_entries,
+            'disk_entries': disk_entries,
+            'max_disk_entries': self.max_disk_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'bypassed': self.bypassed,
+            'evicted': self.evicted,
+        }
+
+    # ----------------------------------------------------------------------------------
+    # Storage
+    # ----------------------------------------------------------------------------------
+
+    @staticmethod
+    def _filename(view, period_start, period_end, filters):
+        digest = hashlib.sha1(repr(filters).encode('utf-8')).hexdigest()[:16]
+        return f"{view}__{period_start.isoformat()}__{period_end.isoformat()}__{digest}.pkl"
+
+    def _lookup(self, filename, closed):
+        path = os.path.join(self.directory, filename)
+        with self._lock:
+            entry = self._memory.get(filename)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at is None:
+                    # Another worker may have invalidated the period on disk
+                    if os.path.exists(path):
+                        self._memory.move_to_end(filename)
+                        return result
+                    del self._memory[filename]
+                elif expires_at > time.monotonic():
+                    return result
+                else:
+                    del self._memory[filename]
+
+        try:
+            expires_at = None
+            if not closed:
+                age = time.time() - os.path.getmtime(path)
+                if age >= self.open_ttl:
+                    os.remove(path)  # expired open-period result, recomputed by the caller
+                    return None
+                expires_at = time.monotonic() + self.open_ttl - age
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+            if closed:
+                os.utime(path)  # mtime = last use, for LRU eviction (open periods keep it for their TTL)
+        except (OSError, pickle.PickleError, EOFError):
+            return None
+        self._remember(filename, expires_at, result)
+        return result
+
+    def _remember(self, filename, expires_at, result):
+        with self._lock:
+            self._memory[filename] = (expires_at, result)
+            self._memory.move_to_end(filename)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _write_disk(self, filename, result):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, os.path.join(self.directory, filename))
+        except OSError as e:
+            print(f"⚠️ Result cache write error: {e}")
+            return
+        self._evict_disk()  # writes follow a heavy computation, so a directory scan is cheap
+
+    def _evict_disk(self):
+        """Removes the least recently used files beyond max_disk_entries."""
+        try:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.pkl'):
+                    entries.append((entry.stat().st_mtime, entry.path))
+        except OSError:
+            return
+        if len(entries) <= self.max_disk_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_disk_entries]:
+            try:
+                os.remove(path)
+                self.evicted += 1
+            except OSError:
+                pass
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _overlaps(filename, start_date, end_date):
+    """True if the period encoded in a cache filename overlaps [start_date, end_date]."""
+    try:
+        _, period_start, period_end, _ = filename.split('__')
+        period_start = date.fromisoformat(period_start)
+        period_end = date.fromisoformat(period_end)
+    except ValueError:
+        return False
+    if start_date is not None and period_end < start_date:
+        return False
+    if end_date is not None and period_start > end_date:
+        return False
+    return True
@@ -0,0 +1,106 @@
+"""
+Single Flight
+Coalesces concurrent identical calls to heavy helpers into one computation.
+
+The first caller for a key runs the function; callers arriving while it is running wait for
+it and receive the same result (or exception). Nothing is cached after the call finishes.
+
+Optionally a cross-process lock (e.g. a Postgres advisory lock) can be taken by the leader.
+Leaders in other worker processes then queue behind it and, if the function reads from a
+shared cache (such as the on-disk period result cache), they find the finished result there
+instead of recomputing it.
+"""
+
+import threading
+import time
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """In-process single-flight group with an optional shared (cross-worker) lock."""
+
+    def __init__(self, shared_lock=None, wait_timeout=300):
+        """
+        shared_lock(key) must return a context manager that serializes the key across processes,
+        or None to disable cross-worker coalescing.
+        """
+        self.shared_lock = shared_lock
+        self.wait_timeout = wait_timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.shared_lock_errors = 0
+
+    def do(self, key, fn, shared=False):
+        """Runs fn() once for all concurrent callers with the same key and returns its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+                self.leaders += 1
+            else:
+                call.waiters += 1
+                leader = False
+                self.coalesced += 1
+
+        if not leader:
+            if not call.done.wait(self.wait_timeout):
+                # The leader is stuck; do not let every follower hang with it
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if shared and self.shared_lock is not None:
+                call.result = self._run_with_shared_lock(key, fn)
+            else:
+                call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self):
+        """Cheap counters for monitoring."""
+        with self._lock:
+            in_flight = len(self._calls)
+            waiting = sum(call.waiters for call in self._calls.values())
+        return {
+            'in_flight': in_flight,
+            'waiting': waiting,
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+            'shared_lock_errors': self.shared_lock_errors,
+        }
+
+    def _run_with_shared_lock(self, key, fn):
+        started = time.monotonic()
+        try:
+            lock = self.shared_lock(key)
+            lock.__enter__()
+        except Exception as e:
+            # Cross-worker coalescing is best effort; compute locally instead of failing
+            self.shared_lock_errors += 1
+            print(f"⚠️ Single-flight shared lock unavailable ({time.monotonic() - started:.1f}s): {e}")
+            return fn()
+        try:
+            return fn()
+        finally:
+            lock.__exit__(None, None, None)
@@ -0,0 +1,268 @@
+"""
+Snapshot Engine
+Serves named sections (e.g. dashboard widgets) from a shared snapshot with stale-while-revalidate.
+
+Each section has its own refresh interval. Requests always get the current snapshot immediately;
+a stale section triggers one background refresh per process, and a lock file makes sure only one
+worker process recomputes it. The other workers pick up the result from the snapshot file.
+Only a section that has no value for the current day is calculated inline: values carry the
+date (clock()) they were computed for, so after midnight yesterday's lists are never served.
+The inline path takes the same lock file: one worker computes, the others wait for it (up to
+inline_wait_seconds) and then read its result from the snapshot file. Shortly after midnight
+each process also starts a background refresh, so the first request of the day usually finds
+today's values already computed.
+A section that fails is retried after retry_seconds, doubling up to max_retry_seconds, instead
+of being recomputed inline by every request.
+"""
+
+import os
+import pickle
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, every worker refreshes on its own
+    fcntl = None
+
+
+class SnapshotEngine:
+    """Stale-while-revalidate snapshot of independently refreshed sections."""
+
+    def __init__(self, name, sections, directory, clock=datetime.now, retry_seconds=30, max_retry_seconds=600,
+                 inline_wait_seconds=120):
+        """sections: {section_name: (compute_fn, interval_seconds)}; clock() gives the local datetime."""
+        self.name = name
+        self.sections = sections
+        self.directory = directory
+        self.clock = clock
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.inline_wait_seconds = inline_wait_seconds
+        self.path = os.path.join(directory, f"{name}.snapshot")
+        self.lock_path = os.path.join(directory, f"{name}.lock")
+        self._values = {}  # section -> (value, computed_at epoch seconds, day computed for)
+        self._failures = {}  # section -> (consecutive failures, monotonic time of the next attempt)
+        self._loaded_mtime = None
+        self._lock = threading.Lock()  # guards _values
+        self._refresh_lock = threading.Lock()  # serializes recomputation inside this process
+        self._refreshing = False
+        self._day_timer = None
+        self.refresh_count = 0
+        self.last_refresh_seconds = None
+
+    # ----------------------------------------------------------------------------------
+    # Public API
+    # ----------------------------------------------------------------------------------
+
+    def get(self):
+        """Returns {section: (value, computed_at)}; value is None if the section has no value for today."""
+        self._load_from_disk()
+        today = self.clock().date()
+        self._schedule_day_refresh()
+
+        if self._missing(today):
+            # Cold start or a new day: nothing valid to serve yet. One worker computes inline, the
+            # others wait on the lock file and then take its result from the snapshot file
+            with self._refresh_lock:
+                if self._missing(today):
+                    lock_file = self._acquire_process_lock(wait_seconds=self.inline_wait_seconds)
+                    try:
+                        self._load_from_disk()
+                        missing = self._missing(today)
+                        if missing:
+                            self._refresh(missing, today)
+                    finally:
+                        self._release_process_lock(lock_file)
+
+        now = time.time()
+        with self._lock:
+            stale = [name for name, (_, interval) in self.sections.items()
+                     if self._is_current(name, today) and now - self._values[name][1] >= interval]
+            if stale and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._background_refresh, daemon=True).start()
+            return {name: self._values[name][:2] if self._is_current(name, today) else (None, None)
+                    for name in self.sections}
+
+    def ages(self, snapshot=None):
+        """Seconds since each section was computed (current values if no snapshot is given)."""
+        if snapshot is None:
+            with self._lock:
+                snapshot = {name: self._values[name][:2] if name in self._values else (None, None)
+                            for name in self.sections}
+        now = time.time()
+        return {name: (int(now - computed_at) if computed_at else None)
+                for name, (_, computed_at) in snapshot.items()}
+
+    def invalidate(self):
+        """Forgets the snapshot so the next request recomputes every section."""
+        with self._lock:
+            self._values.clear()
+            self._failures.clear()
+            self._loaded_mtime = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def stats(self):
+        """Cheap counters for monitoring."""
+        return {
+            'sections': self.ages(),
+            'refresh_count': self.refresh_count,
+            'last_refresh_seconds': self.last_refresh_seconds,
+            'refreshing': self._refreshing,
+            'failing': sorted(self._failures),
+        }
+
+    # ----------------------------------------------------------------------------------
+    # Refresh
+    # ----------------------------------------------------------------------------------
+
+    def _background_refresh(self):
+        try:
+            lock_file = self._acquire_process_lock()
+            if lock_file is False:
+                return  # another worker is refreshing; its result arrives via the snapshot file
+            try:
+                with self._refresh_lock:
+                    self._load_from_disk()
+                    today = self.clock().date()
+                    now = time.time()
+                    with self._lock:
+                        stale = [name for name, (_, interval) in self.sections.items()
+                                 if not self._is_current(name, today) or now - self._values[name][1] >= interval]
+                    stale = [name for name in stale if self._may_attempt(name)]
+                    if stale:
+                        self._refresh(stale, today)
+            finally:
+                self._release_process_lock(lock_file)
+        except Exception as e:
+            print(f"⚠️ Snapshot '{self.name}' refresh error: {e}")
+        finally:
+            self._refreshing = False
+
+    def _schedule_day_refresh(self):
+        """Arms a timer that refreshes every section a few seconds after the next midnight (clock())."""
+        if self._day_timer is not None and self._day_timer.is_alive():
+            return
+        with self._lock:
+            if self._day_timer is not None and self._day_timer.is_alive():
+                return
+            now = self.clock()
+            next_day = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+            self._day_timer = threading.Timer((next_day - now).total_seconds() + 5, self._day_refresh)
+            self._day_timer.daemon = True
+            self._day_timer.start()
+
+    def _day_refresh(self):
+        self._day_timer = None
+        if not self._refreshing:
+            self._refreshing = True
+            self._background_refresh()
+        self._schedule_day_refresh()
+
+    def _missing(self, today):
+        """Sections without a value for today that are not waiting out a failure backoff."""
+        with self._lock:
+            missing = [name for name in self.sections if not self._is_current(name, today)]
+        return [name for name in missing if self._may_attempt(name)]
+
+    def _is_current(self, name, today):
+        """Caller holds self._lock."""
+        entry = self._values.get(name)
+        return entry is not None and entry[2] == today
+
+    def _may_attempt(self, name):
+        failure = self._failures.get(name)
+        return failure is None or time.monotonic() >= failure[1]
+
+    def _refresh(self, names, today):
+        """Recomputes the given sections and persists the snapshot (caller holds self._refresh_lock)."""
+        started = time.perf_counter()
+        for name in names:
+            compute, _ = self.sections[name]
+            try:
+                value = compute()
+                with self._lock:
+                    self._values[name] = (value, time.time(), today)
+                self._failures.pop(name, None)
+            except Exception as e:
+                # Keep serving the previous value of this section; retry after a growing delay
+                failures = self._failures.get(name, (0, 0.0))[0] + 1
+                delay = min(self.retry_seconds * 2 ** (failures - 1), self.max_retry_seconds)
+                self._failures[name] = (failures, time.monotonic() + delay)
+                print(f"⚠️ Snapshot section '{self.name}.{name}' failed ({failures}x, retry in {delay:.0f}s): {e}")
+        self.refresh_count += 1
+        self.last_refresh_seconds = round(time.perf_counter() - started, 3)
+        self._write_to_disk()
+
+    # ----------------------------------------------------------------------------------
+    # Persistence
+    # ----------------------------------------------------------------------------------
+
+    def _load_from_disk(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if self._loaded_mtime is not None and mtime <= self._loaded_mtime:
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                values = pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError):
+            return
+        with self._lock:
+            for name, entry in values.items():
+                if len(entry) != 3:
+                    continue  # written by an older version, without its day
+                current = self._values.get(name)
+                if current is None or entry[1] > current[1]:
+                    self._values[name] = entry
+            self._loaded_mtime = mtime
+
+    def _write_to_disk(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with self._lock:
+                values = dict(self._values)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(values, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self._loaded_mtime = os.path.getmtime(self.path)
+        except OSError as e:
+            print(f"⚠️ Snapshot '{self.name}' write error: {e}")
+
+    def _acquire_process_lock(self, wait_seconds=0):
+        """
+        Returns an open lock file, None if locking is unavailable, or False if another process
+        still holds it after wait_seconds.
+        """
+        if fcntl is None:
+            return None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            lock_file = open(self.lock_path, 'w')
+        except OSError:
+            return None
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return lock_file
+            except OSError:
+                if time.monotonic() >= deadline:
+                    lock_file.close()
+                    return False
+                time.sleep(0.1)
+
+    @staticmethod
+    def _release_process_lock(lock_file):
+        if lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
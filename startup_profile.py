@@ -0,0 +1,229 @@
+"""
+Startup Profile
+Import-time and cold-start report for the app process, in the spirit of `python -X importtime`.
+
+app.py calls begin() before anything else and mark(phase) after each startup step (imports,
+.env, Flask app, ...); finish() closes the profile once the module is imported. Phase times are
+always recorded (a few clock reads), so snapshot() can report the cold start of every process.
+With STARTUP_PROFILE=true every module imported during startup is timed as well (self and
+cumulative time, like -X importtime) and the report is written to stderr - never stdout, which
+is the response body under run.cgi.
+
+    python startup_profile.py [--runs 5] [--top 20]
+
+imports app in fresh interpreters and prints the median cold start, phases and slowest modules,
+so the import path can be compared before and after a change.
+"""
+
+import builtins
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+ENABLED = os.environ.get('STARTUP_PROFILE', 'false').lower() == 'true'
+
+
+class StartupProfile:
+    """Named startup phases plus optional per-module import timings of one thread."""
+
+    def __init__(self, trace_imports=False):
+        self.trace_imports = trace_imports
+        self.started = time.perf_counter()
+        self.finished = None
+        self.phases = []  # (name, seconds)
+        self.imports = {}  # module -> (self seconds, cumulative seconds, nesting level)
+        self._last_mark = self.started
+        self._thread = threading.get_ident()
+        self._stack = []  # child-time accumulators of the imports in progress
+        self._original_import = None
+
+    # ----------------------------------------------------------------------------------
+    # Public API
+    # ----------------------------------------------------------------------------------
+
+    def start(self):
+        if self.trace_imports and self._original_import is None:
+            self._original_import = builtins.__import__
+            builtins.__import__ = self._timed_import
+
+    def mark(self, phase):
+        """Records the time since the previous mark as `phase`."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last_mark))
+        self._last_mark = now
+
+    def finish(self):
+        if self.finished is not None:
+            return
+        self.finished = time.perf_counter()
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    @property
+    def total(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def snapshot(self, top=None):
+        """Phases and (slowest first) module imports as plain data."""
+        imports = sorted(self.imports.items(), key=lambda item: item[1][1], reverse=True)
+        if top is not None:
+            imports = imports[:top]
+        return {
+            'pid': os.getpid(),
+            'total_seconds': round(self.total, 6),
+            'phases': [{'name': name, 'seconds': round(seconds, 6)} for name, seconds in self.phases],
+            'imports': [{'module': module, 'self_seconds': round(own, 6),
+                         'cumulative_seconds': round(cumulative, 6), 'level': level}
+                        for module, (own, cumulative, level) in imports],
+        }
+
+    def report(self, top=20):
+        """Human-readable report: phases in order, then the slowest imports."""
+        lines = [f"⏱️ Startup took {self.total * 1000:.1f} ms (pid {os.getpid()})"]
+        for name, seconds in self.phases:
+            lines.append(f"   {seconds * 1000:9.1f} ms  {name}")
+        if self.imports:
+            lines.append("   import time:      self [ms] | cumulative [ms] | module")
+            for entry in self.snapshot(top)['imports']:
+                lines.append(f"   import time: {entry['self_seconds'] * 1000:9.1f} | "
+                             f"{entry['cumulative_seconds'] * 1000:15.1f} | "
+                             f"{'  ' * entry['level']}{entry['module']}")
+        return '\n'.join(lines)
+
+    # ----------------------------------------------------------------------------------
+    # Internals
+    # ----------------------------------------------------------------------------------
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # Only first imports on the importing thread are timed; cached modules cost nothing
+        if (level != 0 or name in sys.modules or self.finished is not None
+                or threading.get_ident() != self._thread):
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        depth = len(self._stack)
+        self._stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            cumulative = time.perf_counter() - started
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += cumulative
+            self.imports.setdefault(name, (cumulative - children, cumulative, depth))
+
+
+_profile = None
+
+
+def begin():
+    """Starts the process-wide profile (once)."""
+    global _profile
+    if _profile is None:
+        _profile = StartupProfile(trace_imports=ENABLED)
+        _profile.start()
+    return _profile
+
+
+def mark(phase):
+    if _profile is not None:
+        _profile.mark(phase)
+
+
+def finish():
+    """Ends the profile; with STARTUP_PROFILE=true the report goes to stderr."""
+    if _profile is None or _profile.finished is not None:
+        return
+    _profile.finish()
+    if ENABLED:
+        print(_profile.report(), file=sys.stderr)
+
+
+def snapshot(top=None):
+    """snapshot() of the process-wide profile, or None if begin() was never called."""
+    return _profile.snapshot(top) if _profile is not None else None
+
+
+# --------------------------------------------------------------------------------------
+# Command line: repeated cold starts
+# --------------------------------------------------------------------------------------
+
+_CHILD_CODE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+import startup_profile
+data = startup_profile.snapshot()
+data['import_app_seconds'] = time.perf_counter() - started
+with open(sys.argv[1], 'w') as f:
+    json.dump(data, f)
+"""
+
+
+def measure_cold_starts(runs=5, module_dir=None):
+    """Imports app in `runs` fresh interpreters; returns one snapshot per run (plus wall time)."""
+    module_dir = module_dir or os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, STARTUP_PROFILE='true')
+    results = []
+    for _ in range(runs):
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+            output = f.name
+        try:
+            started = time.perf_counter()
+            subprocess.run([sys.executable, '-c', _CHILD_CODE, output], cwd=module_dir, env=env,
+                           check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            wall = time.perf_counter() - started
+            with open(output) as f:
+                data = json.load(f)
+            data['wall_seconds'] = wall
+            results.append(data)
+        finally:
+            os.unlink(output)
+    return results
+
+
+def _median_ms(values):
+    return statistics.median(values) * 1000 if values else 0.0
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Cold-start profile of the app (import app in fresh interpreters).')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    results = measure_cold_starts(args.runs)
+    print(f"⏱️ Cold start over {len(results)} runs (median): "
+          f"process {_median_ms([r['wall_seconds'] for r in results]):.1f} ms, "
+          f"import app {_median_ms([r['import_app_seconds'] for r in results]):.1f} ms")
+
+    phase_names = [phase['name'] for phase in results[0]['phases']]
+    for name in phase_names:
+        values = [phase['seconds'] for r in results for phase in r['phases'] if phase['name'] == name]
+        print(f"   {_median_ms(values):9.1f} ms  {name}")
+
+    by_module = {}
+    for r in results:
+        for entry in r['imports']:
+            by_module.setdefault(entry['module'], []).append(entry)
+    slowest = sorted(by_module.items(),
+                     key=lambda item: statistics.median(e['cumulative_seconds'] for e in item[1]),
+                     reverse=True)[:args.top]
+    print("   import time:      self [ms] | cumulative [ms] | module")
+    for module, entries in slowest:
+        print(f"   import time: {_median_ms([e['self_seconds'] for e in entries]):9.1f} | "
+              f"{_median_ms([e['cumulative_seconds'] for e in entries]):15.1f} | "
+              f"{'  ' * entries[0]['level']}{module}")
+
+
+if __name__ == '__main__':
+    main()
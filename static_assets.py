@@ -0,0 +1,190 @@
+"""
+Static Assets
+Content-hashed (fingerprinted) static files with far-future caching.
+
+Run `python static_assets.py` at deploy time. It copies every file under static/ to
+static/build/<path>.<hash><ext>, writes pre-compressed .gz (and .br when the brotli package is
+installed) variants of text assets, and records original -> fingerprinted names in
+static/build/manifest.json. An .htaccess is written next to the files so Apache (run.cgi
+deployment, where existing files never reach the app) serves them with the same headers.
+
+At runtime StaticAssets rewrites url_for('static', filename=...) through the manifest and serves
+build/ files with 'Cache-Control: public, max-age=31536000, immutable', choosing the pre-compressed
+variant the client accepts. A changed file gets a new name, so browsers never revalidate. Without
+a manifest (development, or before the first build) URLs and caching stay as they are.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+
+BUILD_DIR_NAME = 'build'
+MANIFEST_NAME = 'manifest.json'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Extensions worth pre-compressing (images are already compressed)
+COMPRESSIBLE_EXTENSIONS = frozenset({'.css', '.js', '.svg', '.json', '.txt', '.html', '.xml', '.map'})
+COMPRESS_MIN_SIZE = 256
+
+_HTACCESS = """# Generated by static_assets.py - fingerprinted files never change
+<IfModule mod_headers.c>
+    Header set Cache-Control "{cache_control}"
+</IfModule>
+<IfModule mod_rewrite.c>
+    RewriteEngine On
+    RewriteCond %{{HTTP:Accept-Encoding}} br
+    RewriteCond %{{REQUEST_FILENAME}}.br -f
+    RewriteRule ^(.+)$ $1.br [L]
+    RewriteCond %{{HTTP:Accept-Encoding}} gzip
+    RewriteCond %{{REQUEST_FILENAME}}.gz -f
+    RewriteRule ^(.+)$ $1.gz [L]
+</IfModule>
+RemoveType .gz .br
+AddEncoding gzip .gz
+AddEncoding br .br
+<FilesMatch "\\.css\\.(gz|br)$">
+    ForceType text/css
+</FilesMatch>
+<FilesMatch "\\.js\\.(gz|br)$">
+    ForceType application/javascript
+</FilesMatch>
+<FilesMatch "\\.svg\\.(gz|br)$">
+    ForceType image/svg+xml
+</FilesMatch>
+<IfModule mod_headers.c>
+    <FilesMatch "\\.(gz|br)$">
+        Header append Vary Accept-Encoding
+    </FilesMatch>
+</IfModule>
+"""
+
+
+def fingerprinted_name(path, content):
+    """'css/style.css' -> 'css/style.<12 hex digits>.css'."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+
+def build(static_folder):
+    """Rebuilds static/build from static/. Returns the manifest."""
+    build_dir = os.path.join(static_folder, BUILD_DIR_NAME)
+    if os.path.isdir(build_dir):
+        shutil.rmtree(build_dir)
+    os.makedirs(build_dir)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        if os.path.abspath(root) == os.path.abspath(static_folder) and BUILD_DIR_NAME in dirs:
+            dirs.remove(BUILD_DIR_NAME)
+        for filename in sorted(files):
+            if filename.startswith('.'):
+                continue
+            source = os.path.join(root, filename)
+            path = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                content = f.read()
+
+            target_name = fingerprinted_name(path, content)
+            target = os.path.join(build_dir, target_name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(content)
+
+            if os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS and len(content) >= COMPRESS_MIN_SIZE:
+                with open(f"{target}.gz", 'wb') as f:
+                    f.write(gzip.compress(content, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    with open(f"{target}.br", 'wb') as f:
+                        f.write(brotli.compress(content, quality=11))
+            manifest[path] = target_name
+
+    with open(os.path.join(build_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    with open(os.path.join(build_dir, '.htaccess'), 'w') as f:
+        f.write(_HTACCESS.format(cache_control=IMMUTABLE_CACHE_CONTROL))
+    return manifest
+
+
+class StaticAssets:
+    """Serves fingerprinted static files built by build()."""
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.build_dir = None
+        self.served = 0
+        self.served_precompressed = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from flask import request, send_from_directory
+
+        self.build_dir = os.path.join(app.static_folder, BUILD_DIR_NAME)
+        self.reload()
+
+        @app.url_defaults
+        def fingerprint_static_urls(endpoint, values):
+            if endpoint == 'static' and 'filename' in values:
+                built = self.manifest.get(values['filename'])
+                if built is not None:
+                    values['filename'] = f"{BUILD_DIR_NAME}/{built}"
+
+        def serve_built_asset(filename):
+            accepted = {part.split(';')[0].strip().lower()
+                        for part in request.headers.get('Accept-Encoding', '').split(',')
+                        if not part.replace(' ', '').endswith(('q=0', 'q=0.0'))}
+            variant, encoding = filename, None
+            for candidate, name in (('br', 'br'), ('gz', 'gzip')):
+                if name in accepted and os.path.isfile(os.path.join(self.build_dir, f"{filename}.{candidate}")):
+                    variant, encoding = f"{filename}.{candidate}", name
+                    break
+
+            response = send_from_directory(self.build_dir, variant, max_age=31536000,
+                                           mimetype=mimetypes.guess_type(filename)[0])
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+            response.vary.add('Accept-Encoding')
+            if encoding is not None:
+                response.headers['Content-Encoding'] = encoding
+                self.served_precompressed += 1
+            self.served += 1
+            return response
+
+        # More specific than the /static/<path:filename> rule, so it takes precedence
+        app.add_url_rule(f"{app.static_url_path}/{BUILD_DIR_NAME}/<path:filename>",
+                         'static_build', serve_built_asset)
+
+    def reload(self):
+        """(Re)reads the manifest; an absent manifest leaves static URLs untouched."""
+        try:
+            with open(os.path.join(self.build_dir, MANIFEST_NAME)) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Static asset manifest unreadable, serving unversioned files: {e}")
+            self.manifest = {}
+
+    def stats(self):
+        """Cheap counters for monitoring."""
+        return {
+            'fingerprinted_files': len(self.manifest),
+            'brotli': brotli is not None,
+            'served': self.served,
+            'served_precompressed': self.served_precompressed,
+        }
+
+
+if __name__ == '__main__':
+    static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    built = build(static_folder)
+    print(f"✅ {len(built)} static files fingerprinted into {os.path.join(static_folder, BUILD_DIR_NAME)}"
+          f"{'' if brotli is not None else ' (install brotli for .br variants)'}")
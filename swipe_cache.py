@@ -0,0 +1,298 @@
+"""
+Swipe Cache
+Process-level, time-windowed cache of raw acc_transaction rows shared by the attendance views.
+
+Rows are stored column-wise per day and grouped by month. Today's rows are topped up
+incrementally from the create_time watermark minus an overlap window, deduplicated by id, so
+swipes that offline readers upload later with their original timestamps are still picked up.
+A past day is reloaded in full once before it is marked complete; after that it never changes.
+Months that fall out of the window, or the least recently used months once the row cap is
+exceeded, are evicted.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+
+# Column order of every row returned by the cache and expected from the fetch callable
+SWIPE_COLUMNS = ('id', 'card_no', 'name', 'last_name', 'create_time', 'reader_name')
+
+
+class _DayColumns:
+    """Column-wise storage for one day of swipes."""
+
+    __slots__ = ('ids', 'card_nos', 'names', 'last_names', 'create_times', 'reader_names',
+                 'complete', 'watermark', 'seen_ids', 'refreshed_at')
+
+    def __init__(self):
+        self.ids = []
+        self.card_nos = []
+        self.names = []
+        self.last_names = []
+        self.create_times = []
+        self.reader_names = []
+        self.complete = False
+        self.watermark = None
+        self.seen_ids = set()
+        self.refreshed_at = 0.0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, row):
+        """Adds a row unless its id is already stored; returns True if it was older than the watermark."""
+        row_id, card_no, name, last_name, create_time, reader_name = row
+        if create_time is None or row_id in self.seen_ids:
+            return False
+        self.seen_ids.add(row_id)
+        self.ids.append(row_id)
+        self.card_nos.append(card_no)
+        self.names.append(name)
+        self.last_names.append(last_name)
+        self.create_times.append(create_time)
+        self.reader_names.append(reader_name)
+        if self.watermark is None or create_time >= self.watermark:
+            self.watermark = create_time
+            return False
+        return True
+
+    def merge(self, rows):
+        """Appends new rows, keeping create_time order when late uploads arrive out of order."""
+        out_of_order = False
+        for row in rows:
+            out_of_order = self.append(row) or out_of_order
+        if out_of_order:
+            order = sorted(range(len(self.ids)), key=self.create_times.__getitem__)
+            for column in ('ids', 'card_nos', 'names', 'last_names', 'create_times', 'reader_names'):
+                values = getattr(self, column)
+                setattr(self, column, [values[i] for i in order])
+
+    def rows(self, start_dt=None, end_dt=None):
+        for row in zip(self.ids, self.card_nos, self.names, self.last_names,
+                       self.create_times, self.reader_names):
+            if start_dt is not None and row[4] < start_dt:
+                continue
+            if end_dt is not None and row[4] > end_dt:
+                continue
+            yield row
+
+
+class SwipeCache:
+    """
+    Caches swipes for the last `window_months` months (current month included).
+
+    fetch_rows(since, until) must return rows in SWIPE_COLUMNS order with
+    since <= create_time <= until, ordered by create_time.
+    """
+
+    def __init__(self, fetch_rows, clock, window_months=2, max_rows=500000, refresh_seconds=15,
+                 overlap_minutes=30):
+        self.fetch_rows = fetch_rows
+        self.clock = clock
+        self.window_months = window_months
+        self.max_rows = max_rows
+        self.refresh_seconds = refresh_seconds
+        self.overlap = timedelta(minutes=overlap_minutes)
+        self._months = OrderedDict()  # (year, month) -> {date: _DayColumns}, LRU order
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rows_loaded = 0
+
+    # ----------------------------------------------------------------------------------
+    # Window helpers
+    # ----------------------------------------------------------------------------------
+
+    def window_start(self):
+        """First day covered by the cache window."""
+        month_start = self.clock().date().replace(day=1)
+        for _ in range(self.window_months - 1):
+            month_start = (month_start - timedelta(days=1)).replace(day=1)
+        return month_start
+
+    def covers(self, start_dt, end_dt):
+        """True if the whole [start_dt, end_dt] range is served from the cache."""
+        if self.window_months <= 0 or start_dt is None or end_dt is None:
+            return False
+        return start_dt.date() >= self.window_start() and start_dt <= end_dt
+
+    # ----------------------------------------------------------------------------------
+    # Public API
+    # ----------------------------------------------------------------------------------
+
+    def get_rows(self, start_dt, end_dt):
+        """Returns the swipe rows in [start_dt, end_dt] ordered by create_time."""
+        today = self.clock().date()
+        last_day = min(end_dt.date(), today)
+        days = []
+        day = start_dt.date()
+        while day <= last_day:
+            days.append(day)
+            day += timedelta(days=1)
+
+        missing, stale = [], []
+        now = time.monotonic()
+        with self._lock:
+            self._evict_outside_window()
+            for day in days:
+                entry = self._get_day(day)
+                if entry is None:
+                    missing.append(day)
+                elif not entry.complete and (day < today or now - entry.refreshed_at >= self.refresh_seconds):
+                    stale.append(day)
+                else:
+                    self._touch(day)
+
+        if missing or stale:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        if missing:
+            self._load_days(missing, today)
+        for day in stale:
+            self._refresh_day(day, today)
+
+        result = []
+        with self._lock:
+            for day in days:
+                entry = self._get_day(day)
+                if entry is not None:
+                    result.extend(entry.rows(start_dt, end_dt))
+            self._enforce_row_cap()
+        return result
+
+    def invalidate(self, start_date=None, end_date=None):
+        """Drops cached days in [start_date, end_date] (everything if no range is given)."""
+        with self._lock:
+            if start_date is None and end_date is None:
+                self._months.clear()
+                return
+            for month_key in list(self._months):
+                days = self._months[month_key]
+                for day in list(days):
+                    if (start_date is None or day >= start_date) and (end_date is None or day <= end_date):
+                        del days[day]
+                if not days:
+                    del self._months[month_key]
+
+    def stats(self):
+        """Cheap counters for monitoring."""
+        now = self.clock()
+        with self._lock:
+            today = self._get_day(now.date())
+            watermark = today.watermark if today is not None else None
+            return {
+                'today_watermark': watermark,
+                # Wall time since the newest cached swipe: grows in quiet hours too, so it is not a lag
+                'seconds_since_last_swipe': (now - watermark).total_seconds() if watermark is not None else None,
+                'today_refresh_age_seconds': (time.monotonic() - today.refreshed_at
+                                              if today is not None and today.refreshed_at else None),
+                'months': [f"{year}-{month:02d}" for year, month in self._months],
+                'days': sum(len(days) for days in self._months.values()),
+                'rows': self._row_count(),
+                'max_rows': self.max_rows,
+                'hits': self.hits,
+                'misses': self.misses,
+                'rows_loaded': self.rows_loaded,
+            }
+
+    # ----------------------------------------------------------------------------------
+    # Loading
+    # ----------------------------------------------------------------------------------
+
+    def _load_days(self, missing, today):
+        # One query per contiguous run of missing days
+        runs = []
+        for day in missing:
+            if runs and day - runs[-1][1] == timedelta(days=1):
+                runs[-1][1] = day
+            else:
+                runs.append([day, day])
+
+        for first_day, last_day in runs:
+            since = datetime.combine(first_day, datetime.min.time())
+            until = datetime.combine(last_day, datetime.max.time())
+            rows = self.fetch_rows(since, until)
+            self.rows_loaded += len(rows)
+
+            loaded = {}
+            day = first_day
+            while day <= last_day:
+                loaded[day] = _DayColumns()
+                day += timedelta(days=1)
+            for row in rows:
+                create_time = row[4]
+                if create_time is not None and create_time.date() in loaded:
+                    loaded[create_time.date()].merge((row,))
+
+            refreshed_at = time.monotonic()
+            with self._lock:
+                for day, entry in loaded.items():
+                    entry.complete = day < today
+                    entry.refreshed_at = refreshed_at
+                    if self._get_day(day) is None:
+                        self._months.setdefault((day.year, day.month), {})[day] = entry
+                    self._touch(day)
+
+    def _refresh_day(self, day, today):
+        day_start = datetime.combine(day, datetime.min.time())
+        if day < today:
+            # The day is over: reload it in full before marking it complete, so swipes uploaded
+            # late by offline readers (older than any overlap window) are not lost
+            rows = self.fetch_rows(day_start, datetime.combine(day, datetime.max.time()))
+            self.rows_loaded += len(rows)
+            entry = _DayColumns()
+            entry.merge(rows)
+            entry.complete = True
+            entry.refreshed_at = time.monotonic()
+            with self._lock:
+                if self._get_day(day) is not None:
+                    self._months[(day.year, day.month)][day] = entry
+                    self._touch(day)
+            return
+
+        with self._lock:
+            entry = self._get_day(day)
+            if entry is None:
+                return
+            since = max(entry.watermark - self.overlap, day_start) if entry.watermark else day_start
+
+        rows = self.fetch_rows(since, datetime.combine(day, datetime.max.time()))
+        self.rows_loaded += len(rows)
+
+        with self._lock:
+            entry = self._get_day(day)
+            if entry is None:
+                return
+            entry.merge(rows)
+            entry.refreshed_at = time.monotonic()
+            self._touch(day)
+
+    # ----------------------------------------------------------------------------------
+    # Bookkeeping (callers hold self._lock)
+    # ----------------------------------------------------------------------------------
+
+    def _get_day(self, day):
+        days = self._months.get((day.year, day.month))
+        return days.get(day) if days else None
+
+    def _touch(self, day):
+        month_key = (day.year, day.month)
+        if month_key in self._months:
+            self._months.move_to_end(month_key)
+
+    def _row_count(self):
+        return sum(len(entry) for days in self._months.values() for entry in days.values())
+
+    def _evict_outside_window(self):
+        window_start = self.window_start()
+        for month_key in list(self._months):
+            if month_key < (window_start.year, window_start.month):
+                del self._months[month_key]
+
+    def _enforce_row_cap(self):
+        while len(self._months) > 1 and self._row_count() > self.max_rows:
+            self._months.popitem(last=False)
@@ -0,0 +1,496 @@
+"""
+Swipe Generator
+Seeded synthetic turnstile swipes that behave like the campus, for capacity tests and benchmarks.
+
+Every person gets a role from their position (staff, teacher, student, visitor) and a home
+building: the readers of TURNSTILE_CONFIG grouped by building ('Building A-1-In' ->
+'Building A'). Per day a present person produces:
+
+  - an arrival around the role's arrival time: one peak for staff, the class waves for students,
+  - a lunch exit and return for some,
+  - sometimes a swipe in another building during the day,
+  - a departure, unless the exit is missing (tailgating, a broken reader),
+  - duplicates of some swipes a few seconds later (double taps).
+
+Card reassignment moves a card between persons: before the reassignment day person A swipes with
+the card person B holds now (and B with a retired card), as when a returned card is handed out
+again. Joining acc_transaction to pers_card on card_no then shows A's old swipes as B's, exactly
+as in production.
+
+Rates and times come from DEFAULT_PROFILE; a JSON file (--profile) or --set key=value overrides
+them. The same seed, profile and persons always give the same rows.
+
+    python swipe_generator.py --persons 5000 --days 30 --format csv --output swipes.csv
+    python swipe_generator.py --days 7 --format parquet --output swipes.parquet --seed 7
+    python swipe_generator.py --days 1 --end 2024-06-14 --format copy --database hr_staging \\
+        --set double_tap=0.1 --set roles.student.presence=0.6
+
+'copy' appends to acc_transaction of the given database (BENCH_DB_* connection settings, as in
+benchmark.py) for the persons and cards already in it; csv and parquet write synthetic persons
+(and --persons-output their pers_person/pers_card rows). Parquet needs pyarrow.
+"""
+
+import copy as copy_module
+import csv
+import io
+import json
+import os
+import random
+import re
+import sys
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional dependency
+    pyarrow = None
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+COLUMNS = ('card_no', 'pin', 'name', 'last_name', 'create_time', 'reader_name', 'event_name')
+EVENT_NAME = 'Normal Verify Open'
+COPY_BATCH_ROWS = 200000
+
+# Times are 'HH:MM', deviations (_sd) minutes, everything else a probability per person and day
+DEFAULT_PROFILE = {
+    'roles': {
+        'staff': {'presence': 0.92, 'weekend_presence': 0.04, 'arrival': ['08:50'], 'arrival_sd': 20,
+                  'departure': '18:05', 'departure_sd': 35, 'lunch_exit': 0.45},
+        'teacher': {'presence': 0.85, 'weekend_presence': 0.03, 'arrival': ['08:40', '10:20', '12:00'],
+                    'arrival_sd': 15, 'departure': '16:30', 'departure_sd': 80, 'lunch_exit': 0.3},
+        'student': {'presence': 0.8, 'weekend_presence': 0.05, 'arrival': ['08:30', '10:10', '11:50'],
+                    'arrival_sd': 12, 'departure': '15:30', 'departure_sd': 90, 'lunch_exit': 0.5},
+        'visitor': {'presence': 0.02, 'weekend_presence': 0.005, 'arrival': ['11:00'], 'arrival_sd': 120,
+                    'departure': '13:00', 'departure_sd': 120, 'lunch_exit': 0.0},
+    },
+    'lunch': '13:00',
+    'lunch_sd': 25,
+    'lunch_minutes': 45,
+    'lunch_minutes_sd': 15,
+    'building_hop': 0.1,
+    'double_tap': 0.03,
+    'missing_exit': 0.06,
+    'missing_entry': 0.01,
+    'card_reassign': 0.01,
+}
+
+# Person mix of the campus for synthetic persons: (position, department, share of persons)
+PERSON_MIX = (
+    ('Mühasib', 'Administration', 0.04),
+    ('HR Mütəxəssisi', 'Administration', 0.03),
+    ('IT Mütəxəssisi', 'IT', 0.04),
+    ('Menecer', 'Administration', 0.05),
+    ('Təmizlik işçisi', 'Operations', 0.06),
+    ('Mühafizə', 'Security', 0.05),
+    ('Laborant', 'Faculty', 0.05),
+    ('Müəllim', 'Faculty', 0.13),
+    ('Müəllim', 'School', 0.05),
+    ('Tərbiyəçi', 'School', 0.05),
+    ('STUDENT', 'Faculty', 0.40),
+    ('VISITOR', None, 0.03),
+    (None, None, 0.02),
+)
+
+MALE_FIRST_NAMES = (
+    'Elvin', 'Rəşad', 'Tural', 'Orxan', 'Kamran', 'Fərid', 'Rauf', 'Elnur', 'Vüsal', 'Ramil',
+    'Emil', 'Murad', 'Anar', 'Cavid', 'Samir', 'Nicat', 'Rüstəm', 'Ceyhun', 'Elçin', 'Kənan',
+)
+FEMALE_FIRST_NAMES = (
+    'Aysel', 'Leyla', 'Günay', 'Nigar', 'Səbinə', 'Aynur', 'Könül', 'Nərmin', 'Lalə', 'Sevinc',
+    'Ülviyyə', 'Xədicə', 'Şəbnəm', 'Gülnar', 'Aytən', 'Fidan', 'Zəhra', 'İlahə', 'Təranə', 'Jalə',
+)
+LAST_NAMES = (
+    'Əliyev', 'Məmmədov', 'Həsənov', 'Hüseynov', 'Quliyev', 'İsmayılov', 'Abbasov', 'Rzayev',
+    'Babayev', 'Cəfərov', 'Nəsibov', 'Kərimov', 'Orucov', 'Səfərov', 'Vəliyev', 'Zeynalov',
+    'Rəhimov', 'Mustafayev', 'Əhmədov', 'Qasımov', 'Bayramov', 'Nağıyev', 'Salmanov', 'Tağıyev',
+    'Yusifov', 'Əsgərov', 'Şükürov', 'Paşayev', 'Novruzov', 'Sultanov',
+)
+
+_READER_BUILDING = re.compile(r'^(.*?)-\d+(?:-.*)?$')
+
+
+# --------------------------------------------------------------------------------------
+# Profile, readers and persons
+# --------------------------------------------------------------------------------------
+
+def load_profile(path=None, overrides=()):
+    """DEFAULT_PROFILE merged with a JSON file and 'dotted.key=value' overrides (values parsed as JSON)."""
+    profile = copy_module.deepcopy(DEFAULT_PROFILE)
+
+    def merge(target, source):
+        for key, value in source.items():
+            if isinstance(value, dict) and isinstance(target.get(key), dict):
+                merge(target[key], value)
+            else:
+                target[key] = value
+
+    if path:
+        with open(path, encoding='utf-8') as f:
+            merge(profile, json.load(f))
+    for override in overrides:
+        key, sep, raw = override.partition('=')
+        if not sep:
+            raise ValueError(f"override must be key=value, not {override!r}")
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw
+        *parents, leaf = key.strip().split('.')
+        target = profile
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[leaf] = value
+    return profile
+
+
+def turnstile_readers():
+    """(IN readers, OUT readers) of app.TURNSTILE_CONFIG, read from the source without importing app."""
+    import ast
+
+    with open(os.path.join(BASE_DIR, 'app.py'), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, 'id', None) == 'TURNSTILE_CONFIG' for t in node.targets):
+            config = ast.literal_eval(node.value)
+            return tuple(config['IN']), tuple(config['OUT'])
+    raise RuntimeError('TURNSTILE_CONFIG not found in app.py')
+
+
+def buildings(readers_in, readers_out):
+    """{building: (IN readers, OUT readers)} for buildings that have both."""
+    grouped = {}
+    for direction, readers in ((0, readers_in), (1, readers_out)):
+        for reader in readers:
+            match = _READER_BUILDING.match(reader)
+            building = match.group(1) if match else reader
+            grouped.setdefault(building, ([], []))[direction].append(reader)
+    return {building: (tuple(ins), tuple(outs)) for building, (ins, outs) in sorted(grouped.items())
+            if ins and outs}
+
+
+def role_of(position):
+    name = (position or '').strip().upper()
+    if name == 'STUDENT':
+        return 'student'
+    if name == 'VISITOR':
+        return 'visitor'
+    if name in ('MÜƏLLIM', 'MÜƏLLİM', 'TƏRBIYƏÇI', 'TƏRBİYƏÇİ'):
+        return 'teacher'
+    return 'staff'
+
+
+def _feminine(last_name):
+    """Əliyev -> Əliyeva, Məmmədov -> Məmmədova."""
+    return last_name + 'a'
+
+
+def synthetic_persons(count, rng):
+    """
+    Persons with unique names, positions by PERSON_MIX and one unique card each, plus the
+    {position: id} and {department: id} maps for pers_position and auth_department.
+    """
+    positions = sorted({position for position, _, _ in PERSON_MIX if position})
+    departments = sorted({department for _, department, _ in PERSON_MIX if department})
+    position_ids = {name: str(i + 1) for i, name in enumerate(positions)}
+    department_ids = {name: str(i + 1) for i, name in enumerate(departments)}
+
+    names = [(first, last, False) for first in MALE_FIRST_NAMES for last in LAST_NAMES]
+    names += [(first, last, True) for first in FEMALE_FIRST_NAMES for last in LAST_NAMES]
+    rng.shuffle(names)
+    weights = [share for _, _, share in PERSON_MIX]
+    persons = []
+    for i in range(count):
+        first, last, female = names[i % len(names)]
+        if i >= len(names):  # double-barrelled surnames keep names unique at large scales
+            last = f"{last}-{LAST_NAMES[(i // len(names) - 1) % len(LAST_NAMES)]}"
+        if female:
+            last = '-'.join(_feminine(part) for part in last.split('-'))
+        position, department, _ = rng.choices(PERSON_MIX, weights)[0]
+        pin = str(100000 + i)
+        persons.append({
+            'id': str(i + 1),
+            'pin': pin,
+            'name': first,
+            'last_name': last,
+            'position': position,
+            'position_id': position_ids.get(position),
+            'auth_dept_id': department_ids.get(department),
+            'photo_path': f"upload/pers/user/avatar/{pin}.jpg" if rng.random() < 0.7 else None,
+            'birthday': date(1960, 1, 1) + timedelta(days=rng.randrange(0, 16000)),
+            'email': f"{pin}@example.edu.az" if rng.random() < 0.8 else None,
+            'mobile_phone': f"+99450{rng.randrange(1000000, 9999999)}" if rng.random() < 0.6 else None,
+            'create_time': datetime(2019, 9, 1) + timedelta(days=rng.randrange(0, 1700)),
+            'card_no': str(1000000000 + i * 40000 + rng.randrange(0, 40000)),  # unique per person
+        })
+    return persons, position_ids, department_ids
+
+
+# --------------------------------------------------------------------------------------
+# Generator
+# --------------------------------------------------------------------------------------
+
+def _minutes(hhmm):
+    hours, minutes = str(hhmm).split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+class SwipeGenerator:
+    """Deterministic swipes of `persons` (dicts with pin, name, last_name, card_no, position)."""
+
+    def __init__(self, persons, readers_in, readers_out, profile=None, seed=0):
+        self.profile = profile or load_profile()
+        self.seed = seed
+        self.buildings = buildings(readers_in, readers_out)
+        if not self.buildings:
+            raise ValueError('no building has both IN and OUT readers')
+        self.persons = list(persons)
+        self.reassignments = []  # (day, previous holder pin, current holder pin, card_no, retired card_no)
+        self.rows = 0
+
+    def swipes(self, first_day, last_day):
+        """Yields rows in COLUMNS order, day by day; within a day ordered by person, then time."""
+        rng = random.Random(self.seed)
+        profile = self.profile
+        roles = {name: dict(role, arrival=[_minutes(t) for t in role['arrival']],
+                            departure=_minutes(role['departure']))
+                 for name, role in profile['roles'].items()}
+        building_names = list(self.buildings)
+        people = []
+        for person in self.persons:
+            role = role_of(person.get('position'))
+            people.append([person, roles.get(role, roles['staff']), rng.choice(building_names), person['card_no']])
+        self._plan_reassignments(people, first_day, last_day, rng)
+
+        lunch, lunch_sd = _minutes(profile['lunch']), profile['lunch_sd']
+        lunch_minutes, lunch_minutes_sd = profile['lunch_minutes'], profile['lunch_minutes_sd']
+        hop, double_tap = profile['building_hop'], profile['double_tap']
+        missing_exit, missing_entry = profile['missing_exit'], profile['missing_entry']
+        changes = {}
+        cards_before = {}  # pin -> card used until the reassignment day
+        for day, previous_pin, current_pin, card_no, retired in self.reassignments:
+            changes.setdefault(day, []).extend((previous_pin, current_pin))
+            cards_before[previous_pin] = card_no
+            cards_before[current_pin] = retired
+
+        day = first_day
+        while day <= last_day:
+            weekday = day.weekday() < 5
+            day_start = datetime.combine(day, dt_time())
+            for pin in changes.get(day, ()):
+                cards_before.pop(pin, None)
+            for person, role, home, card_no in people:
+                if rng.random() >= (role['presence'] if weekday else role['weekend_presence']):
+                    continue
+                card_no = cards_before.get(person['pin'], card_no)
+                readers_in, readers_out = self.buildings[home]
+                arrival = rng.choice(role['arrival']) + rng.gauss(0, role['arrival_sd'])
+                arrival = min(max(arrival, 330), 1320)
+                departure = min(max(role['departure'] + rng.gauss(0, role['departure_sd']), arrival + 15), 1435)
+                events = []
+                if rng.random() >= missing_entry:
+                    events.append((arrival, rng.choice(readers_in)))
+                if rng.random() < role['lunch_exit']:
+                    out = lunch + rng.gauss(0, lunch_sd)
+                    back = out + max(10, rng.gauss(lunch_minutes, lunch_minutes_sd))
+                    if arrival < out and back < departure:
+                        events.append((out, rng.choice(readers_out)))
+                        events.append((back, rng.choice(readers_in)))
+                if rng.random() < hop:
+                    other_in, other_out = self.buildings[rng.choice(building_names)]
+                    at = rng.uniform(arrival, departure)
+                    visit = rng.uniform(10, 60)
+                    if at + visit < departure:
+                        events.append((at, rng.choice(other_in)))
+                        events.append((at + visit, rng.choice(other_out)))
+                if rng.random() >= missing_exit:
+                    events.append((departure, rng.choice(readers_out)))
+                events.sort()
+                for minute, reader in events:
+                    at = day_start + timedelta(seconds=int(minute * 60))
+                    yield card_no, person['pin'], person['name'], person['last_name'], at, reader, EVENT_NAME
+                    self.rows += 1
+                    if rng.random() < double_tap:
+                        yield (card_no, person['pin'], person['name'], person['last_name'],
+                               at + timedelta(seconds=rng.randint(1, 6)), reader, EVENT_NAME)
+                        self.rows += 1
+            day += timedelta(days=1)
+
+    def stats(self):
+        """Cheap counters for monitoring."""
+        return {'persons': len(self.persons), 'buildings': len(self.buildings), 'rows': self.rows,
+                'reassignments': len(self.reassignments)}
+
+    def _plan_reassignments(self, people, first_day, last_day, rng):
+        """Card of B was A's until a day in the period; B used a since retired card before that."""
+        self.reassignments = []
+        days = (last_day - first_day).days
+        count = int(len(people) * self.profile['card_reassign'])
+        if days < 1 or count < 1 or len(people) < 2:
+            return
+        involved = set()
+        for index in rng.sample(range(len(people)), min(count, len(people) // 2)):
+            previous, current = people[index][0], people[(index + 1) % len(people)]
+            if previous['pin'] in involved or current[0]['pin'] in involved:
+                continue
+            involved.update((previous['pin'], current[0]['pin']))
+            day = first_day + timedelta(days=rng.randint(1, days))
+            self.reassignments.append((day, previous['pin'], current[0]['pin'], current[3], f"9{current[3]}"))
+        self.reassignments.sort(key=lambda change: change[0])
+
+
+# --------------------------------------------------------------------------------------
+# Output
+# --------------------------------------------------------------------------------------
+
+def write_csv(rows, path):
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_parquet(rows, path, batch_rows=COPY_BATCH_ROWS):
+    if pyarrow is None:
+        raise SystemExit("🚨 Parquet output needs pyarrow (pip install pyarrow); use --format csv instead")
+    schema = pyarrow.schema([(column, pyarrow.timestamp('s') if column == 'create_time' else pyarrow.string())
+                             for column in COLUMNS])
+    count = 0
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                writer.write_table(pyarrow.Table.from_pylist([dict(zip(COLUMNS, r)) for r in batch], schema))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pyarrow.Table.from_pylist([dict(zip(COLUMNS, r)) for r in batch], schema))
+            count += len(batch)
+    return count
+
+
+def copy_rows(cur, table, columns, rows):
+    """COPY rows (an iterable of tuples) into public.<table> in CSV form."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cur.copy_expert(f"COPY public.{table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def copy_transactions(cur, rows, first_id=1, batch_rows=COPY_BATCH_ROWS):
+    """COPYs generated rows into acc_transaction with ids from first_id; returns the row count."""
+    count, batch = 0, []
+    for row in rows:
+        batch.append((str(first_id + count),) + tuple(row))
+        count += 1
+        if len(batch) >= batch_rows:
+            copy_rows(cur, 'acc_transaction', ('id',) + COLUMNS, batch)
+            batch = []
+    if batch:
+        copy_rows(cur, 'acc_transaction', ('id',) + COLUMNS, batch)
+    return count
+
+
+def write_persons_csv(persons, path):
+    columns = ('id', 'pin', 'name', 'last_name', 'position', 'position_id', 'auth_dept_id', 'card_no')
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for person in persons:
+            writer.writerow([person.get(column) for column in columns])
+
+
+def _database_persons(cur):
+    cur.execute("""
+        SELECT p.pin, p.name, p.last_name, c.card_no, pp.name
+        FROM public.pers_person p
+        JOIN public.pers_card c ON c.person_id = p.id
+        LEFT JOIN public.pers_position pp ON p.position_id = pp.id
+        ORDER BY p.id
+    """)
+    return [{'pin': pin, 'name': name, 'last_name': last_name, 'card_no': card_no, 'position': position}
+            for pin, name, last_name, card_no, position in cur.fetchall()]
+
+
+def _next_transaction_id(cur):
+    # acc_transaction ids are strings; generated rows continue after the largest numeric one
+    cur.execute("SELECT COALESCE(MAX(id::bigint), 0) FROM public.acc_transaction WHERE id ~ '^[0-9]{1,18}$'")
+    return cur.fetchone()[0] + 1
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generates realistic turnstile swipes.')
+    parser.add_argument('--format', choices=('csv', 'parquet', 'copy'), default='csv')
+    parser.add_argument('--output', help='file for csv/parquet (default swipes.<format>)')
+    parser.add_argument('--persons', type=int, default=1000, help='synthetic persons (csv/parquet)')
+    parser.add_argument('--persons-output', help='also write the synthetic persons and cards as CSV')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--end', type=date.fromisoformat, default=None, help='last day (default yesterday)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--profile', help='JSON file overriding DEFAULT_PROFILE')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='profile override, e.g. double_tap=0.1 or roles.staff.arrival=["09:00"]')
+    parser.add_argument('--database', help="target database for --format copy (required)")
+    parser.add_argument('--print-profile', action='store_true', help='print the effective profile and exit')
+    args = parser.parse_args(argv)
+
+    try:
+        profile = load_profile(args.profile, args.set)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if args.print_profile:
+        print(json.dumps(profile, indent=2, ensure_ascii=False))
+        return
+    end = args.end or date.today() - timedelta(days=1)
+    first = end - timedelta(days=args.days - 1)
+    readers_in, readers_out = turnstile_readers()
+    started = time.perf_counter()
+
+    if args.format == 'copy':
+        if not args.database:
+            parser.error('--format copy needs --database')
+        import psycopg2
+
+        conn = psycopg2.connect(dbname=args.database,
+                                user=os.environ.get('BENCH_DB_USER') or os.environ.get('USER') or 'postgres',
+                                password=os.environ.get('BENCH_DB_PASSWORD', ''),
+                                host=os.environ.get('BENCH_DB_HOST', 'localhost'),
+                                port=os.environ.get('BENCH_DB_PORT', '5432'))
+        try:
+            with conn.cursor() as cur:
+                persons = _database_persons(cur)
+                if not persons:
+                    raise SystemExit(f"🚨 {args.database} has no persons with cards to generate swipes for")
+                generator = SwipeGenerator(persons, readers_in, readers_out, profile, args.seed)
+                count = copy_transactions(cur, generator.swipes(first, end), _next_transaction_id(cur))
+            conn.commit()
+        finally:
+            conn.close()
+        target = f"{args.database}.acc_transaction"
+    else:
+        persons, _, _ = synthetic_persons(args.persons, random.Random(args.seed))
+        if args.persons_output:
+            write_persons_csv(persons, args.persons_output)
+        generator = SwipeGenerator(persons, readers_in, readers_out, profile, args.seed)
+        target = args.output or f"swipes.{args.format}"
+        writer = write_parquet if args.format == 'parquet' else write_csv
+        count = writer(generator.swipes(first, end), target)
+
+    elapsed = time.perf_counter() - started
+    stats = generator.stats()
+    print(f"✅ {count:,} swipes of {stats['persons']:,} persons in {stats['buildings']} buildings "
+          f"({first} – {end}, {stats['reassignments']} card changes) -> {target} "
+          f"in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.0f} rows/s)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
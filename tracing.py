@@ -0,0 +1,359 @@
+"""
+Tracing
+Lightweight spans around the phases of requests and jobs, with OpenTelemetry-compatible output.
+
+A trace starts at a root span (one per request or background job, continuing an incoming W3C
+traceparent header if there is one). Inside it, span(name) / @traced(name) time nested blocks,
+phase(name) splits the current span into consecutive child phases without re-indenting code, and
+record(name, seconds) adds an already finished span (a DB statement). Outside a trace these are
+no-ops, so helpers can be traced unconditionally.
+
+Spans are buffered per trace and exported when the root span ends, but only if the trace was
+slow (root duration >= slow_ms) or sampled (sample_rate, or the sampled flag of traceparent):
+ - 'jsonl': one JSON object per span in <directory>/spans.jsonl (rotated at 10 MB), using
+   OpenTelemetry field names (traceId, spanId, parentSpanId, startTimeUnixNano, attributes...)
+ - 'console': an indented duration tree on stderr
+ - 'off': tracing disabled
+
+install_log_record_factory() adds the current trace id to every log record (%(trace_context)s).
+"""
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+
+
+MODES = ('off', 'jsonl', 'console')
+SPANS_FILE_NAME = 'spans.jsonl'
+SPANS_FILE_MAX_BYTES = 10 * 1024 * 1024
+MAX_SPANS_PER_TRACE = 1000
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_current = contextvars.ContextVar('current_span', default=None)
+
+
+class Trace:
+    """Spans of one trace, buffered until the root span ends."""
+
+    __slots__ = ('trace_id', 'sampled', 'spans', 'dropped')
+
+    def __init__(self, trace_id, sampled):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans = []
+        self.dropped = 0
+
+
+class Span:
+    """One timed operation; use as a context manager or call end()."""
+
+    __slots__ = ('tracer', 'trace', 'span_id', 'parent', 'parent_span_id', 'name', 'kind', 'attributes',
+                 'start_ns', 'end_ns', 'status', 'status_message', '_phase', '_token')
+
+    def __init__(self, tracer, trace, name, parent=None, parent_span_id=None, kind='INTERNAL',
+                 attributes=None, start_ns=None):
+        self.tracer = tracer
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent = parent
+        self.parent_span_id = parent.span_id if parent is not None else parent_span_id
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns = None
+        self.status = 'UNSET'
+        self.status_message = None
+        self._phase = None
+        self._token = None
+
+    @property
+    def trace_id(self):
+        return self.trace.trace_id
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_error(self, error):
+        self.status = 'ERROR'
+        self.status_message = str(error)[:500]
+
+    def end(self, end_ns=None):
+        if self.end_ns is not None:
+            return
+        if self._phase is not None:
+            self._phase.end()
+        self.end_ns = end_ns if end_ns is not None else time.time_ns()
+        if _current.get() is self:
+            _current.set(self.parent)
+        self.tracer._finished(self)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.set_error(exc)
+        self.end()
+        if self._token is not None:
+            try:
+                _current.reset(self._token)
+            except ValueError:  # ended in another context
+                _current.set(self.parent)
+        return False
+
+
+class Tracer:
+    """Creates spans and exports finished traces that are slow or sampled."""
+
+    def __init__(self, mode='off', directory=None, slow_ms=1000, sample_rate=0.0,
+                 service_name='app', max_spans=MAX_SPANS_PER_TRACE):
+        if mode not in MODES:
+            raise ValueError(f"tracing mode must be one of {MODES}, not {mode!r}")
+        self.mode = mode
+        self.directory = directory
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.service_name = service_name
+        self.max_spans = max_spans
+        self._write_lock = threading.Lock()
+        self.traces_started = 0
+        self.traces_exported = 0
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    # ----------------------------------------------------------------------------------
+    # Public API
+    # ----------------------------------------------------------------------------------
+
+    def start_root(self, name, traceparent=None, kind='SERVER', attributes=None):
+        """Starts a trace (or continues the incoming traceparent) and makes its root span current."""
+        if not self.enabled:
+            return None
+        parent_span_id = None
+        sampled = random.random() < self.sample_rate
+        match = _TRACEPARENT.match((traceparent or '').strip().lower())
+        if match and match.group(1) != '0' * 32:
+            trace_id, parent_span_id = match.group(1), match.group(2)
+            sampled = sampled or bool(int(match.group(3), 16) & 1)
+        else:
+            trace_id = secrets.token_hex(16)
+        self.traces_started += 1
+        root = Span(self, Trace(trace_id, sampled), name, parent_span_id=parent_span_id, kind=kind,
+                    attributes=attributes)
+        root._token = _current.set(root)
+        return root
+
+    def span(self, name, **attributes):
+        """Child span of the current span (a no-op outside a trace)."""
+        parent = _current.get()
+        if parent is None:
+            return _NOOP_SPAN
+        return Span(self, parent.trace, name, parent=parent, attributes=attributes)
+
+    def root_or_span(self, name, **attributes):
+        """span() inside a trace, otherwise a new trace rooted here (background jobs)."""
+        if _current.get() is not None:
+            return self.span(name, **attributes)
+        if not self.enabled:
+            return _NOOP_SPAN
+        root = self.start_root(name, kind='INTERNAL', attributes=attributes)
+        _current.reset(root._token)  # __enter__ makes it current again
+        root._token = None
+        return root
+
+    def phase(self, name, **attributes):
+        """Ends the current span's previous phase and starts `name` as its next child phase."""
+        span = _current.get()
+        if span is None:
+            return
+        owner = span.parent if getattr(span, '_is_phase', False) else span
+        if owner is None:
+            return
+        if owner._phase is not None:
+            owner._phase.end()
+        phase = _PhaseSpan(self, owner.trace, name, parent=owner, attributes=attributes)
+        owner._phase = phase
+        _current.set(phase)
+
+    def record(self, name, seconds, **attributes):
+        """Adds a span that already finished (ended now, lasted `seconds`) under the current span."""
+        parent = _current.get()
+        if parent is None:
+            return
+        end_ns = time.time_ns()
+        span = Span(self, parent.trace, name, parent=parent, kind='CLIENT', attributes=attributes,
+                    start_ns=end_ns - int(seconds * 1e9))
+        span.end_ns = end_ns
+        self._finished(span)
+
+    def keep(self):
+        """Exports the current trace whatever its duration (e.g. it ran a slow query)."""
+        span = _current.get()
+        if span is not None:
+            span.trace.sampled = True
+
+    def current_trace_id(self):
+        return current_trace_id()
+
+    def traced(self, name=None):
+        """Decorator: runs the function in a child span (no-op outside a trace)."""
+        def decorator(fn):
+            span_name = name or fn.__name__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if _current.get() is None:
+                    return fn(*args, **kwargs)
+                with self.span(span_name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def stats(self):
+        """Cheap counters for monitoring."""
+        return {'mode': self.mode, 'traces_started': self.traces_started,
+                'traces_exported': self.traces_exported}
+
+    # ----------------------------------------------------------------------------------
+    # Export
+    # ----------------------------------------------------------------------------------
+
+    def _finished(self, span):
+        trace = span.trace
+        if len(trace.spans) < self.max_spans:
+            trace.spans.append(span)
+        else:
+            trace.dropped += 1
+        if span.parent is None:  # root
+            if trace.sampled or span.duration_ms >= self.slow_ms:
+                self._export(trace, span)
+
+    def _export(self, trace, root):
+        self.traces_exported += 1
+        if trace.dropped:
+            root.attributes['trace.dropped_spans'] = trace.dropped
+        try:
+            if self.mode == 'console':
+                self._export_console(trace, root)
+            else:
+                self._export_jsonl(trace)
+        except OSError as e:
+            print(f"⚠️ Trace export failed: {e}")
+
+    def _export_jsonl(self, trace):
+        resource = {'service.name': self.service_name, 'process.pid': os.getpid()}
+        lines = []
+        for span in trace.spans:
+            lines.append(json.dumps({
+                'traceId': trace.trace_id,
+                'spanId': span.span_id,
+                'parentSpanId': span.parent_span_id or '',
+                'name': span.name,
+                'kind': span.kind,
+                'startTimeUnixNano': span.start_ns,
+                'endTimeUnixNano': span.end_ns,
+                'durationMs': round(span.duration_ms, 3),
+                'attributes': span.attributes,
+                'status': {'code': span.status, 'message': span.status_message or ''},
+                'resource': resource,
+            }, default=str))
+        path = os.path.join(self.directory, SPANS_FILE_NAME)
+        with self._write_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            if os.path.exists(path) and os.path.getsize(path) > SPANS_FILE_MAX_BYTES:
+                os.replace(path, f"{path}.1")
+            with open(path, 'a') as f:
+                f.write('\n'.join(lines) + '\n')
+
+    def _export_console(self, trace, root):
+        children = {}
+        for span in trace.spans:
+            children.setdefault(span.parent.span_id if span.parent is not None else None, []).append(span)
+        lines = [f"🔎 trace {trace.trace_id} {root.name} {root.duration_ms:.1f} ms"]
+
+        def walk(span, depth):
+            for child in sorted(children.get(span.span_id, ()), key=lambda s: s.start_ns):
+                status = ' ✗' if child.status == 'ERROR' else ''
+                lines.append(f"   {'  ' * depth}{child.duration_ms:9.1f} ms  {child.name}{status}")
+                walk(child, depth + 1)
+        walk(root, 0)
+        with self._write_lock:
+            print('\n'.join(lines), file=sys.stderr)
+
+
+class _PhaseSpan(Span):
+    """Child span created by Tracer.phase(); ended by the next phase or by its parent."""
+
+    __slots__ = ()
+    _is_phase = True
+
+    def end(self, end_ns=None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = end_ns if end_ns is not None else time.time_ns()
+        if _current.get() is self:
+            _current.set(self.parent)
+        if self.parent._phase is self:
+            self.parent._phase = None
+        self.tracer._finished(self)
+
+
+class _NoopSpan:
+    """Stand-in outside a trace."""
+
+    trace_id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_error(self, error):
+        pass
+
+    def end(self, end_ns=None):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def current_trace_id():
+    """Trace id of the current span, None outside a trace."""
+    span = _current.get()
+    return span.trace_id if span is not None else None
+
+
+def install_log_record_factory():
+    """Adds trace_id and trace_context (' [trace_id=...]' or '') to every log record."""
+    previous = logging.getLogRecordFactory()
+
+    def factory(*args, **kwargs):
+        record = previous(*args, **kwargs)
+        trace_id = current_trace_id()
+        record.trace_id = trace_id or '-'
+        record.trace_context = f" [trace_id={trace_id}]" if trace_id else ''
+        return record
+
+    logging.setLogRecordFactory(factory)